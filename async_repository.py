@@ -0,0 +1,216 @@
+"""async_repository.py"""
+
+# IMPORTS #
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import time
+from typing import Any, Callable, Iterable
+
+import config
+
+import repository
+
+from classes import Error, ExecutorStats
+
+from enums import Claimable, ContentType, ModerationType
+
+from datatypes import Guilds, Guild, CurrentClaimable, SpawnStates, GuildContent
+
+"""
+    Awaitable versions of the repository functions, for use from the event loop.
+    Each call is run on a bounded thread pool so a slow query only holds up the coroutine waiting on it, rather
+    than the whole bot. At most DB_MAX_CONCURRENCY calls run at once; the rest wait their turn on the semaphore.
+"""
+_executor: ThreadPoolExecutor = ThreadPoolExecutor(max_workers=config.DB_MAX_CONCURRENCY,
+                                                   thread_name_prefix="repository")
+_limit: asyncio.Semaphore = asyncio.Semaphore(config.DB_MAX_CONCURRENCY)
+
+EXECUTOR_STATS: ExecutorStats = ExecutorStats()
+
+
+async def _run(func: Callable[..., Any], *args: Any) -> Any:
+    EXECUTOR_STATS.record_queued()
+    queued_at: float = time.perf_counter()
+    async with _limit:
+        EXECUTOR_STATS.record_started(time.perf_counter() - queued_at)
+        try:
+            return await asyncio.get_running_loop().run_in_executor(_executor, func, *args)
+        finally:
+            EXECUTOR_STATS.record_finished()
+
+
+def get_executor_stats() -> dict[str, int | float]:
+    """
+    Gets the current queue depth and wait time counters for offloaded repository calls.
+    :return: Call counts and queue wait times (in seconds).
+    """
+    return EXECUTOR_STATS.snapshot()
+
+
+async def ping() -> Error:
+    return await _run(repository.ping)
+
+
+async def get_all_guilds() -> Guilds | Error:
+    return await _run(repository.get_all_guilds)
+
+
+async def get_guild(guild_id: int) -> Guild | None | Error:
+    return await _run(repository.get_guild, guild_id)
+
+
+async def set_active_guild(guild_id: int) -> Error:
+    return await _run(repository.set_active_guild, guild_id)
+
+
+async def set_inactive_guild(guild_id: int) -> Error:
+    return await _run(repository.set_inactive_guild, guild_id)
+
+
+async def add_guild(guild_id: int) -> Error:
+    return await _run(repository.add_guild, guild_id)
+
+
+async def reconcile_guilds(new_guild_ids: list[int], reactivated_guild_ids: list[int]) -> Error:
+    return await _run(repository.reconcile_guilds, new_guild_ids, reactivated_guild_ids)
+
+
+async def claim_changelog(guild_ids: list[int], version: int) -> list[int] | Error:
+    return await _run(repository.claim_changelog, guild_ids, version)
+
+
+async def get_guild_changelog_version(guild_id: int) -> int | Error:
+    return await _run(repository.get_guild_changelog_version, guild_id)
+
+
+async def set_guild_changelog_version(guild_id: int, version: int) -> Error:
+    return await _run(repository.set_guild_changelog_version, guild_id, version)
+
+
+async def set_guild_jail_role(guild_id: int, role_id: int | None) -> Error:
+    return await _run(repository.set_guild_jail_role, guild_id, role_id)
+
+
+async def get_last_caught(guild_id: int, claimable: Claimable) -> datetime | Error:
+    return await _run(repository.get_last_caught, guild_id, claimable)
+
+
+async def set_last_caught(guild_id: int, claimable: Claimable, time_caught: datetime) -> Error:
+    return await _run(repository.set_last_caught, guild_id, claimable, time_caught)
+
+
+async def get_current_claimable(guild_id: int, claimable: Claimable) -> CurrentClaimable | Error:
+    return await _run(repository.get_current_claimable, guild_id, claimable)
+
+
+async def set_current_claimable(guild_id: int,
+                                claimable: Claimable,
+                                message_id: int | None,
+                                channel_id: int | None) -> Error:
+    return await _run(repository.set_current_claimable, guild_id, claimable, message_id, channel_id)
+
+
+async def get_spawn_states(guild_id: int) -> SpawnStates | Error:
+    return await _run(repository.get_spawn_states, guild_id)
+
+
+async def get_user_score(user_id: int, claimable: Claimable) -> int | Error:
+    return await _run(repository.get_user_score, user_id, claimable)
+
+
+async def set_user_score(user_id: int, score: int, claimable: Claimable) -> Error:
+    return await _run(repository.set_user_score, user_id, score, claimable)
+
+
+async def increment_user_score(guild_id: int, user_id: int, claimable: Claimable, delta: int) -> int | Error:
+    return await _run(repository.increment_user_score, guild_id, user_id, claimable, delta)
+
+
+async def increment_user_scores(deltas: list[tuple[int, int, int, int]]) -> Error:
+    return await _run(repository.increment_user_scores, deltas)
+
+
+async def get_top_guild_scores(guild_id: int, claimable: Claimable, limit: int) -> list[tuple[int, int]] | Error:
+    return await _run(repository.get_top_guild_scores, guild_id, claimable, limit)
+
+
+async def get_unseeded_guilds() -> set[int] | Error:
+    return await _run(repository.get_unseeded_guilds)
+
+
+async def seed_guild_scores(guild_id: int, user_ids: list[int]) -> Error:
+    return await _run(repository.seed_guild_scores, guild_id, user_ids)
+
+
+async def get_user_moderation_info(user_id: int,
+                                   guild_id: int,
+                                   moderation_type: ModerationType) -> set[int] | None | Error:
+    return await _run(repository.get_user_moderation_info, user_id, guild_id, moderation_type)
+
+
+async def set_user_moderation_info(user_id: int,
+                                   guild_id: int,
+                                   moderator_id: int,
+                                   moderation_type: ModerationType,
+                                   channel_ids: Iterable[int] | None,
+                                   expiry: datetime | None = None) -> Error:
+    return await _run(repository.set_user_moderation_info,
+                      user_id, guild_id, moderator_id, moderation_type, channel_ids, expiry)
+
+
+async def set_moderation_expiry(user_id: int,
+                                guild_id: int,
+                                moderation_type: ModerationType,
+                                expiry: datetime | None) -> Error:
+    return await _run(repository.set_moderation_expiry, user_id, guild_id, moderation_type, expiry)
+
+
+async def get_pending_expiries(moderation_type: ModerationType) -> list[tuple[int, int, datetime]] | Error:
+    return await _run(repository.get_pending_expiries, moderation_type)
+
+
+async def add_moderation_channels(user_id: int,
+                                  guild_id: int,
+                                  moderation_type: ModerationType,
+                                  channel_ids: Iterable[int]) -> Error:
+    return await _run(repository.add_moderation_channels, user_id, guild_id, moderation_type, channel_ids)
+
+
+async def remove_moderation_channels(user_id: int,
+                                     guild_id: int,
+                                     moderation_type: ModerationType,
+                                     channel_ids: Iterable[int]) -> Error:
+    return await _run(repository.remove_moderation_channels, user_id, guild_id, moderation_type, channel_ids)
+
+
+async def remove_user_moderation_info(user_id: int, guild_id: int, moderation_type: ModerationType) -> Error:
+    return await _run(repository.remove_user_moderation_info, user_id, guild_id, moderation_type)
+
+
+async def get_last_reactor(guild_id: int) -> int | None | Error:
+    return await _run(repository.get_last_reactor, guild_id)
+
+
+async def set_last_reactor(guild_id: int, user_id: int) -> Error:
+    return await _run(repository.set_last_reactor, guild_id, user_id)
+
+
+async def set_last_reactors(last_reactors: list[tuple[int, int]]) -> Error:
+    return await _run(repository.set_last_reactors, last_reactors)
+
+
+async def get_guild_content(guild_id: int) -> GuildContent | Error:
+    return await _run(repository.get_guild_content, guild_id)
+
+
+async def add_guild_content(guild_id: int, content_type: ContentType, key: str | None, value: str) -> int | Error:
+    return await _run(repository.add_guild_content, guild_id, content_type, key, value)
+
+
+async def remove_guild_content(guild_id: int, content_id: int) -> bool | Error:
+    return await _run(repository.remove_guild_content, guild_id, content_id)
+
+
+async def set_guild_content_defaults(guild_id: int, content_type: ContentType, enabled: bool) -> Error:
+    return await _run(repository.set_guild_content_defaults, guild_id, content_type, enabled)
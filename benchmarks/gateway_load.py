@@ -0,0 +1,203 @@
+"""gateway_load.py"""
+
+"""
+    Synthetic load for the on_message hot path. Fake messages are fed straight into bot.on_message (and so through
+    generate_claimable and respond_to_message) at a fixed rate, spread across a number of guilds and channels,
+    without connecting to Discord. Storage runs on the in-memory backend unless DBBACKEND says otherwise.
+
+    Latency is measured from when each message was due to arrive, not from when it was handled, so time spent
+    queued behind slow messages counts against the handler that caused it.
+
+    Usage:
+        python benchmarks/gateway_load.py --rate 500 --duration 10 --guilds 50
+"""
+
+# IMPORTS #
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable
+
+# Must be set before the bot's modules read the config
+os.environ.setdefault('DBBACKEND', 'memory')
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import bot as nerdbot  # noqa: E402
+import repository  # noqa: E402
+from enums import ErrorType  # noqa: E402
+
+# A mix of everyday chat and messages that set off one of the canned responses
+CHAT: list[str] = [
+    "has anyone seen the new patch notes",
+    "lol",
+    "brb getting food",
+    "that boss fight took forever",
+    "anyone up for a game later",
+    "i have so much work to do today",
+    "nerdbot what do you think",
+    "good morning everyone",
+]
+
+
+class Counters:
+
+    def __init__(self):
+        self.RepositoryCalls: dict[str, int] = {}
+        self.Sends: int = 0
+
+    def total_repository_calls(self) -> int:
+        return sum(self.RepositoryCalls.values())
+
+
+class FakeMessage:
+
+    def __init__(self, message_id: int, channel: "FakeChannel", author: "FakeUser", content: str):
+        self.id: int = message_id
+        self.channel: FakeChannel = channel
+        self.guild: FakeGuild = channel.guild
+        self.author: FakeUser = author
+        self.content: str = content
+
+
+class FakeUser:
+
+    def __init__(self, user_id: int):
+        self.id: int = user_id
+        self.display_name: str = f"user{user_id}"
+
+
+class FakeGuild:
+
+    def __init__(self, guild_id: int):
+        self.id: int = guild_id
+        self.channels: list[FakeChannel] = []
+
+
+class FakeChannel:
+    """
+    Stands in for a text channel. Sends are counted, and can be made to take a while to mimic the Discord API.
+    """
+
+    def __init__(self, channel_id: int, guild: FakeGuild, counters: Counters, send_latency: float):
+        self.id: int = channel_id
+        self.guild: FakeGuild = guild
+        self._counters: Counters = counters
+        self._send_latency: float = send_latency
+        self._next_id: int = channel_id * 1_000_000
+
+    async def send(self, content: str | None = None, **kwargs: Any) -> FakeMessage:
+        self._counters.Sends += 1
+        if self._send_latency > 0:
+            await asyncio.sleep(self._send_latency)
+
+        self._next_id += 1
+        return FakeMessage(self._next_id, self, FakeUser(0), content or "")
+
+
+def count_repository_calls(counters: Counters):
+    # async_repository looks each function up on the repository module when it's called, so wrapping them here is
+    # enough to see every call
+    for name in dir(repository):
+        func: Any = getattr(repository, name)
+        if name.startswith("_") or not callable(func) or getattr(func, "__module__", None) != repository.__name__:
+            continue
+
+        def counted(*args: Any, _name: str = name, _func: Callable[..., Any] = func) -> Any:
+            counters.RepositoryCalls[_name] = counters.RepositoryCalls.get(_name, 0) + 1
+            return _func(*args)
+
+        setattr(repository, name, counted)
+
+
+def percentile(ordered: list[float], fraction: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+async def run(args: argparse.Namespace):
+    random.seed(args.seed)
+    counters: Counters = Counters()
+
+    guilds: list[FakeGuild] = [FakeGuild(guild_id) for guild_id in range(1, args.guilds + 1)]
+    for guild in guilds:
+        guild.channels = [
+            FakeChannel(guild.id * 1000 + index, guild, counters, args.send_latency / 1000)
+            for index in range(args.channels)
+        ]
+    users: list[FakeUser] = [FakeUser(user_id) for user_id in range(1, args.users + 1)]
+
+    result = repository.reconcile_guilds([guild.id for guild in guilds], [])
+    if result.Status != ErrorType.NoError:
+        print(f"Couldn't set up guilds: {result.Message}")
+        return
+
+    # Only count what the messages themselves cause
+    backend: str = repository.get_backend_name()
+    count_repository_calls(counters)
+
+    total: int = int(args.rate * args.duration)
+    interval: float = 1 / args.rate
+    latencies: list[float] = []
+    failures: int = 0
+
+    async def handle(message: FakeMessage, due: float):
+        nonlocal failures
+        try:
+            await nerdbot.on_message(message)
+        except Exception:
+            failures += 1
+        latencies.append(time.perf_counter() - due)
+
+    tasks: list[asyncio.Task] = []
+    start: float = time.perf_counter()
+    for index in range(total):
+        due: float = start + index * interval
+        delay: float = due - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        channel: FakeChannel = random.choice(random.choice(guilds).channels)
+        content: str = random.choice(CHAT) if random.random() < args.chatter else f"message {index}"
+        message: FakeMessage = FakeMessage(index, channel, random.choice(users), content)
+        tasks.append(asyncio.create_task(handle(message, due)))
+
+    await asyncio.gather(*tasks)
+    elapsed: float = time.perf_counter() - start
+
+    latencies.sort()
+    print(f"Backend:          {backend}")
+    print(f"Messages:         {total} across {args.guilds} guilds ({failures} failed)")
+    print(f"Offered rate:     {args.rate:.0f}/s")
+    print(f"Throughput:       {total / elapsed:.0f}/s")
+    print(f"Latency p50:      {percentile(latencies, 0.50) * 1000:.3f} ms")
+    print(f"Latency p99:      {percentile(latencies, 0.99) * 1000:.3f} ms")
+    print(f"Latency max:      {latencies[-1] * 1000 if latencies else 0.0:.3f} ms")
+    print(f"Repository calls: {counters.total_repository_calls() / total:.4f} per message")
+    print(f"Sends:            {counters.Sends / total:.4f} per message")
+    for name, calls in sorted(counters.RepositoryCalls.items(), key=lambda item: item[1], reverse=True):
+        print(f"    {name}: {calls}")
+
+
+def main():
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(description="Drive on_message with synthetic load.")
+    parser.add_argument("--rate", type=float, default=200.0, help="Messages per second.")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds to send messages for.")
+    parser.add_argument("--guilds", type=int, default=20)
+    parser.add_argument("--channels", type=int, default=5, help="Channels per guild.")
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--chatter", type=float, default=0.2,
+                        help="Fraction of messages drawn from canned chat, some of which get a response.")
+    parser.add_argument("--send-latency", type=float, default=0.0, help="Milliseconds each send takes.")
+    parser.add_argument("--seed", type=int, default=0)
+    args: argparse.Namespace = parser.parse_args()
+
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
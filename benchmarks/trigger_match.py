@@ -0,0 +1,126 @@
+"""trigger_match.py"""
+
+"""
+    Micro-benchmark of the chat trigger matching in respond_to_message: the compiled TriggerSet against the loop of
+    substring checks and re.findall calls it replaced. Only the matching is timed, not the replies. Both are run over
+    the same messages, and checked to agree on every one before timing.
+
+    Usage:
+        python benchmarks/trigger_match.py --messages 2000 --repeat 5 --extra-triggers 50
+    --extra-triggers adds made-up triggers to both, to show how each copes as the list grows.
+"""
+
+# IMPORTS #
+import argparse
+import random
+import re
+import sys
+import timeit
+from pathlib import Path
+from typing import Callable
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import constants  # noqa: E402
+from datatypes import Trigger  # noqa: E402
+from triggers import TriggerSet  # noqa: E402
+
+WORDS: list[str] = [
+    "the", "game", "patch", "notes", "boss", "fight", "took", "forever", "lol", "anyone", "up", "for", "later",
+    "good", "morning", "everyone", "food", "brb", "raid", "tonight", "what", "do", "you", "think", "homework",
+    "working", "shipment", "network", "inspired", "nerd", "bot",
+]
+# Messages that set off a trigger, mixed in with the random chatter
+HITS: list[str] = [
+    "i have so much work to do today",
+    "nerdbot what do you think",
+    "inspire me please",
+    "oh shit the server is down",
+    "work work work, nerdbot inspire me",
+]
+
+
+def legacy_match(content: str, extra: list[str]) -> dict[str, str]:
+    """
+    The matching respond_to_message did before TriggerSet, with extra triggers checked the same way as the others.
+    """
+    found: dict[str, str] = {}
+    for word in constants.SWEARS:
+        if word in content:
+            found["swear"] = "swear"
+            break
+
+    if re.findall(r'\bwork\b', content):
+        found["reply"] = "work"
+    elif re.findall('inspire me', content):
+        found["reply"] = "inspire"
+    elif re.findall('nerdbot', content):
+        found["reply"] = "nerdbot"
+    else:
+        for word in extra:
+            if re.findall(rf'\b{word}\b', content):
+                found["reply"] = word
+                break
+
+    return found
+
+
+def make_messages(count: int, hit_rate: float, rng: random.Random) -> list[str]:
+    messages: list[str] = []
+    for _ in range(count):
+        if rng.random() < hit_rate:
+            messages.append(rng.choice(HITS))
+        else:
+            messages.append(" ".join(rng.choices(WORDS, k=rng.randint(3, 20))))
+
+    return messages
+
+
+def run(args: argparse.Namespace):
+    rng: random.Random = random.Random(args.seed)
+    messages: list[str] = make_messages(args.messages, args.hit_rate, rng)
+
+    extra: list[str] = [f"zz{index}trigger" for index in range(args.extra_triggers)]
+    trigger_list: list[Trigger] = [
+        *constants.TRIGGERS,
+        *({"name": word, "group": "reply", "words": [word], "match": "word"} for word in extra)
+    ]
+    trigger_set: TriggerSet = TriggerSet(trigger_list)
+
+    for message in messages:
+        expected: dict[str, str] = legacy_match(message, extra)
+        actual: dict[str, str] = trigger_set.match(message)
+        if expected != actual:
+            raise AssertionError(f"Mismatch on {message!r}: legacy {expected}, TriggerSet {actual}")
+
+    contenders: dict[str, Callable[[], None]] = {
+        "legacy": lambda: [legacy_match(message, extra) for message in messages],
+        "TriggerSet": lambda: [trigger_set.match(message) for message in messages],
+    }
+
+    print(f"Messages:         {len(messages)} ({args.hit_rate:.0%} set off a trigger)")
+    print(f"Triggers:         {len(trigger_list)}")
+    results: dict[str, float] = {}
+    for name, contender in contenders.items():
+        # Best of the repeats, as anything slower was held up by something else
+        best: float = min(timeit.repeat(contender, number=1, repeat=args.repeat))
+        results[name] = best / len(messages)
+        print(f"{name + ':':<17} {results[name] * 1e6:.3f} us per message")
+
+    print(f"Speed-up:         {results['legacy'] / results['TriggerSet']:.2f}x")
+
+
+def main():
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(description="Compare chat trigger matching.")
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--hit-rate", type=float, default=0.1, help="Fraction of messages that set off a trigger.")
+    parser.add_argument("--extra-triggers", type=int, default=0, help="Made-up triggers to add to both.")
+    parser.add_argument("--seed", type=int, default=0)
+    args: argparse.Namespace = parser.parse_args()
+
+    run(args)
+
+
+if __name__ == "__main__":
+    main()
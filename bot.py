@@ -1,6 +1,7 @@
 """main.py"""
 
 # IMPORTS #
+from datetime import datetime, timedelta, timezone
 import os
 
 from types import UnionType
@@ -12,10 +13,10 @@ from discord.ext.commands.context import Context
 
 from dotenv import load_dotenv
 
-from webserver import keep_alive
-
 import commands as customs
 
+import config
+
 import functions
 
 import embeds
@@ -35,14 +36,34 @@ TOKEN: str = os.environ.get('TOKEN')
     Setting up the bot. Includes permissions, activity display on the profile,
     and the bot itself.
 """
-# Permissions
-intents = discord.Intents.all()
+# Permissions. Only what the bot uses, with members and presences as set by MEMBERCACHE and PRESENCES
+if config.MEMBER_CACHE not in ("all", "active", "none"):
+    raise ValueError(f"Unknown MEMBERCACHE '{config.MEMBER_CACHE}'. Expected one of: all, active, none.")
+intents = discord.Intents.default()
+intents.message_content = True
+intents.members = config.MEMBER_CACHE != "none"
+intents.presences = config.PRESENCES
+# Caches whoever Discord sends without being asked. Only "all" asks for every member, at startup
+member_cache_flags = discord.MemberCacheFlags.from_intents(intents)
 # Bot activity
 activity = discord.Activity(type=discord.ActivityType.playing,
                             name="you for a fool")
-# The bot
-bot = commands.Bot(command_prefix='!', activity=activity,
-                   help_command=None, intents=intents)
+
+
+# The bot. Sharded, so one process can hold several gateway connections, or share them with others (see cluster.py)
+class NerdBot(commands.AutoShardedBot):
+    async def setup_hook(self):
+        await customs.setup_hook(self)
+
+    async def close(self):
+        await customs.on_close(self)
+        await super().close()
+
+
+bot = NerdBot(command_prefix='!', activity=activity,
+              help_command=None, intents=intents,
+              member_cache_flags=member_cache_flags, chunk_guilds_at_startup=config.MEMBER_CACHE == "all",
+              shard_count=config.SHARD_COUNT, shard_ids=config.SHARD_IDS)
 
 # Uses command prefix, so needs that set first
 HELP = embeds.generate_help_embed(bot.command_prefix)
@@ -60,6 +81,11 @@ async def on_guild_join(guild: discord.Guild):
     await customs.on_guild_join(guild)
 
 
+@bot.listen()
+async def on_guild_channel_create(channel: discord.abc.GuildChannel):
+    await customs.on_guild_channel_create(channel)
+
+
 @bot.listen()
 async def on_message(message: discord.Message):
     message_content: str = message.content.lower()
@@ -68,6 +94,8 @@ async def on_message(message: discord.Message):
     if functions.validate_author(message.author, bot):
         return
 
+    functions.remember_member(message.guild, message.author)
+
     await functions.generate_claimable(message.guild, message.channel)
 
     await functions.respond_to_message(message.channel, message_content, bot)
@@ -76,13 +104,28 @@ async def on_message(message: discord.Message):
 @bot.listen()
 async def on_reaction_add(reaction: discord.Reaction, user: discord.User | discord.Member):
     await customs.on_reaction_add(reaction, user)
+
+
+@bot.listen()
+async def on_command(ctx: Context):
+    await customs.on_command(ctx)
+
+
+@bot.listen()
+async def on_command_completion(ctx: Context):
+    await customs.on_command_completion(ctx)
+
+
+@bot.listen()
+async def on_command_error(ctx: Context, error: commands.CommandError):
+    await customs.on_command_error(ctx, error)
 # endregion
 
 
 # region User Commands
 @bot.command(aliases=['mute'])
 @has_permissions(manage_permissions=True)
-async def bonk(ctx: Context, member: discord.Member | DefaultInput):
+async def bonk(ctx: Context, member: discord.Member | DefaultInput, duration: DefaultInput = None):
     if member is None:
         await ctx.send("No input given!")
         return
@@ -91,9 +134,25 @@ async def bonk(ctx: Context, member: discord.Member | DefaultInput):
         await ctx.send(f"{member} is not a valid input")
         return
 
-    await customs.restrict(member, ctx.author, ctx.guild)
+    expiry: datetime | None = None
+    if duration is not None:
+        length: timedelta | None = functions.parse_duration(duration)
+        if length is None:
+            await ctx.send(f"{duration} is not a valid duration. Try something like 10m or 1h30m.")
+            return
+        expiry = datetime.now(timezone.utc) + length
+
+    failed: int | None = await customs.restrict(member, ctx.author, ctx.guild, ctx.channel, expiry)
+    if failed is None:
+        await ctx.send("Something went wrong, and I couldn't bonk them. Try again later!")
+        return
 
-    await ctx.send(f"<@!{member.id}> has been sent to jail.")
+    if duration is not None:
+        await ctx.send(f"<@!{member.id}> has been sent to jail for {duration}.")
+    else:
+        await ctx.send(f"<@!{member.id}> has been sent to jail.")
+    if failed:
+        await ctx.send(f"I couldn't lock {failed} channel(s). Bonk them again to retry.")
 
 
 @bot.command()
@@ -121,6 +180,12 @@ async def coins(ctx: Context):
     await customs.coins(ctx.channel, ctx.author)
 
 
+@bot.command()
+@has_permissions(manage_guild=True)
+async def content(ctx: Context, action: DefaultInput = None, *, args: DefaultInput = None):
+    await customs.content(ctx.guild, ctx.channel, action, args)
+
+
 @bot.command()
 async def help(ctx: Context):
     await ctx.channel.send(embed=HELP)
@@ -172,18 +237,23 @@ async def unbonk(ctx: Context, member: discord.Member | DefaultInput):
         await ctx.send(f"{member} is not a valid input")
         return
 
-    altered: bool = await customs.unrestrict(member, ctx.guild)
-    if not altered:
+    failed: int | None = await customs.unrestrict(member, ctx.guild, ctx.channel)
+    if failed is None:
         await ctx.send(f"Looks like I haven't changed that user's permissions at all. No changes needed!")
         return
 
+    if failed:
+        await ctx.send(f"I couldn't unlock {failed} channel(s) for <@!{member.id}>. Unbonk them again to retry.")
+        return
+
     await ctx.send(f"<@!{member.id}> has been released from jail.")
 
 # endregion
 
 
-try:
-    keep_alive()
-    bot.run(TOKEN)
-except discord.errors.HTTPException:
-    os.system('kill 1')
+# Only run when started directly, so the handlers above can be imported (e.g. by the benchmarks) without logging in
+if __name__ == "__main__":
+    try:
+        bot.run(TOKEN)
+    except discord.errors.HTTPException:
+        os.system('kill 1')
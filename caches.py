@@ -0,0 +1,309 @@
+"""caches.py"""
+
+# IMPORTS #
+from collections import OrderedDict
+from datetime import datetime
+import time
+
+from discord import Embed
+
+import cachestore
+import config
+import constants
+
+from contentpacks import ContentPack
+
+from enums import Claimable
+
+from datatypes import SpawnStates
+
+
+class SpawnStateCache:
+    """
+    In-memory copy of each guild's claimable spawn state (last caught time and any unclaimed message).
+    Guilds are loaded on first use, and kept up to date by writing through every change made to the database.
+    """
+
+    def __init__(self):
+        self._states: dict[int, SpawnStates] = {}
+        self.Hits: int = 0
+        self.Misses: int = 0
+
+    def get(self, guild_id: int) -> SpawnStates | None:
+        states: SpawnStates | None = self._states.get(guild_id)
+        if states is None:
+            self.Misses += 1
+        else:
+            self.Hits += 1
+
+        return states
+
+    def put_if_absent(self, guild_id: int, states: SpawnStates) -> SpawnStates:
+        return self._states.setdefault(guild_id, states)
+
+    def set_current(self, guild_id: int, claimable: Claimable, message_id: int | None, channel_id: int | None):
+        # Guilds that haven't been loaded yet will pick up the change from the database when they are
+        states: SpawnStates | None = self._states.get(guild_id)
+        if states is None:
+            return
+
+        states[claimable]["current"] = message_id
+        states[claimable]["currentChannel"] = channel_id
+
+    def set_last_caught(self, guild_id: int, claimable: Claimable, time: datetime):
+        states: SpawnStates | None = self._states.get(guild_id)
+        if states is None:
+            return
+
+        states[claimable]["lastCaught"] = time
+
+    def evict(self, guild_id: int):
+        self._states.pop(guild_id, None)
+
+    def snapshot(self) -> dict[str, int]:
+        return {
+            "entries": len(self._states),
+            "hits": self.Hits,
+            "misses": self.Misses
+        }
+
+
+class LeaderboardEntry:
+
+    def __init__(self, rows: list[tuple[int, int]], expires: float):
+        # Sorted highest first. Holds up to LEADERBOARD_FETCH rows, a few more than are shown
+        self.Rows: list[tuple[int, int]] = rows
+        self.Expires: float = expires
+        # Rendered lazily, and dropped whenever the rows change
+        self.Embed: Embed | None = None
+
+
+class LeaderboardCache:
+    """
+    Recently shown leaderboards, per guild and claimable.
+    Claims patch the cached rows where the result is certain, and drop the entry otherwise. Entries also expire after
+    LEADERBOARD_TTL seconds, to pick up anything else that changes (such as member names).
+    Every claim also moves the leaderboard on to a new generation, so rows fetched while a claim landed aren't kept, as
+    they may or may not include it.
+    """
+
+    def __init__(self, ttl: float):
+        self._ttl: float = ttl
+        self._entries: dict[tuple[int, Claimable], LeaderboardEntry] = {}
+        self._generations: dict[tuple[int, Claimable], int] = {}
+        self.Hits: int = 0
+        self.Misses: int = 0
+        self.Patches: int = 0
+        self.Invalidations: int = 0
+
+    def get(self, guild_id: int, claimable: Claimable) -> LeaderboardEntry | None:
+        entry: LeaderboardEntry | None = self._entries.get((guild_id, claimable))
+        if entry is not None and entry.Expires <= time.monotonic():
+            del self._entries[(guild_id, claimable)]
+            entry = None
+
+        if entry is None:
+            self.Misses += 1
+        else:
+            self.Hits += 1
+
+        return entry
+
+    def generation(self, guild_id: int, claimable: Claimable) -> int:
+        return self._generations.get((guild_id, claimable), 0)
+
+    def put(self, guild_id: int, claimable: Claimable, generation: int,
+            rows: list[tuple[int, int]]) -> LeaderboardEntry:
+        """
+        Keeps a leaderboard's rows, unless a claim has been made in the guild since generation.
+        :return: The entry, whether it was kept or not.
+        """
+        entry: LeaderboardEntry = LeaderboardEntry(rows, time.monotonic() + self._ttl)
+        if generation == self.generation(guild_id, claimable):
+            self._entries[(guild_id, claimable)] = entry
+        return entry
+
+    def record_score(self, guild_id: int, user_id: int, claimable: Claimable, delta: int):
+        self._generations[(guild_id, claimable)] = self.generation(guild_id, claimable) + 1
+        entry: LeaderboardEntry | None = self._entries.get((guild_id, claimable))
+        if entry is None:
+            return
+
+        scores: dict[int, int] = dict(entry.Rows)
+        if user_id in scores:
+            scores[user_id] += delta
+        elif len(entry.Rows) < constants.LEADERBOARD_FETCH:
+            # Every scorer in the guild is already cached, so this must be their first score here
+            scores[user_id] = delta
+        else:
+            # Their previous score isn't known, so they may or may not have overtaken the bottom of the cached rows
+            del self._entries[(guild_id, claimable)]
+            self.Invalidations += 1
+            return
+
+        entry.Rows = sorted(scores.items(), key=lambda row: row[1], reverse=True)[:constants.LEADERBOARD_FETCH]
+        entry.Embed = None
+        self.Patches += 1
+
+    def evict(self, guild_id: int):
+        for claimable in Claimable:
+            self._generations[(guild_id, claimable)] = self.generation(guild_id, claimable) + 1
+            self._entries.pop((guild_id, claimable), None)
+
+    def snapshot(self) -> dict[str, int]:
+        return {
+            "entries": len(self._entries),
+            "hits": self.Hits,
+            "misses": self.Misses,
+            "patches": self.Patches,
+            "invalidations": self.Invalidations
+        }
+
+
+class LastReactorCache:
+    """
+    The last user to react to a message in each guild. Changes are remembered so they can be written to the database
+    in the background, rather than on every reaction.
+    """
+
+    def __init__(self):
+        self._reactors: dict[int, int] = {}
+        self._dirty: set[int] = set()
+
+    def load(self, guild_id: int, user_id: int | None):
+        # Anything already here is newer than what was stored
+        if user_id is not None:
+            self._reactors.setdefault(guild_id, user_id)
+
+    def swap(self, guild_id: int, user_id: int) -> bool:
+        """
+        Records a reaction. Returns False if the same user also made the previous reaction in the guild.
+        """
+        if self._reactors.get(guild_id) == user_id:
+            return False
+
+        self._reactors[guild_id] = user_id
+        self._dirty.add(guild_id)
+        return True
+
+    def take_dirty(self) -> list[tuple[int, int]]:
+        dirty: list[tuple[int, int]] = [(guild_id, self._reactors[guild_id]) for guild_id in self._dirty]
+        self._dirty.clear()
+        return dirty
+
+    def mark_dirty(self, guild_ids: list[int]):
+        self._dirty.update(guild_ids)
+
+
+class MemberNameCache:
+    """
+    Display names of recently seen or looked up members, so the leaderboard doesn't need every member in memory.
+    Members known to have left are kept too, as None, so they aren't looked up again and again. Holds up to
+    max_entries members, dropping the least recently used, and names are refreshed after ttl seconds.
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self._max_entries: int = max_entries
+        self._ttl: float = ttl
+        # (guild ID, user ID) to the name and when it expires, least recently used first
+        self._names: OrderedDict[tuple[int, int], tuple[str | None, float]] = OrderedDict()
+        self.Hits: int = 0
+        self.Misses: int = 0
+
+    def get(self, guild_id: int, user_id: int) -> tuple[bool, str | None]:
+        """
+        Looks up a member's name.
+        :return: Whether the member is known, and their name, or None if they've left.
+        """
+        entry: tuple[str | None, float] | None = self._names.get((guild_id, user_id))
+        if entry is None or entry[1] <= time.monotonic():
+            self.Misses += 1
+            return False, None
+
+        self.Hits += 1
+        self._names.move_to_end((guild_id, user_id))
+        return True, entry[0]
+
+    def put(self, guild_id: int, user_id: int, name: str | None):
+        self._names[(guild_id, user_id)] = (name, time.monotonic() + self._ttl)
+        self._names.move_to_end((guild_id, user_id))
+        while len(self._names) > self._max_entries:
+            self._names.popitem(last=False)
+
+    def snapshot(self) -> dict[str, int]:
+        return {
+            "entries": len(self._names),
+            "hits": self.Hits,
+            "misses": self.Misses
+        }
+
+
+class GuildContentCache:
+    """
+    Each guild's ContentPack, loaded the first time the guild needs it and dropped whenever its content changes.
+    Every change to a guild's content moves it on to a new generation, so a load that started before the change can
+    tell that what it read is out of date, and isn't kept.
+    """
+
+    def __init__(self):
+        # Guild ID to its pack, and when that expires (time.monotonic()) if it's only a stand-in
+        self._packs: dict[int, tuple[ContentPack, float | None]] = {}
+        self._generations: dict[int, int] = {}
+        self.Hits: int = 0
+        self.Misses: int = 0
+
+    def get(self, guild_id: int) -> ContentPack | None:
+        entry: tuple[ContentPack, float | None] | None = self._packs.get(guild_id)
+        if entry is not None and entry[1] is not None and entry[1] <= time.monotonic():
+            del self._packs[guild_id]
+            entry = None
+
+        if entry is None:
+            self.Misses += 1
+            return None
+
+        self.Hits += 1
+        return entry[0]
+
+    def generation(self, guild_id: int) -> int:
+        return self._generations.get(guild_id, 0)
+
+    def put(self, guild_id: int, generation: int, pack: ContentPack, ttl: float | None = None):
+        """
+        Keeps a guild's pack, unless the guild's content has changed since generation.
+        :param ttl: Seconds until the pack is dropped, or None to keep it until the content changes.
+        """
+        if generation == self.generation(guild_id):
+            self._packs[guild_id] = (pack, time.monotonic() + ttl if ttl is not None else None)
+
+    def evict(self, guild_id: int):
+        self._generations[guild_id] = self.generation(guild_id) + 1
+        self._packs.pop(guild_id, None)
+
+    def snapshot(self) -> dict[str, int]:
+        return {
+            "entries": len(self._packs),
+            "hits": self.Hits,
+            "misses": self.Misses
+        }
+
+
+SPAWN_STATES: SpawnStateCache = SpawnStateCache()
+LEADERBOARDS: LeaderboardCache = LeaderboardCache(config.LEADERBOARD_TTL)
+LAST_REACTORS: LastReactorCache = LastReactorCache()
+MEMBER_NAMES: MemberNameCache = MemberNameCache(config.MEMBER_NAME_CACHE_SIZE, config.MEMBER_NAME_TTL)
+GUILD_CONTENT: GuildContentCache = GuildContentCache()
+# Guild ID to the ID of its jail role, for guilds that have one
+JAIL_ROLES: dict[int, int] = {}
+
+# Channels other processes announce changes on (see cachestore.invalidate). Normally only the process running a guild's
+# shard has it cached, but during a rolling restart or a change in shard count, two can hold the same guild at once.
+SPAWN_STATES_CHANNEL: str = "nerdbot:spawn-states"
+LEADERBOARDS_CHANNEL: str = "nerdbot:leaderboards"
+JAIL_ROLES_CHANNEL: str = "nerdbot:jail-roles"
+GUILD_CONTENT_CHANNEL: str = "nerdbot:guild-content"
+
+cachestore.on_invalidate(SPAWN_STATES_CHANNEL, SPAWN_STATES.evict)
+cachestore.on_invalidate(LEADERBOARDS_CHANNEL, LEADERBOARDS.evict)
+cachestore.on_invalidate(JAIL_ROLES_CHANNEL, lambda guild_id: JAIL_ROLES.pop(guild_id, None))
+cachestore.on_invalidate(GUILD_CONTENT_CHANNEL, GUILD_CONTENT.evict)
@@ -0,0 +1,317 @@
+"""cachestore.py"""
+
+# IMPORTS #
+from abc import ABC, abstractmethod
+import asyncio
+from collections import OrderedDict
+import logging
+import time
+from typing import Any, Callable
+import uuid
+
+import config
+
+"""
+    A key-value store for state that has to be agreed on by every bot process, such as who claimed a crate, and a way
+    to tell the other processes when something they may have cached has changed. Chosen by CACHE_BACKEND:
+        local - in this process only, as an LRU of up to CACHE_MAX_ENTRIES keys. Right for a single process.
+        redis - a Redis server (or anything speaking its protocol), at CACHE_URL, shared by every process.
+    Values are strings, and both stores behave the same, so the local store can stand in for Redis when testing.
+    Store errors are logged and treated as a miss rather than raised, so a Redis outage never crashes the bot. A
+    compare-and-set that fails reports it, rather than looking like a lost race, and compare_and_set() below settles it
+    in this process instead.
+"""
+
+Subscriber = Callable[[str], None]
+
+
+class CacheStore(ABC):
+    """
+    The operations every store provides.
+    """
+
+    def __init__(self):
+        self._subscribers: dict[str, list[Subscriber]] = {}
+
+    async def start(self):
+        pass
+
+    async def close(self):
+        pass
+
+    @abstractmethod
+    async def get(self, key: str) -> str | None:
+        pass
+
+    @abstractmethod
+    async def set(self, key: str, value: str, ttl: float | None = None):
+        """
+        Stores a value.
+        :param key: The key.
+        :param value: The value.
+        :param ttl: Seconds until the key expires, or None to keep it until it's changed (or, locally, evicted).
+        """
+
+    @abstractmethod
+    async def delete(self, key: str):
+        pass
+
+    @abstractmethod
+    async def compare_and_set(self,
+                              key: str,
+                              expected: str | None,
+                              value: str | None,
+                              ttl: float | None = None) -> bool | None:
+        """
+        Changes a value only if it's still what the caller last saw, as a single step, so that when several callers
+        race, exactly one of them wins.
+        :param key: The key.
+        :param expected: The value the key must hold, or None if it mustn't exist.
+        :param value: The new value, or None to delete the key.
+        :param ttl: Seconds until the new value expires, or None to keep it.
+        :return: Whether the value was changed, or None if the store couldn't be reached.
+        """
+
+    @abstractmethod
+    async def publish(self, channel: str, message: str):
+        pass
+
+    def subscribe(self, channel: str, callback: Subscriber):
+        """
+        Calls back, on the event loop, with every message published to a channel. Must be called before start().
+        """
+        self._subscribers.setdefault(channel, []).append(callback)
+
+    def _deliver(self, channel: str, message: str):
+        for callback in self._subscribers.get(channel, []):
+            try:
+                callback(message)
+            except Exception:
+                logging.exception(f"Subscriber to {channel} failed")
+
+
+class LocalStore(CacheStore):
+    """
+    Keeps keys in this process, dropping the least recently used once there are more than max_entries.
+    Nothing here awaits, so every operation is atomic as far as the event loop is concerned.
+    """
+
+    def __init__(self, max_entries: int):
+        super().__init__()
+        self._max_entries: int = max_entries
+        # Key to its value and when it expires (time.monotonic()), least recently used first
+        self._entries: OrderedDict[str, tuple[str, float | None]] = OrderedDict()
+
+    def _get(self, key: str) -> str | None:
+        entry: tuple[str, float | None] | None = self._entries.get(key)
+        if entry is None:
+            return None
+
+        value, expires = entry
+        if expires is not None and expires <= time.monotonic():
+            del self._entries[key]
+            return None
+
+        self._entries.move_to_end(key)
+        return value
+
+    def _set(self, key: str, value: str, ttl: float | None):
+        self._entries[key] = (value, time.monotonic() + ttl if ttl is not None else None)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+
+    async def get(self, key: str) -> str | None:
+        return self._get(key)
+
+    async def set(self, key: str, value: str, ttl: float | None = None):
+        self._set(key, value, ttl)
+
+    async def delete(self, key: str):
+        self._entries.pop(key, None)
+
+    async def compare_and_set(self,
+                              key: str,
+                              expected: str | None,
+                              value: str | None,
+                              ttl: float | None = None) -> bool | None:
+        if self._get(key) != expected:
+            return False
+
+        if value is None:
+            self._entries.pop(key, None)
+        else:
+            self._set(key, value, ttl)
+        return True
+
+    async def publish(self, channel: str, message: str):
+        # Delivered later, as it would be from Redis, so subscribers never run in the middle of the publisher
+        asyncio.get_running_loop().call_soon(self._deliver, channel, message)
+
+
+class RedisStore(CacheStore):
+    """
+    Keeps keys in Redis, so every process sees the same values. Needs the redis package, which is only imported
+    when this store is used.
+    """
+
+    # Compare-and-set has to happen inside Redis to be atomic. ARGV: has expected, expected, has value, value, TTL (ms)
+    _COMPARE_AND_SET: str = """
+        local current = redis.call('GET', KEYS[1])
+        if ARGV[1] == '1' then
+            if current ~= ARGV[2] then return 0 end
+        elseif current then
+            return 0
+        end
+        if ARGV[3] == '0' then
+            redis.call('DEL', KEYS[1])
+        elseif tonumber(ARGV[5]) > 0 then
+            redis.call('SET', KEYS[1], ARGV[4], 'PX', ARGV[5])
+        else
+            redis.call('SET', KEYS[1], ARGV[4])
+        end
+        return 1
+    """
+
+    def __init__(self, client: Any):
+        """
+        :param client: A redis.asyncio client, created with decode_responses=True.
+        """
+        super().__init__()
+        from redis.exceptions import RedisError
+
+        self._errors: tuple[type[Exception], ...] = (RedisError, OSError)
+        self._client: Any = client
+        self._compare_and_set: Any = client.register_script(self._COMPARE_AND_SET)
+        self._pubsub: Any = None
+        self._listener: asyncio.Task | None = None
+
+    @classmethod
+    def from_url(cls, url: str) -> "RedisStore":
+        import redis.asyncio
+
+        return cls(redis.asyncio.from_url(url, decode_responses=True))
+
+    async def start(self):
+        if not self._subscribers or self._listener is not None:
+            return
+
+        self._pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+        self._listener = asyncio.create_task(self._listen())
+
+    async def _listen(self):
+        while True:
+            try:
+                await self._pubsub.subscribe(*self._subscribers)
+                async for message in self._pubsub.listen():
+                    if message["type"] == "message":
+                        self._deliver(message["channel"], message["data"])
+            except self._errors as error:
+                # Messages sent while disconnected are lost, which at worst leaves another process with a stale copy
+                logging.error(f"Lost the cache subscription, retrying: {error}")
+                await asyncio.sleep(1)
+
+    async def close(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            self._listener = None
+        if self._pubsub is not None:
+            await self._pubsub.aclose()
+            self._pubsub = None
+        await self._client.aclose()
+
+    async def get(self, key: str) -> str | None:
+        try:
+            return await self._client.get(key)
+        except self._errors as error:
+            logging.error(f"Cache get of {key} failed: {error}")
+            return None
+
+    async def set(self, key: str, value: str, ttl: float | None = None):
+        try:
+            await self._client.set(key, value, px=int(ttl * 1000) if ttl is not None else None)
+        except self._errors as error:
+            logging.error(f"Cache set of {key} failed: {error}")
+
+    async def delete(self, key: str):
+        try:
+            await self._client.delete(key)
+        except self._errors as error:
+            logging.error(f"Cache delete of {key} failed: {error}")
+
+    async def compare_and_set(self,
+                              key: str,
+                              expected: str | None,
+                              value: str | None,
+                              ttl: float | None = None) -> bool | None:
+        args: list[str | int] = [
+            int(expected is not None), expected or "",
+            int(value is not None), value or "",
+            int(ttl * 1000) if ttl is not None else 0
+        ]
+        try:
+            return bool(await self._compare_and_set(keys=[key], args=args))
+        except self._errors as error:
+            logging.error(f"Cache compare-and-set of {key} failed: {error}")
+            return None
+
+    async def publish(self, channel: str, message: str):
+        try:
+            await self._client.publish(channel, message)
+        except self._errors as error:
+            logging.error(f"Cache publish to {channel} failed: {error}")
+
+
+def create_store() -> CacheStore:
+    if config.CACHE_BACKEND == "local":
+        return LocalStore(config.CACHE_MAX_ENTRIES)
+    if config.CACHE_BACKEND == "redis":
+        return RedisStore.from_url(config.CACHE_URL)
+
+    raise ValueError(f"Unknown CACHEBACKEND '{config.CACHE_BACKEND}'. Expected one of: local, redis.")
+
+
+STORE: CacheStore = create_store()
+# Settles compare-and-sets in this process while STORE can't be reached
+_FALLBACK: LocalStore = LocalStore(config.CACHE_MAX_ENTRIES)
+
+# Tells this process's own messages apart from everyone else's
+_ORIGIN: str = uuid.uuid4().hex
+
+
+async def compare_and_set(key: str, expected: str | None, value: str | None, ttl: float | None = None) -> bool:
+    """
+    Changes a value only if it's still what the caller last saw (see CacheStore.compare_and_set). If the store can't
+    be reached, it's settled among this process's callers alone. A guild is normally only handled by one process, so
+    that still lets exactly one of them win.
+    :return: Whether the value was changed.
+    """
+    changed: bool | None = await STORE.compare_and_set(key, expected, value, ttl)
+    if changed is None:
+        logging.warning(f"Settling compare-and-set of {key} in this process only, as the cache store is unavailable.")
+        changed = await _FALLBACK.compare_and_set(key, expected, value, ttl)
+
+    return bool(changed)
+
+
+async def invalidate(channel: str, guild_id: int):
+    """
+    Tells the other processes that a guild's entry in a cache has changed, so they drop any copy they hold.
+    :param channel: The cache's channel.
+    :param guild_id: The guild whose entry changed.
+    """
+    await STORE.publish(channel, f"{_ORIGIN}:{guild_id}")
+
+
+def on_invalidate(channel: str, evict: Callable[[int], None]):
+    """
+    Evicts a guild from a cache whenever another process invalidates it.
+    :param channel: The cache's channel.
+    :param evict: Drops a guild's entry, given its ID.
+    """
+    def receive(message: str):
+        origin, guild_id = message.split(":", 1)
+        if origin != _ORIGIN:
+            evict(int(guild_id))
+
+    STORE.subscribe(channel, receive)
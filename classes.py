@@ -1,5 +1,8 @@
 import logging
 
+from threading import Lock
+from typing import Any
+
 from enums import ErrorType, WarningType
 
 from types import UnionType
@@ -22,3 +25,241 @@ class Error:
             logging.warning(f"{self.Status.name}: {self.Message}")
         elif type(self.Status) == ErrorType:
             logging.error(f"{self.Status.name}: {self.Message}")
+
+
+class PoolStats:
+    """
+    Counters for connections borrowed from the database pool. Updated from whichever thread borrows the connection.
+    """
+
+    def __init__(self):
+        self._lock: Lock = Lock()
+        self.Borrowed: int = 0
+        self.InUse: int = 0
+        self.Timeouts: int = 0
+        self.Reconnects: int = 0
+        self.TotalWait: float = 0.0
+        self.MaxWait: float = 0.0
+
+    def record_borrow(self, wait: float):
+        with self._lock:
+            self.Borrowed += 1
+            self.InUse += 1
+            self.TotalWait += wait
+            self.MaxWait = max(self.MaxWait, wait)
+
+    def record_release(self):
+        with self._lock:
+            self.InUse -= 1
+
+    def record_timeout(self, wait: float):
+        with self._lock:
+            self.Timeouts += 1
+            self.TotalWait += wait
+            self.MaxWait = max(self.MaxWait, wait)
+
+    def record_reconnect(self):
+        with self._lock:
+            self.Reconnects += 1
+
+    def snapshot(self) -> dict[str, int | float]:
+        with self._lock:
+            return {
+                "borrowed": self.Borrowed,
+                "inUse": self.InUse,
+                "timeouts": self.Timeouts,
+                "reconnects": self.Reconnects,
+                "totalWait": self.TotalWait,
+                "maxWait": self.MaxWait,
+                "averageWait": self.TotalWait / self.Borrowed if self.Borrowed else 0.0
+            }
+
+
+class ExecutorStats:
+    """
+    Queue depth and timing counters for repository calls offloaded from the event loop.
+    Only ever updated from the event loop thread, so no locking is needed.
+    """
+
+    def __init__(self):
+        self.Calls: int = 0
+        self.Waiting: int = 0
+        self.MaxWaiting: int = 0
+        self.Running: int = 0
+        self.TotalQueueWait: float = 0.0
+        self.MaxQueueWait: float = 0.0
+
+    def record_queued(self):
+        self.Calls += 1
+        self.Waiting += 1
+        self.MaxWaiting = max(self.MaxWaiting, self.Waiting)
+
+    def record_started(self, wait: float):
+        self.Waiting -= 1
+        self.Running += 1
+        self.TotalQueueWait += wait
+        self.MaxQueueWait = max(self.MaxQueueWait, wait)
+
+    def record_finished(self):
+        self.Running -= 1
+
+    def snapshot(self) -> dict[str, int | float]:
+        return {
+            "calls": self.Calls,
+            "waiting": self.Waiting,
+            "maxWaiting": self.MaxWaiting,
+            "running": self.Running,
+            "totalQueueWait": self.TotalQueueWait,
+            "maxQueueWait": self.MaxQueueWait,
+            "averageQueueWait": self.TotalQueueWait / self.Calls if self.Calls else 0.0
+        }
+
+
+class LatencyHistogram:
+    """
+    Counts timings into fixed buckets, so percentiles can be estimated without keeping every sample.
+    Not thread-safe by itself; QueryStats guards every histogram with its own lock.
+    """
+
+    # Upper bound of each bucket, in seconds. Anything slower goes in a final, unbounded bucket.
+    BUCKETS: tuple[float, ...] = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self):
+        self.Counts: list[int] = [0] * (len(self.BUCKETS) + 1)
+        self.Count: int = 0
+        self.Sum: float = 0.0
+        self.Max: float = 0.0
+
+    def record(self, seconds: float):
+        index: int = 0
+        while index < len(self.BUCKETS) and seconds > self.BUCKETS[index]:
+            index += 1
+
+        self.Counts[index] += 1
+        self.Count += 1
+        self.Sum += seconds
+        self.Max = max(self.Max, seconds)
+
+    def percentile(self, fraction: float) -> float:
+        """
+        Estimates a percentile as the upper bound of the bucket it falls in (or the slowest time seen, if lower).
+        :param fraction: The percentile wanted, between 0 and 1.
+        :return: The estimate, in seconds.
+        """
+        if not self.Count:
+            return 0.0
+
+        target: float = fraction * self.Count
+        seen: int = 0
+        for index, count in enumerate(self.Counts):
+            seen += count
+            if seen >= target:
+                return min(self.BUCKETS[index], self.Max) if index < len(self.BUCKETS) else self.Max
+
+        return self.Max
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            "count": self.Count,
+            "sum": self.Sum,
+            "max": self.Max,
+            "p50": self.percentile(0.5),
+            "p99": self.percentile(0.99),
+            "buckets": list(zip([*self.BUCKETS, float("inf")], self.Counts))
+        }
+
+
+class QueryStats:
+    """
+    Timings for each repository function, split into the phases of a call (waiting for a connection, running
+    statements and fetching rows), along with a count of each kind of error returned. Updated from whichever thread
+    runs the call.
+    """
+
+    PHASES: tuple[str, ...] = ("total", "acquire", "execute", "fetch")
+
+    def __init__(self):
+        self._lock: Lock = Lock()
+        self._histograms: dict[str, dict[str, LatencyHistogram]] = {}
+        self._errors: dict[str, dict[str, int]] = {}
+
+    def _function(self, name: str) -> dict[str, LatencyHistogram]:
+        # Must be called with the lock held
+        histograms: dict[str, LatencyHistogram] | None = self._histograms.get(name)
+        if histograms is None:
+            histograms = self._histograms[name] = {phase: LatencyHistogram() for phase in self.PHASES}
+            self._errors[name] = {}
+        return histograms
+
+    def record(self, name: str, phases: dict[str, float], error: str | None = None):
+        """
+        Records one call.
+        :param name: The repository function called.
+        :param phases: Seconds spent in each phase. Phases that weren't reached can be left out.
+        :param error: The name of the error returned, if any.
+        """
+        with self._lock:
+            histograms: dict[str, LatencyHistogram] = self._function(name)
+            for phase, seconds in phases.items():
+                histograms[phase].record(seconds)
+            if error is not None:
+                self._errors[name][error] = self._errors[name].get(error, 0) + 1
+
+    def snapshot(self) -> dict[str, dict[str, Any]]:
+        with self._lock:
+            return {
+                name: {
+                    "calls": histograms["total"].Count,
+                    "errors": dict(self._errors[name]),
+                    **{phase: histogram.snapshot() for phase, histogram in histograms.items()}
+                } for name, histograms in self._histograms.items()
+            }
+
+
+class CommandStats:
+    """
+    Invocation counts and latencies for each bot command, by outcome.
+    """
+
+    def __init__(self):
+        self._lock: Lock = Lock()
+        self._latencies: dict[str, LatencyHistogram] = {}
+        self._outcomes: dict[str, dict[str, int]] = {}
+
+    def record(self, command: str, outcome: str, seconds: float):
+        with self._lock:
+            self._latencies.setdefault(command, LatencyHistogram()).record(seconds)
+            outcomes: dict[str, int] = self._outcomes.setdefault(command, {})
+            outcomes[outcome] = outcomes.get(outcome, 0) + 1
+
+    def snapshot(self) -> dict[str, dict[str, Any]]:
+        with self._lock:
+            return {
+                command: {
+                    "outcomes": dict(self._outcomes[command]),
+                    "latency": histogram.snapshot()
+                } for command, histogram in self._latencies.items()
+            }
+
+
+class StallStats:
+    """
+    Times the event loop was blocked, by the handler running and the line of our code it was stuck on.
+    """
+
+    def __init__(self):
+        self._lock: Lock = Lock()
+        self._durations: dict[str, LatencyHistogram] = {}
+        self._sites: dict[tuple[str, str], int] = {}
+
+    def record(self, handler: str, site: str, seconds: float):
+        with self._lock:
+            self._durations.setdefault(handler, LatencyHistogram()).record(seconds)
+            self._sites[(handler, site)] = self._sites.get((handler, site), 0) + 1
+
+    def snapshot(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "durations": {handler: histogram.snapshot() for handler, histogram in self._durations.items()},
+                "sites": dict(self._sites)
+            }
@@ -0,0 +1,316 @@
+"""cluster.py"""
+
+# IMPORTS #
+import argparse
+import asyncio
+import json
+import logging
+import os
+import signal
+import sys
+import urllib.request
+from typing import Any
+
+from aiohttp import ClientError, ClientSession, ClientTimeout, web
+
+import config
+
+"""
+    Runs the bot as several processes, each with its own range of shards, for when one process can't keep up.
+        python cluster.py --processes 4 [--shards 16]
+    Each process is bot.py, started with SHARDCOUNT and SHARDIDS set, and its web server on a port of its own on
+    localhost. Processes are started one at a time, each once the one before is ready, to stay within Discord's limit
+    on how quickly shards can connect, and are restarted if they exit.
+    The cluster's own web server, on WEBHOST:WEBPORT, stands in for a single bot's: /healthz and /readyz only pass if
+    they pass for every process, and /metrics joins every process's metrics, labelled with the process's cluster ID.
+"""
+
+_GATEWAY_URL: str = "https://discord.com/api/v10/gateway/bot"
+# How long to wait for a process to be ready before starting the next anyway, per shard it runs
+_READY_TIMEOUT_PER_SHARD: float = 15.0
+_MAX_RESTART_DELAY: float = 60.0
+
+
+def fetch_recommended_shards(token: str) -> int:
+    """
+    Asks Discord how many shards the bot should run.
+    :param token: The bot token.
+    :return: The recommended shard count.
+    """
+    request: urllib.request.Request = urllib.request.Request(_GATEWAY_URL, headers={
+        "Authorization": f"Bot {token}",
+        "User-Agent": "NerdBot cluster launcher"
+    })
+    with urllib.request.urlopen(request, timeout=10) as response:
+        return int(json.load(response)["shards"])
+
+
+def split_shards(shard_count: int, processes: int) -> list[list[int]]:
+    """
+    Splits the shards into contiguous ranges, as evenly as possible.
+    :param shard_count: The total number of shards.
+    :param processes: The number of processes to split them across.
+    :return: The shard IDs for each process.
+    """
+    processes = min(processes, shard_count)
+    size, extra = divmod(shard_count, processes)
+    ranges: list[list[int]] = []
+    start: int = 0
+    for index in range(processes):
+        end: int = start + size + (1 if index < extra else 0)
+        ranges.append(list(range(start, end)))
+        start = end
+
+    return ranges
+
+
+def add_label(line: str, key: str, value: str) -> str:
+    """
+    Adds a label to a Prometheus sample line.
+    :param line: The sample, e.g. 'name{a="b"} 1'.
+    :param key: The label name.
+    :param value: The label value.
+    :return: The sample with the label added first.
+    """
+    brace: int = line.find("{")
+    space: int = line.find(" ")
+    if brace != -1 and brace < space:
+        return f'{line[:brace + 1]}{key}="{value}",{line[brace + 1:]}'
+
+    return f'{line[:space]}{{{key}="{value}"}}{line[space:]}'
+
+
+def merge_metrics(pages: dict[int, str]) -> str:
+    """
+    Joins the metrics pages of every process into one, with each sample labelled by the process it came from.
+    Samples of the same metric are kept together, as the text format requires.
+    :param pages: Each process's metrics page, by cluster ID.
+    :return: The combined page.
+    """
+    headers: dict[str, list[str]] = {}
+    samples: dict[str, list[str]] = {}
+    for cluster_id, page in pages.items():
+        family: str | None = None
+        for line in page.splitlines():
+            if line.startswith("# HELP ") or line.startswith("# TYPE "):
+                family = line.split(" ", 3)[2]
+                family_headers: list[str] = headers.setdefault(family, [])
+                samples.setdefault(family, [])
+                if line not in family_headers:
+                    family_headers.append(line)
+            elif line and family is not None:
+                samples[family].append(add_label(line, "cluster", str(cluster_id)))
+
+    lines: list[str] = []
+    for family, family_headers in headers.items():
+        lines.extend(family_headers)
+        lines.extend(samples[family])
+
+    return "\n".join(lines) + "\n"
+
+
+class Worker:
+    """
+    One bot process, running a range of shards, restarted whenever it exits until the cluster is stopped.
+    """
+
+    def __init__(self, cluster_id: int, shard_ids: list[int], shard_count: int, port: int):
+        self.ClusterId: int = cluster_id
+        self.ShardIds: list[int] = shard_ids
+        self.Port: int = port
+        self.Restarts: int = 0
+        self._shard_count: int = shard_count
+        self._process: asyncio.subprocess.Process | None = None
+        self._supervisor: asyncio.Task | None = None
+        self._stopping: bool = False
+
+    @property
+    def running(self) -> bool:
+        return self._process is not None and self._process.returncode is None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.Port}"
+
+    async def _spawn(self):
+        env: dict[str, str] = {
+            **os.environ,
+            "SHARDCOUNT": str(self._shard_count),
+            "SHARDIDS": ",".join(str(shard_id) for shard_id in self.ShardIds),
+            "WEBHOST": "127.0.0.1",
+            "WEBPORT": str(self.Port)
+        }
+        self._process = await asyncio.create_subprocess_exec(
+            sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "bot.py"), env=env
+        )
+        logging.info(f"Cluster {self.ClusterId} started (pid {self._process.pid}) with shards {self.ShardIds}")
+
+    async def wait_ready(self, session: ClientSession):
+        # Gives up after a while rather than holding back the rest of the cluster forever
+        deadline: float = asyncio.get_running_loop().time() + _READY_TIMEOUT_PER_SHARD * len(self.ShardIds)
+        while self.running and asyncio.get_running_loop().time() < deadline:
+            try:
+                async with session.get(f"{self.url}/readyz") as response:
+                    if response.status == 200:
+                        return
+            except (ClientError, asyncio.TimeoutError):
+                pass
+            await asyncio.sleep(1)
+
+    async def run(self, session: ClientSession):
+        await self._spawn()
+        await self.wait_ready(session)
+        self._supervisor = asyncio.create_task(self._supervise())
+
+    async def _supervise(self):
+        while True:
+            code: int = await self._process.wait()
+            if self._stopping:
+                return
+
+            # Back off when it keeps failing, e.g. from a bad token or the database being down
+            self.Restarts += 1
+            delay: float = min(_MAX_RESTART_DELAY, 2 ** min(self.Restarts, 6))
+            logging.error(f"Cluster {self.ClusterId} exited with code {code}. Restarting in {delay:.0f}s")
+            await asyncio.sleep(delay)
+            if self._stopping:
+                return
+            await self._spawn()
+
+    async def stop(self):
+        self._stopping = True
+        if self._supervisor is not None:
+            self._supervisor.cancel()
+        if self.running:
+            # The bot closes itself on SIGTERM (see commands.setup_hook), flushing scores and reactors on the way out
+            self._process.terminate()
+            await self._process.wait()
+
+    async def get(self, session: ClientSession, path: str) -> tuple[int, str]:
+        """
+        Fetches a page from this process's web server.
+        :return: The status code and body, or 503 and the reason if it couldn't be reached.
+        """
+        if not self.running:
+            return 503, "not running"
+
+        try:
+            async with session.get(f"{self.url}{path}") as response:
+                return response.status, await response.text()
+        except (ClientError, asyncio.TimeoutError) as error:
+            return 503, f"unreachable: {error!r}"
+
+
+class Cluster:
+    """
+    The set of bot processes, and the web server reporting on all of them.
+    """
+
+    def __init__(self, workers: list[Worker]):
+        self._workers: list[Worker] = workers
+        self._session: ClientSession | None = None
+        self._runner: web.AppRunner | None = None
+
+    async def _gather(self, path: str) -> dict[int, tuple[int, str]]:
+        results: list[tuple[int, str]] = await asyncio.gather(
+            *(worker.get(self._session, path) for worker in self._workers)
+        )
+        return {worker.ClusterId: result for worker, result in zip(self._workers, results)}
+
+    async def _check(self, path: str) -> web.Response:
+        checks: dict[str, Any] = {}
+        for cluster_id, (status, body) in (await self._gather(path)).items():
+            try:
+                detail: Any = json.loads(body)
+            except ValueError:
+                detail = body
+            checks[str(cluster_id)] = {"ok": status == 200, "detail": detail}
+
+        ok: bool = all(check["ok"] for check in checks.values())
+        return web.json_response({"status": "ok" if ok else "failing", "clusters": checks}, status=200 if ok else 503)
+
+    async def home(self, request: web.Request) -> web.Response:
+        return web.Response(text="I'm alive")
+
+    async def healthz(self, request: web.Request) -> web.Response:
+        return await self._check("/healthz")
+
+    async def readyz(self, request: web.Request) -> web.Response:
+        return await self._check("/readyz")
+
+    async def metrics(self, request: web.Request) -> web.Response:
+        pages: dict[int, str] = {
+            cluster_id: body for cluster_id, (status, body) in (await self._gather("/metrics")).items() if status == 200
+        }
+        lines: list[str] = [
+            "# HELP nerdbot_cluster_up Whether each bot process is running and serving metrics.",
+            "# TYPE nerdbot_cluster_up gauge",
+            *(f'nerdbot_cluster_up{{cluster="{worker.ClusterId}"}} {int(worker.ClusterId in pages)}'
+              for worker in self._workers),
+            "# HELP nerdbot_cluster_restarts_total Times each bot process has been restarted.",
+            "# TYPE nerdbot_cluster_restarts_total counter",
+            *(f'nerdbot_cluster_restarts_total{{cluster="{worker.ClusterId}"}} {worker.Restarts}'
+              for worker in self._workers)
+        ]
+        body: str = "\n".join(lines) + "\n" + merge_metrics(pages)
+        return web.Response(body=body.encode("utf-8"),
+                            headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+
+    async def run(self):
+        self._session = ClientSession(timeout=ClientTimeout(total=5))
+
+        app: web.Application = web.Application()
+        app.add_routes([
+            web.get('/', self.home),
+            web.get('/healthz', self.healthz),
+            web.get('/readyz', self.readyz),
+            web.get('/metrics', self.metrics)
+        ])
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, config.WEB_HOST, config.WEB_PORT).start()
+
+        stop: asyncio.Event = asyncio.Event()
+        loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, stop.set)
+            except (AttributeError, NotImplementedError):
+                # Not available on Windows, where Ctrl+C raises KeyboardInterrupt instead
+                pass
+
+        try:
+            for worker in self._workers:
+                if stop.is_set():
+                    break
+                await worker.run(self._session)
+            await stop.wait()
+        finally:
+            await asyncio.gather(*(worker.stop() for worker in self._workers))
+            await self._runner.cleanup()
+            await self._session.close()
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(description="Run the bot as several sharded processes.")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1, help="Bot processes to run.")
+    parser.add_argument("--shards", type=int, default=config.SHARD_COUNT,
+                        help="Total shards. Defaults to SHARDCOUNT, or else the number Discord recommends.")
+    parser.add_argument("--base-port", type=int, default=config.WEB_PORT + 1,
+                        help="Web server port of the first process. The rest follow on from it.")
+    args: argparse.Namespace = parser.parse_args()
+
+    shard_count: int = args.shards or fetch_recommended_shards(os.environ['TOKEN'])
+    workers: list[Worker] = [
+        Worker(cluster_id, shard_ids, shard_count, args.base_port + cluster_id)
+        for cluster_id, shard_ids in enumerate(split_shards(shard_count, args.processes))
+    ]
+    logging.info(f"Running {shard_count} shards across {len(workers)} processes")
+
+    asyncio.run(Cluster(workers).run())
+
+
+if __name__ == "__main__":
+    main()
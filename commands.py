@@ -1,104 +1,239 @@
 """commands.py"""
 
 # IMPORTS #
+import asyncio
+from datetime import datetime
+import functools
+import signal
+
 import discord
 from discord import Reaction, User, Member, Guild, Message, Embed
-from discord.ext.commands import Bot
+from discord.ext.commands import Bot, CommandError, Context
 
+import cachestore
+import config
 import constants
+import contentpacks
+import fanout
 import functions
 
 from typing import Dict, Any, List, Tuple
 from types import UnionType
 
+import instrumentation
+import ledger
+import metrics
 import repository
-from enums import ModerationType
+import scheduler
+import stallwatch
+import webserver
+from classes import Error
+from enums import Claimable, ContentType, ModerationType
+from datatypes import Guild as RepoGuild
 
 # Types
 Channel: UnionType = discord.TextChannel | discord.Thread
 Person: UnionType = User | Member
 
+_background_tasks: List[asyncio.Task] = []
+# The shutdown started by SIGTERM, held so it isn't garbage collected part way through
+_shutdown: asyncio.Task | None = None
+# Timed mutes waiting to be lifted. Created in setup_hook, as it needs the bot
+MUTE_EXPIRIES: scheduler.ExpiryScheduler | None = None
+# One per guild, so two mutes at once can't both set up a jail role
+_jail_role_locks: Dict[int, asyncio.Lock] = {}
+
 
 # LISTEN EVENTS
+async def setup_hook(bot: Bot):
+    global MUTE_EXPIRIES
+
+    # Background work that lives for as long as the bot does
+    await cachestore.STORE.start()
+    ledger.SCORE_LEDGER.start()
+    metrics.LOOP_LAG.start()
+    stallwatch.WATCHDOG.start()
+    await webserver.start(bot)
+
+    MUTE_EXPIRIES = scheduler.ExpiryScheduler(functools.partial(expire_mute, bot))
+    for guild_id, user_id, expiry in await functions.get_pending_expiries(ModerationType.Mute) or []:
+        if functions.owns_guild(bot, guild_id):
+            MUTE_EXPIRIES.schedule(guild_id, user_id, expiry)
+    MUTE_EXPIRIES.start()
+
+    if config.REACTOR_PERSIST:
+        _background_tasks.append(asyncio.create_task(persist_last_reactors()))
+
+    # `kill -USR1 <pid>` logs the repository query timings gathered so far. SIGTERM (from cluster.py or docker stop)
+    # closes the bot as Ctrl+C would, so scores and reactors are flushed rather than lost. bot.run only handles Ctrl+C
+    try:
+        asyncio.get_running_loop().add_signal_handler(signal.SIGUSR1, instrumentation.dump_query_stats)
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, functools.partial(shut_down, bot))
+    except (AttributeError, NotImplementedError):
+        # Not available on Windows
+        pass
+
+
+def shut_down(bot: Bot):
+    global _shutdown
+
+    if _shutdown is None:
+        _shutdown = asyncio.create_task(bot.close())
+
+
+async def on_close(bot: Bot):
+    await webserver.stop()
+    stallwatch.WATCHDOG.stop()
+    metrics.LOOP_LAG.stop()
+    if MUTE_EXPIRIES is not None:
+        MUTE_EXPIRIES.stop()
+    for task in _background_tasks:
+        task.cancel()
+    _background_tasks.clear()
+
+    # Make sure no claimed scores or reactors are lost on the way out
+    await ledger.SCORE_LEDGER.stop()
+    if config.REACTOR_PERSIST:
+        await functions.flush_last_reactors()
+    await cachestore.STORE.close()
+
+
+async def persist_last_reactors():
+    while True:
+        await asyncio.sleep(config.REACTOR_FLUSH_INTERVAL)
+        await functions.flush_last_reactors()
+
+
+async def expire_mute(bot: Bot, guild_id: int, user_id: int):
+    await bot.wait_until_ready()
+
+    guild: Guild | None = bot.get_guild(guild_id)
+    if guild is None:
+        return
+
+    member: Member | None = guild.get_member(user_id)
+    if member is None:
+        try:
+            member = await guild.fetch_member(user_id)
+        except discord.NotFound:
+            # They've left, so there's no one to unmute. Their record stays in case they come back
+            return
+
+    await unrestrict(member, guild, None)
+
+
+async def on_command(ctx: Context):
+    metrics.command_started(ctx)
+
+
+async def on_command_completion(ctx: Context):
+    metrics.command_finished(ctx, "success")
+
+
+async def on_command_error(ctx: Context, error: CommandError):
+    metrics.command_finished(ctx, type(error).__name__)
+
+
 async def on_ready(bot: Bot):
     changelog: Dict[str, Any]
     latest_key: str
     changelog, latest_key = functions.retrieve_changelog()
+    latest_version: int = int(latest_key)
 
-    all_guilds = functions.get_all_guilds()
-    print(all_guilds)
-    all_guild_ids = [x["id"] for x in all_guilds]
+    all_guilds = await functions.get_all_guilds()
+    if all_guilds is None:
+        return
+    stored_guilds: Dict[int, RepoGuild] = {item["id"]: item for item in all_guilds}
+    functions.load_last_reactors(all_guilds)
+    functions.load_jail_roles(all_guilds)
 
-    send_changelog = False
+    new_guild_ids: List[int] = []
+    reactivated_guild_ids: List[int] = []
+    outdated_guilds: List[Guild] = []
     for guild in bot.guilds:
-        if all_guilds is None:
-            break
+        stored: RepoGuild | None = stored_guilds.get(guild.id)
 
         # If guild has not yet been added to the DB
-        if guild.id not in all_guild_ids:
-            functions.add_new_guild(guild.id)
-            send_changelog = True
+        if stored is None:
+            new_guild_ids.append(guild.id)
         # If guild had been added to the DB, removed the bot, then rejoined. Should never be needed
         # due to on_guild_join, but better safe than sorry
-        elif not next((item for item in all_guilds if item["id"] == guild.id and item["active"]), False):
-            functions.set_active_guild(guild.id)
-
-        # Encompasses rejoining guilds and pre-existing
-        if not send_changelog:
-            latest_sent = functions.get_guild_changelog_version(guild.id)
-            if latest_sent is None:
-                break
-            if latest_sent < int(latest_key):
-                send_changelog = True
-
-        if send_changelog:
-            send_changelog = False
-            functions.set_guild_changelog_version(guild.id, int(latest_key))
-            channel: discord.TextChannel = guild.system_channel
-            await channel.send(
-                f"# NEW UPDATE:\n{functions.format_update(changelog[latest_key])}"
-            )
+        elif not stored["active"]:
+            reactivated_guild_ids.append(guild.id)
+
+        # Encompasses new, rejoining and pre-existing guilds
+        if stored is None or (stored["changelog"] or 0) < latest_version:
+            outdated_guilds.append(guild)
+
+    if not await functions.reconcile_guilds(new_guild_ids, reactivated_guild_ids):
+        return
+
+    # on_ready can fire again after a reconnect, and during a rolling restart two processes can briefly hold the same
+    # shard, so a guild is only sent the update by whichever gets to claim it first
+    claimed_ids: List[int] | None = await functions.claim_changelog([guild.id for guild in outdated_guilds],
+                                                                    latest_version)
+    if claimed_ids is None:
+        return
+    claimed: set[int] = set(claimed_ids)
+
+    update: str = f"# NEW UPDATE:\n{functions.format_update(changelog[latest_key])}"
+    for guild in outdated_guilds:
+        if guild.id not in claimed:
+            continue
+
+        channel: discord.TextChannel | None = guild.system_channel
+        if channel is None:
+            continue
+
+        try:
+            await channel.send(update)
+        except discord.HTTPException:
+            # Missing permissions in one guild shouldn't stop the rest getting the update
+            continue
 
 
 async def on_guild_join(guild: Guild):
-    guild_result = functions.get_guild(guild.id)
+    guild_result = await functions.get_guild(guild.id)
     if guild_result is None:
         return
 
     # New guild
     if not guild_result:
-        functions.add_new_guild(guild.id)
+        await functions.add_new_guild(guild.id)
     # Rejoining so all the setup is already there
     else:
-        functions.set_active_guild(guild.id)
+        await functions.set_active_guild(guild.id)
+
+
+async def on_guild_channel_create(channel: discord.abc.GuildChannel):
+    # New channels need the jail role's deny too, or jailed users could talk in them
+    jail_role: discord.Role | None = functions.get_jail_role(channel.guild)
+    if jail_role is None or not isinstance(channel, discord.TextChannel):
+        return
+
+    await channel.set_permissions(jail_role, send_messages=False, send_messages_in_threads=False, reason="Jail")
 
 
 async def on_reaction_add(reaction: Reaction, user: Person):
     guild_id = reaction.message.guild.id
-    last_reactor = functions.get_last_reactor(guild_id)
-    if last_reactor is None:
+    # Only respond when the reactor changes, so one person can't spam the channel
+    if not functions.is_new_reactor(guild_id, user.id):
         return
 
-    if not last_reactor:
-        functions.set_last_reactor(guild_id, user.id)
-    else:
-        if user.id == last_reactor:
-            return
-        else:
-            functions.set_last_reactor(guild_id, user.id)
-
     try:
         reaction_name: str = str(reaction.emoji.name)
     except AttributeError:
         reaction_name: str = reaction.emoji
     # Sends corresponding message based on reaction made.
-    if reaction_name in constants.REACTION_IMAGES:
-        await reaction.message.channel.send(constants.REACTION_IMAGES[reaction_name])
+    pack: contentpacks.ContentPack = await functions.get_content_pack(guild_id)
+    if reaction_name in pack.ReactionImages:
+        await reaction.message.channel.send(pack.ReactionImages[reaction_name],
+                                            allowed_mentions=discord.AllowedMentions.none())
 
 
 # CUSTOM COMMANDS
 async def claim(guild: Guild, channel: Channel, author: Person):
-    current_claimable = functions.get_current_coin_claimable(guild.id)
+    current_claimable = await functions.get_current_coin_claimable(guild.id)
     if current_claimable is None:
         return
 
@@ -111,7 +246,12 @@ async def claim(guild: Guild, channel: Channel, author: Person):
         await channel.send("The crate is in a different channel. Claim it there!")
         return
 
-    member_info: Member = guild.get_member(author.id)
+    if not await functions.take_claimable(guild.id, Claimable.Coin, current_claimable["current"], author.id):
+        await channel.send("Too slow! Someone else got to the crate first.")
+        return
+
+    # The author comes from the command's message, so is already a member and needs no lookup in the member cache
+    member_info: Person = author
     score: int = functions.get_random_number(10, 30)
 
     await channel.send(
@@ -122,14 +262,14 @@ async def claim(guild: Guild, channel: Channel, author: Person):
     # Prepare and send edited message for the original crate message
     await functions.edit_crate_message(current_claimable["current"], channel, member_info)
 
-    functions.update_coin_score(member_info.id, score)
+    await functions.update_coin_score(guild.id, member_info.id, score)
 
-    functions.set_current_coin_claimable(guild.id, None, None)
-    functions.set_coin_last_caught(guild.id)
+    await functions.set_current_coin_claimable(guild.id, None, None)
+    await functions.set_coin_last_caught(guild.id)
 
 
 async def clam(guild: Guild, channel: Channel, author: Person):
-    current_claimable = functions.get_current_clam_claimable(guild.id)
+    current_claimable = await functions.get_current_clam_claimable(guild.id)
     if current_claimable is None:
         return
 
@@ -142,7 +282,12 @@ async def clam(guild: Guild, channel: Channel, author: Person):
         await channel.send("The clam to claim is clearly elsewhere. Claim it there!")
         return
 
-    member_info: Member = guild.get_member(author.id)
+    if not await functions.take_claimable(guild.id, Claimable.Clam, current_claimable["current"], author.id):
+        await channel.send("Too slow! Someone else got to the clam first.")
+        return
+
+    # The author comes from the command's message, so is already a member and needs no lookup in the member cache
+    member_info: Person = author
 
     await channel.send(
         f"{member_info.display_name} claimed the clam, clearing the clog of clams to claim."
@@ -151,14 +296,14 @@ async def clam(guild: Guild, channel: Channel, author: Person):
     # Prepare and send edited message for the original crate message
     await functions.edit_clam_message(current_claimable["current"], channel, member_info)
 
-    functions.update_clam_score(member_info.id)
+    await functions.update_clam_score(guild.id, member_info.id)
 
-    functions.set_current_clam_claimable(guild.id, None, None)
-    functions.set_clam_last_caught(guild.id)
+    await functions.set_current_clam_claimable(guild.id, None, None)
+    await functions.set_clam_last_caught(guild.id)
 
 
 async def coins(channel: Channel, author: Person):
-    score = functions.get_coin_score(author.id)
+    score = await functions.get_coin_score(author.id)
 
     await channel.send(
         f"You have **{score}** coins!"
@@ -166,21 +311,104 @@ async def coins(channel: Channel, author: Person):
 
 
 async def clams(channel: Channel, author: Person):
-    score = functions.get_clam_score(author.id)
+    score = await functions.get_clam_score(author.id)
 
     await channel.send(
         f"You have **{score}** clams!"
     )
 
 
+async def content(guild: Guild, channel: Channel, action: str | None, args: str | None):
+    words: List[str] = (args or "").split(maxsplit=1)
+    first: str | None = words[0].lower() if words else None
+    rest: str = words[1] if len(words) > 1 else ""
+    content_type: ContentType | None = contentpacks.CONTENT_TYPES.get(first) if first is not None else None
+
+    if action == "list" and (first is None or content_type is not None):
+        await list_content(guild, channel, content_type)
+    elif action == "add" and content_type is not None:
+        await add_content(guild, channel, content_type, rest)
+    elif action == "remove" and first is not None and first.isdigit():
+        await remove_content(guild, channel, int(first))
+    elif action == "defaults" and content_type is not None and rest.lower() in ("on", "off"):
+        if await functions.set_guild_content_defaults(guild.id, content_type, rest.lower() == "on"):
+            await channel.send(f"Built-in {first} content is now {rest.lower()}.")
+        else:
+            await channel.send("Something went wrong, and I couldn't change that. Try again later!")
+    else:
+        await channel.send(
+            "Try `content list [type]`, `content add <type> <content>`, `content remove <id>` or "
+            f"`content defaults <type> on/off`, where the type is one of: {', '.join(contentpacks.CONTENT_TYPES)}."
+        )
+
+
+async def list_content(guild: Guild, channel: Channel, content_type: ContentType | None):
+    pack: contentpacks.ContentPack = await functions.get_content_pack(guild.id)
+    lines: List[str] = [
+        contentpacks.describe_entry(entry) for entry in pack.Entries
+        if content_type is None or entry["type"] == content_type
+    ] or ["Nothing's been added yet."]
+
+    hidden: List[str] = [name for name, hidden_type in contentpacks.CONTENT_TYPES.items()
+                         if hidden_type in pack.HiddenDefaults and content_type in (None, hidden_type)]
+    if hidden:
+        lines.append(f"Built-in content is off for: {', '.join(hidden)}.")
+
+    # Keep within Discord's limit on message length
+    message: str = ""
+    for index, line in enumerate(lines):
+        if len(message) + len(line) > 1900:
+            message += f"...and {len(lines) - index} more."
+            break
+        message += line + "\n"
+
+    await channel.send(message, allowed_mentions=discord.AllowedMentions.none())
+
+
+async def add_content(guild: Guild, channel: Channel, content_type: ContentType, text: str):
+    pack: contentpacks.ContentPack = await functions.get_content_pack(guild.id)
+    if len(pack.Entries) >= constants.CONTENT_MAX_ENTRIES:
+        await channel.send(f"This server already has {constants.CONTENT_MAX_ENTRIES} pieces of content. "
+                           f"Remove some before adding more.")
+        return
+
+    entry: Tuple[str | None, str] | Error = contentpacks.parse_entry(content_type, text)
+    if isinstance(entry, Error):
+        await channel.send(entry.Message)
+        return
+
+    content_id: int | None = await functions.add_guild_content(guild.id, content_type, *entry)
+    if content_id is None:
+        await channel.send("Something went wrong, and I couldn't add that. Try again later!")
+        return
+
+    await channel.send(f"Added, with ID {content_id}.")
+
+
+async def remove_content(guild: Guild, channel: Channel, content_id: int):
+    removed: bool | None = await functions.remove_guild_content(guild.id, content_id)
+    if removed is None:
+        await channel.send("Something went wrong, and I couldn't remove that. Try again later!")
+    elif not removed:
+        await channel.send(f"There's no content with ID {content_id} here.")
+    else:
+        await channel.send(f"Removed {content_id}.")
+
+
 async def insult(channel: Channel, message: Message, author: Person, user: str):
     # Delete command call for anonymity
     await message.delete()
 
-    chosen_insult: int = functions.get_random_number(0, len(constants.INSULTS)-1)
-    insult_message: str = constants.INSULTS[chosen_insult].format(arg=user, arg2=f"<@!{author.id}>")
+    pack: contentpacks.ContentPack = await functions.get_content_pack(channel.guild.id)
+    if not pack.Insults:
+        await channel.send("I'm all out of insults. Add some with the content command!")
+        return
+
+    chosen_insult: int = functions.get_random_number(0, len(pack.Insults)-1)
+    insult_message: str = pack.Insults[chosen_insult].format(arg=user, arg2=f"<@!{author.id}>")
 
-    await channel.send(insult_message)
+    # Insults are meant to ping who they're aimed at, but not a whole role or the server
+    await channel.send(insult_message, allowed_mentions=discord.AllowedMentions(everyone=False, roles=False))
 
 
 async def meme(channel: Channel):
@@ -199,21 +427,131 @@ async def recent(channel: Channel):
     await channel.send(functions.format_update(data[latest_key]))
 
 
-async def restrict(member: Member, moderator: Person, guild: Guild):
-    permissions_revoked = []
+async def restrict(member: Member,
+                   moderator: Person,
+                   guild: Guild,
+                   channel: Channel,
+                   expiry: datetime | None = None) -> int | None:
+    existing: set[int] | bool | None = await functions.get_moderation_info(member.id, guild.id, ModerationType.Mute)
+    if existing is None:
+        return None
+
+    # Record the mute before touching any channels, so that a crash part way through leaves a record of what was
+    # changed for unbonk to undo. Bonking an already bonked user picks up any channels that were missed.
+    if existing is False:
+        if not await functions.set_moderation_info(member.id, guild.id, moderator.id, ModerationType.Mute,
+                                                   expiry=expiry):
+            return None
+    elif not await functions.set_moderation_expiry(member.id, guild.id, ModerationType.Mute, expiry):
+        # Bonking again replaces any earlier duration, including with none at all
+        return None
+
+    # The new expiry only starts being watched once the mute is in place, or a short one could lift it while channels
+    # were still being locked. The deadline still counts from when the bonk was asked for
+    MUTE_EXPIRIES.cancel(guild.id, member.id)
+    failed: int | None
+    if config.MUTE_MODE == "role":
+        failed = await restrict_with_role(member, guild, channel)
+    else:
+        failed = await restrict_with_channels(member, guild, channel)
+
+    if expiry is not None:
+        MUTE_EXPIRIES.schedule(guild.id, member.id, expiry)
+
+    return failed
+
+
+async def restrict_with_channels(member: Member, guild: Guild, channel: Channel) -> int | None:
+    # Only apply restriction on channels they could send messages in before
+    # This is important so the bot doesn't grant send_message permissions to all channels for that user later
+    targets: List[discord.TextChannel] = [
+        text_channel for text_channel in guild.text_channels
+        if text_channel.permissions_for(member).send_messages
+    ]
+
+    # Record every channel before editing any, so a crash part way through can't leave a locked channel that unbonk
+    # doesn't know about. Ones that turn out not to have been locked are taken off again afterwards
+    if not await functions.add_moderation_channels(member.id, guild.id, ModerationType.Mute,
+                                                   [text_channel.id for text_channel in targets]):
+        return None
+
+    progress: Message | None = None
+    if len(targets) > constants.FANOUT_PROGRESS_THRESHOLD:
+        progress = await channel.send(f"Bonking {member.display_name}... 0/{len(targets)} channels")
+
+    async def revoke(text_channel: discord.TextChannel):
+        await text_channel.set_permissions(
+            member,
+            send_messages=False,
+            reason="Bonk!"
+        )
+
+    async def report(done: List[discord.TextChannel], finished: int, total: int):
+        if progress is not None:
+            await progress.edit(content=f"Bonking {member.display_name}... {finished}/{total} channels")
+
+    result: fanout.FanOutResult = await fanout.fan_out(targets, revoke, report)
+
+    # Tried twice, as a channel left on the record is given an explicit allow on unbonk, rather than being put back as
+    # it was
+    failed_ids: List[int] = [text_channel.id for text_channel in result.Failed]
+    for _ in range(2):
+        if not failed_ids or await functions.remove_moderation_channels(member.id, guild.id, ModerationType.Mute,
+                                                                        failed_ids):
+            break
+
+    return len(result.Failed)
+
+
+async def provision_jail_role(guild: Guild, channel: Channel) -> Tuple[discord.Role, int] | None:
+    role: discord.Role | None = functions.get_jail_role(guild)
+    if role is not None:
+        return role, 0
+
+    async with _jail_role_locks.setdefault(guild.id, asyncio.Lock()):
+        # Another mute may have set the role up while this one waited
+        role = functions.get_jail_role(guild)
+        if role is not None:
+            return role, 0
+
+        return await create_jail_role(guild, channel)
+
+
+async def create_jail_role(guild: Guild, channel: Channel) -> Tuple[discord.Role, int] | None:
+    # First mute in this guild (or the role was deleted), so set the role up with a deny on every channel
+    role: discord.Role = await guild.create_role(name=constants.JAIL_ROLE_NAME,
+                                                 permissions=discord.Permissions.none(), reason="Jail role for bonk")
+
+    progress: Message | None = None
+    if len(guild.text_channels) > constants.FANOUT_PROGRESS_THRESHOLD:
+        progress = await channel.send(f"Setting up the jail... 0/{len(guild.text_channels)} channels")
 
-    for channel in guild.text_channels:
-        permissions = channel.permissions_for(member)
-        # Only apply restriction on channels they could send messages in before
-        # This is important so the bot doesn't grant send_message permissions to all channels for that user later
-        if permissions.send_messages:
-            permissions_revoked.append(channel.id)
-            await channel.set_permissions(
-                member,
-                send_messages=False,
-                reason="Bonk!"
-            )
-    functions.set_moderation_info(member.id, guild.id, moderator.id, ModerationType.Mute, permissions_revoked.__str__())
+    async def deny(text_channel: discord.TextChannel):
+        await text_channel.set_permissions(role, send_messages=False, send_messages_in_threads=False, reason="Jail")
+
+    async def report(done: List[discord.TextChannel], finished: int, total: int):
+        if progress is not None:
+            await progress.edit(content=f"Setting up the jail... {finished}/{total} channels")
+
+    result: fanout.FanOutResult = await fanout.fan_out(guild.text_channels, deny, report)
+
+    # Only saved once set up, so an interrupted setup starts again from scratch next time
+    if not await functions.set_jail_role(guild.id, role.id):
+        await role.delete(reason="Couldn't save jail role")
+        return None
+
+    return role, len(result.Failed)
+
+
+async def restrict_with_role(member: Member, guild: Guild, channel: Channel) -> int | None:
+    provisioned: Tuple[discord.Role, int] | None = await provision_jail_role(guild, channel)
+    if provisioned is None:
+        return None
+
+    role, failed = provisioned
+    await member.add_roles(role, reason="Bonk!")
+
+    return failed
 
 
 async def smite(channel: Channel, user: str, self: bool):
@@ -223,23 +561,50 @@ async def smite(channel: Channel, user: str, self: bool):
         await channel.send(f"The gods dislike you, {user}. They smite you into oblivion.")
 
 
-async def unrestrict(member: Member, guild: Guild) -> bool:
-    permissions_revoked: list[int] | bool = functions.get_moderation_info(member.id, guild.id, ModerationType.Mute)
+async def unrestrict(member: Member, guild: Guild, channel: Channel | None) -> int | None:
+    permissions_revoked: set[int] | bool | None = await functions.get_moderation_info(member.id, guild.id,
+                                                                                      ModerationType.Mute)
     # No permission revoked, so no changes to make
-    if type(permissions_revoked) == bool:
-        return False
-
-    for channel in guild.text_channels:
-        if channel.id in permissions_revoked:
-            await channel.set_permissions(
-                member,
-                send_messages=True,
-                reason="Unbonk!"
-            )
-
-    functions.remove_moderation_info(member.id, guild.id, ModerationType.Mute)
+    if permissions_revoked is None or type(permissions_revoked) == bool:
+        return None
+
+    # Covers mutes made in role mode, whichever mode is set now
+    jail_role: discord.Role | None = functions.get_jail_role(guild)
+    if jail_role is not None and jail_role in member.roles:
+        await member.remove_roles(jail_role, reason="Unbonk!")
+
+    # Channels may have been deleted since
+    targets: List[discord.abc.GuildChannel] = [
+        guild.get_channel(channel_id) for channel_id in permissions_revoked
+        if guild.get_channel(channel_id) is not None
+    ]
+
+    progress: Message | None = None
+    if channel is not None and len(targets) > constants.FANOUT_PROGRESS_THRESHOLD:
+        progress = await channel.send(f"Unbonking {member.display_name}... 0/{len(targets)} channels")
+
+    async def restore(text_channel: discord.abc.GuildChannel):
+        await text_channel.set_permissions(
+            member,
+            send_messages=True,
+            reason="Unbonk!"
+        )
+
+    async def report(done: List[discord.abc.GuildChannel], finished: int, total: int):
+        if progress is not None:
+            await progress.edit(content=f"Unbonking {member.display_name}... {finished}/{total} channels")
+
+    result: fanout.FanOutResult = await fanout.fan_out(targets, restore, report)
+
+    if result.Failed:
+        # Keep the channels that couldn't be restored, so running unbonk again can retry them
+        await functions.remove_moderation_channels(member.id, guild.id, ModerationType.Mute,
+                                                   [text_channel.id for text_channel in result.Succeeded])
+    else:
+        await functions.remove_moderation_info(member.id, guild.id, ModerationType.Mute)
+        MUTE_EXPIRIES.cancel(guild.id, member.id)
 
-    return True
+    return len(result.Failed)
 
 
 async def update(channel: Channel, version: str | None):
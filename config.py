@@ -0,0 +1,109 @@
+"""config.py"""
+
+# IMPORTS #
+import os
+
+from dotenv import load_dotenv
+
+# Runtime settings are read from environment variables (or the .env file), falling back to the defaults below.
+# Anything static that never needs changing per-deployment belongs in constants.py instead.
+load_dotenv()
+
+
+def _get_int(key: str, default: int) -> int:
+    value: str | None = os.environ.get(key)
+    return int(value) if value else default
+
+
+def _get_float(key: str, default: float) -> float:
+    value: str | None = os.environ.get(key)
+    return float(value) if value else default
+
+
+def _get_int_list(key: str) -> list[int] | None:
+    value: str | None = os.environ.get(key)
+    return [int(item) for item in value.split(',')] if value else None
+
+
+# Sharding. SHARDCOUNT is the total number of shards, left unset to use the number Discord recommends. SHARDIDS is
+# a comma-separated list of the shards this process runs, left unset to run all of them. cluster.py sets both for each
+# process it starts.
+SHARD_COUNT: int | None = _get_int('SHARDCOUNT', 0) or None
+SHARD_IDS: list[int] | None = _get_int_list('SHARDIDS')
+# discord.py only uses SHARDIDS alongside a shard count, so running some of the shards needs both
+if SHARD_IDS is not None and SHARD_COUNT is None:
+    raise ValueError("SHARDIDS is set, but SHARDCOUNT isn't. Set SHARDCOUNT to the total number of shards.")
+if SHARD_IDS is not None and any(not 0 <= shard_id < SHARD_COUNT for shard_id in SHARD_IDS):
+    raise ValueError(f"Every shard in SHARDIDS must be from 0 to {SHARD_COUNT - 1}, as SHARDCOUNT is {SHARD_COUNT}.")
+
+# Which members are kept in memory:
+#   all    - every member of every guild, loaded at startup. Memory grows with total members.
+#   active - only members Discord sends on its own (joins, changes, voice). Anyone else is looked up when needed, and
+#            their name remembered in a small cache. Memory grows with active members. The default.
+#   none   - no members at all, and no members intent. Names are looked up one at a time through the API.
+# Presences (online status) are never used, so are off unless PRESENCES is set.
+MEMBER_CACHE: str = os.environ.get('MEMBERCACHE', 'active').lower()
+PRESENCES: bool = os.environ.get('PRESENCES', '0').lower() not in ('0', 'false', 'no')
+# Names of members not in the member cache, e.g. for the leaderboard. Entries are refreshed after MEMBERNAMETTL seconds
+MEMBER_NAME_CACHE_SIZE: int = _get_int('MEMBERNAMECACHESIZE', 5000)
+MEMBER_NAME_TTL: float = _get_float('MEMBERNAMETTL', 3600.0)
+
+# Storage backend: "mysql", "sqlite" (a local file, given by DBPATH) or "memory" (nothing kept between runs)
+DB_BACKEND: str = os.environ.get('DBBACKEND', 'mysql').lower()
+DB_PATH: str = os.environ.get('DBPATH', 'nerdbot.db')
+
+# Database (MySQL only)
+DB_HOST: str | None = os.environ.get('HOST')
+DB_USER: str | None = os.environ.get('DBUSER')
+DB_PASSWORD: str | None = os.environ.get('DBPASS')
+DB_NAME: str | None = os.environ.get('DATABASE')
+
+# Connection pool
+DB_POOL_SIZE: int = _get_int('DBPOOLSIZE', 5)
+DB_POOL_TIMEOUT: float = _get_float('DBPOOLTIMEOUT', 5.0)
+
+# Maximum number of repository calls running off the event loop at once. Calls beyond this queue up.
+DB_MAX_CONCURRENCY: int = _get_int('DBMAXCONCURRENCY', DB_POOL_SIZE)
+
+# Score write-behind. Claimed scores are held in memory and written in batches every SCORE_FLUSH_INTERVAL seconds,
+# or sooner once SCORE_FLUSH_THRESHOLD users are waiting. An interval of 0 writes every claim straight away.
+SCORE_FLUSH_INTERVAL: float = _get_float('SCOREFLUSHINTERVAL', 5.0)
+SCORE_FLUSH_THRESHOLD: int = _get_int('SCOREFLUSHTHRESHOLD', 100)
+
+# Shared cache (see cachestore.py): "local" for a single process, or "redis" at CACHEURL when running several
+CACHE_BACKEND: str = os.environ.get('CACHEBACKEND', 'local').lower()
+CACHE_URL: str = os.environ.get('CACHEURL', 'redis://localhost:6379/0')
+CACHE_MAX_ENTRIES: int = _get_int('CACHEMAXENTRIES', 10000)
+
+# How long a rendered leaderboard can be reused for, in seconds, if no claims have changed it first
+LEADERBOARD_TTL: float = _get_float('LEADERBOARDTTL', 300.0)
+
+# The last user to react in each guild is tracked in memory. When REACTORPERSIST is on, changes are also written to
+# the database every REACTOR_FLUSH_INTERVAL seconds so they survive a restart.
+REACTOR_PERSIST: bool = os.environ.get('REACTORPERSIST', '1').lower() not in ('0', 'false', 'no')
+REACTOR_FLUSH_INTERVAL: float = _get_float('REACTORFLUSHINTERVAL', 30.0)
+
+# Bulk Discord API calls (e.g. changing permissions on every channel for a mute)
+FANOUT_CONCURRENCY: int = _get_int('FANOUTCONCURRENCY', 5)
+FANOUT_RATE: float = _get_float('FANOUTRATE', 40.0)
+FANOUT_ATTEMPTS: int = _get_int('FANOUTATTEMPTS', 3)
+FANOUT_PROGRESS_INTERVAL: float = _get_float('FANOUTPROGRESSINTERVAL', 2.0)
+
+# The web server for health checks and metrics
+WEB_HOST: str = os.environ.get('WEBHOST', '0.0.0.0')
+WEB_PORT: int = _get_int('WEBPORT', 8080)
+# How often, in seconds, /readyz checks in the background that the database can be reached
+HEALTH_DB_INTERVAL: float = _get_float('HEALTHDBINTERVAL', 10.0)
+# Event loop lag, in seconds, beyond which the bot is reported as not ready (/readyz) or not alive (/healthz)
+READY_MAX_LOOP_LAG: float = _get_float('READYMAXLOOPLAG', 0.5)
+LIVE_MAX_LOOP_LAG: float = _get_float('LIVEMAXLOOPLAG', 5.0)
+
+# How often, in seconds, the event loop is checked for lag (how late a sleep wakes up compared to when it asked to)
+LOOP_LAG_INTERVAL: float = _get_float('LOOPLAGINTERVAL', 0.5)
+# Anything holding up the event loop for longer than this, in seconds, is logged along with where it was stuck.
+# 0 turns the check off.
+STALL_THRESHOLD: float = _get_float('STALLTHRESHOLD', 0.25)
+
+# How mutes are applied. "overwrite" denies send_messages on each channel for the muted user. "role" gives them a
+# jail role instead, which is set up once per guild with send_messages denied everywhere.
+MUTE_MODE: str = os.environ.get('MUTEMODE', 'overwrite').lower()
@@ -1,4 +1,4 @@
-from typing import List, Dict
+from typing import Any, List, Dict
 
 NERD_RESPONSES: List[str] = ["Huh? Whaddya want?",
                              "Five more minutes please...",
@@ -19,8 +19,35 @@ REACTION_IMAGES: Dict[str, str] = {
     "surprisePog": "https://tenor.com/view/pog-frog-frog-pog-frog-dance-gif-20735320",
     "sus": "https://tenor.com/view/hmm-suspect-gif-22611582"
 }
+JAIL_ROLE_NAME: str = "Jailed"
 SWEARS: List[str] = ["fuck", "shit", "bitch"]
+# What the bot answers to in chat (see triggers.py). Messages are lowercased before matching, so keep these lowercase
+TRIGGERS: List[Dict[str, Any]] = [
+    {"name": "swear", "group": "swear", "words": SWEARS, "match": "substring"},
+    {"name": "work", "group": "reply", "words": ["work"], "match": "word"},
+    {"name": "inspire", "group": "reply", "words": ["inspire me"], "match": "substring"},
+    {"name": "nerdbot", "group": "reply", "words": ["nerdbot"], "match": "substring"},
+]
 FIFTEEN_MINUTES: int = 900
+STARTING_COINS: int = 10
+LEADERBOARD_SIZE: int = 10
+LEADERBOARD_FETCH: int = 25
+# How long, in seconds, the marker saying who claimed a crate or clam is kept, and how long a guild is held back from
+# spawning another while one is being sent
+CLAIM_MARKER_TTL: int = 3600
+SPAWN_LOCK_TTL: int = 30
+# Most members looked up through the API for one leaderboard. The gateway takes up to 100 per request, so only the
+# lookups made one at a time (with MEMBERCACHE=none) come anywhere near this
+MEMBER_FETCH_LIMIT: int = LEADERBOARD_FETCH
+MEMBER_QUERY_SIZE: int = 100
+# Limits on the content each guild can add for itself (see contentpacks.py): how many pieces, and how long each can be
+CONTENT_MAX_ENTRIES: int = 200
+CONTENT_MAX_KEY_LENGTH: int = 100
+CONTENT_MAX_VALUE_LENGTH: int = 1000
+# Seconds a guild makes do with the built-in content after its own couldn't be loaded, before it's tried again
+CONTENT_RETRY_DELAY: int = 60
+# Mutes touching more channels than this post a progress message while they run
+FANOUT_PROGRESS_THRESHOLD: int = 20
 INSULTS: List[str] = [
     (
         "Wow, {arg}'s face is looking real ugly today."
@@ -0,0 +1,179 @@
+"""contentpacks.py"""
+
+# IMPORTS #
+import re
+from string import Formatter
+
+import constants
+
+from classes import Error
+from enums import ContentType, ErrorType
+from triggers import TriggerSet
+
+from datatypes import ContentEntry, GuildContent, Trigger
+
+"""
+    What the bot says in each guild: insults, reaction images, replies to work and to its name, the swears it tuts at,
+    and triggers of the guild's own, each with a reply. A guild gets the built-in content from constants.py, apart from
+    any types it has switched off, plus whatever it has added (stored in GUILD_CONTENT).
+    All of it is put together once per guild as a ContentPack, including the guild's own TriggerSet, so handling a
+    message reads nothing from the database. Guilds that haven't changed anything share DEFAULT_PACK.
+"""
+
+# What each type is called in the content command
+CONTENT_TYPES: dict[str, ContentType] = {
+    "insult": ContentType.Insult,
+    "reaction": ContentType.ReactionImage,
+    "work": ContentType.WorkResponse,
+    "nerd": ContentType.NerdResponse,
+    "swear": ContentType.Swear,
+    "trigger": ContentType.Trigger
+}
+
+# A custom emoji as it's typed in a message, e.g. <:sus:123456789>
+_CUSTOM_EMOJI: re.Pattern = re.compile(r"<a?:(\w+):\d+>")
+
+
+class ContentPack:
+    """
+    Everything a guild's chat responses draw on, ready to use.
+    """
+
+    def __init__(self, guild_content: GuildContent):
+        hidden: set[ContentType] = guild_content["hiddenDefaults"]
+        self.Entries: list[ContentEntry] = guild_content["entries"]
+        self.HiddenDefaults: set[ContentType] = hidden
+
+        self.Insults: list[str] = [] if ContentType.Insult in hidden else list(constants.INSULTS)
+        self.ReactionImages: dict[str, str] = (
+            {} if ContentType.ReactionImage in hidden else dict(constants.REACTION_IMAGES)
+        )
+        self.WorkResponses: list[str] = [] if ContentType.WorkResponse in hidden else list(constants.WORK_RESPONSES)
+        self.NerdResponses: list[str] = [] if ContentType.NerdResponse in hidden else list(constants.NERD_RESPONSES)
+        self.Swears: list[str] = [] if ContentType.Swear in hidden else list(constants.SWEARS)
+        # The guild's own triggers, by name, to their replies
+        self.Replies: dict[str, str] = {}
+
+        custom_triggers: list[Trigger] = []
+        for entry in self.Entries:
+            if entry["type"] == ContentType.Insult:
+                self.Insults.append(entry["value"])
+            elif entry["type"] == ContentType.ReactionImage:
+                self.ReactionImages[entry["key"]] = entry["value"]
+            elif entry["type"] == ContentType.WorkResponse:
+                self.WorkResponses.append(entry["value"])
+            elif entry["type"] == ContentType.NerdResponse:
+                self.NerdResponses.append(entry["value"])
+            elif entry["type"] == ContentType.Swear:
+                self.Swears.append(entry["value"])
+            elif entry["type"] == ContentType.Trigger:
+                name: str = f"custom:{entry['id']}"
+                custom_triggers.append({"name": name, "group": "custom", "words": [entry["key"]], "match": "word"})
+                self.Replies[name] = entry["value"]
+
+        triggers: list[Trigger] = []
+        for trigger in constants.TRIGGERS:
+            if trigger["name"] == "swear":
+                trigger = {**trigger, "words": self.Swears}
+            # Nothing to reply with, so don't let these stop a later trigger in their group from replying instead
+            elif trigger["name"] == "work" and not self.WorkResponses:
+                continue
+            elif trigger["name"] == "nerdbot" and not self.NerdResponses:
+                continue
+            triggers.append(trigger)
+
+        self.Matcher: TriggerSet = TriggerSet(triggers + custom_triggers)
+
+
+DEFAULT_PACK: ContentPack = ContentPack({"entries": [], "hiddenDefaults": set()})
+
+
+def build_pack(guild_content: GuildContent) -> ContentPack:
+    if not guild_content["entries"] and not guild_content["hiddenDefaults"]:
+        return DEFAULT_PACK
+
+    return ContentPack(guild_content)
+
+
+def _check_insult(value: str) -> Error:
+    problem: Error = Error(ErrorType.InvalidArgument,
+                           "An insult needs {arg} where the target goes, and can also use {arg2} for whoever asked for "
+                           "it. Any other braces must be doubled, like {{ and }}.")
+    try:
+        parsed: list[tuple[str, str | None, str | None, str | None]] = list(Formatter().parse(value))
+    except ValueError:
+        return problem
+
+    # Only plain {arg} and {arg2}, as anything more (e.g. {arg.__class__}) would be looked up when it's formatted
+    fields: set[str] = set()
+    for _, field, spec, conversion in parsed:
+        if field is None:
+            continue
+        if spec or conversion:
+            return problem
+        fields.add(field)
+
+    if "arg" not in fields or not fields <= {"arg", "arg2"}:
+        return problem
+
+    return Error(ErrorType.NoError)
+
+
+def parse_entry(content_type: ContentType, text: str) -> tuple[str | None, str] | Error:
+    """
+    Reads a piece of content from how it's written in the content command, checking it's fit to use.
+    :param content_type: The type of content.
+    :param text: The content. A reaction image is the reaction followed by the image's link, and a trigger is its words
+    and reply, separated by |.
+    :return: The content's key (see ContentEntry) and value.
+    """
+    key: str | None = None
+    value: str = text.strip()
+
+    if content_type == ContentType.ReactionImage:
+        key, _, value = value.partition(" ")
+        value = value.strip()
+        emoji: re.Match | None = _CUSTOM_EMOJI.fullmatch(key)
+        # Reactions are looked up by name, which for custom emoji leaves off the ID
+        if emoji is not None:
+            key = emoji.group(1)
+        if not value.startswith(("https://", "http://")):
+            return Error(ErrorType.InvalidArgument, "A reaction image needs a reaction, then a link to the image.")
+    elif content_type == ContentType.Trigger:
+        words, _, value = value.partition("|")
+        # Messages are lowercased before matching
+        key = " ".join(words.lower().split())
+        value = value.strip()
+        if not key:
+            return Error(ErrorType.InvalidArgument, "A trigger needs its words, then | and what to reply with.")
+    elif content_type == ContentType.Swear:
+        value = value.lower()
+    elif content_type == ContentType.Insult:
+        result: Error = _check_insult(value)
+        if result.Status != ErrorType.NoError:
+            return result
+
+    if not value:
+        return Error(ErrorType.InvalidArgument, "There's nothing there to add.")
+    if key is not None and len(key) > constants.CONTENT_MAX_KEY_LENGTH:
+        return Error(ErrorType.InvalidArgument, f"That's too long. Keep it to {constants.CONTENT_MAX_KEY_LENGTH} "
+                                                f"characters before the content itself.")
+    if content_type == ContentType.Swear and len(value) > constants.CONTENT_MAX_KEY_LENGTH:
+        return Error(ErrorType.InvalidArgument, f"That's too long. Keep it to {constants.CONTENT_MAX_KEY_LENGTH} "
+                                                f"characters.")
+    if len(value) > constants.CONTENT_MAX_VALUE_LENGTH:
+        return Error(ErrorType.InvalidArgument, f"That's too long. Keep it to {constants.CONTENT_MAX_VALUE_LENGTH} "
+                                                f"characters.")
+
+    return key, value
+
+
+def describe_entry(entry: ContentEntry) -> str:
+    """
+    Describes a piece of content for listing, cut short if it's long.
+    """
+    text: str = entry["value"] if entry["key"] is None else f"{entry['key']} → {entry['value']}"
+    if len(text) > 80:
+        text = text[:79] + "…"
+    name: str = next(name for name, content_type in CONTENT_TYPES.items() if content_type == entry["type"])
+    return f"`{entry['id']}` ({name}) {text}"
@@ -1,9 +1,15 @@
+from datetime import datetime
 from typing import TypedDict
 
+from enums import Claimable, ContentType
+
 
 class Guild(TypedDict):
     id: int
     active: bool
+    changelog: int | None
+    lastReactor: int | None
+    jailRole: int | None
 
 
 class CurrentClaimable(TypedDict):
@@ -12,3 +18,37 @@ class CurrentClaimable(TypedDict):
 
 
 Guilds = list[Guild]
+
+
+class SpawnState(TypedDict):
+    lastCaught: datetime
+    current: int | None
+    currentChannel: int | None
+
+
+SpawnStates = dict[Claimable, SpawnState]
+
+
+class Trigger(TypedDict):
+    # Names the trigger in what a match returns
+    name: str
+    # Triggers in a group are alternatives: a message only sets off the first of them (in list order) that it contains
+    group: str
+    words: list[str]
+    # "word" matches whole words only, "substring" anywhere in the message
+    match: str
+
+
+class ContentEntry(TypedDict):
+    id: int
+    type: ContentType
+    # The reaction for a reaction image, or the words for a trigger. None for every other type
+    key: str | None
+    value: str
+
+
+class GuildContent(TypedDict):
+    # Oldest first
+    entries: list[ContentEntry]
+    # Types of content the guild has switched the built-in content off for
+    hiddenDefaults: set[ContentType]
@@ -10,7 +10,7 @@ def generate_help_embed(prefix: str) -> Embed:
         color=discord.Color.blurple()
     )
     help_embed.add_field(
-        name="bonk <user>",
+        name="bonk <user> [duration]",
         value="```See mute command.```"
     )
     help_embed.add_field(
@@ -33,6 +33,11 @@ def generate_help_embed(prefix: str) -> Embed:
         name="coins",
         value="```See how many coins you have, and weep in despair when they are all gone.```"
     )
+    help_embed.add_field(
+        name="content <list|add|remove|defaults> ...",
+        value="```Make the bot this server's own: add insults, reaction images, replies and triggers, or switch off "
+              "the built-in ones. Requires Manage Server.```"
+    )
     help_embed.add_field(
         name="help",
         value="```It's what you're doing now.```"
@@ -50,8 +55,8 @@ def generate_help_embed(prefix: str) -> Embed:
         value="```Displays a meme from r/memes.```"
     )
     help_embed.add_field(
-        name="mute <user>",
-        value="```Send a user to jail. Requires Manages Permissions to use.```"
+        name="mute <user> [duration]",
+        value="```Send a user to jail, optionally for a while (e.g. 10m, 1h30m). Requires Manages Permissions to use.```"
     )
     help_embed.add_field(
         name="recent",
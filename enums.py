@@ -10,6 +10,7 @@ class ErrorType(Enum):
     NoError = 0
     InvalidArgument = 1
     MySqlException = 2
+    SqliteException = 3
 
 
 class WarningType(Enum):
@@ -19,3 +20,12 @@ class WarningType(Enum):
 
 class ModerationType(Enum):
     Mute = 1
+
+
+class ContentType(Enum):
+    Insult = 1
+    ReactionImage = 2
+    WorkResponse = 3
+    NerdResponse = 4
+    Swear = 5
+    Trigger = 6
@@ -0,0 +1,118 @@
+"""fanout.py"""
+
+# IMPORTS #
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Generic, Iterator, TypeVar
+
+import discord
+
+import config
+
+T = TypeVar('T')
+
+"""
+    Runs the same Discord API call against many targets (e.g. a permission edit on every channel in a guild).
+    discord.py already queues requests on each route's rate limit bucket, and permission edits on different channels
+    fall in different buckets, so edits are run a few at a time. Every fan-out shares one pacer that keeps the bot
+    under FANOUT_RATE requests a second, so a big mute can't run into the global rate limit.
+"""
+
+
+class FanOutResult(Generic[T]):
+
+    def __init__(self):
+        self.Succeeded: list[T] = []
+        self.Failed: list[T] = []
+
+
+class _Pacer:
+    """
+    Spaces requests out evenly, to at most the given number per second.
+    """
+
+    def __init__(self, rate: float):
+        self._interval: float = 1 / rate
+        self._next: float = 0.0
+
+    async def wait(self):
+        now: float = asyncio.get_running_loop().time()
+        delay: float = self._next - now
+        self._next = max(now, self._next) + self._interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+_pacer: _Pacer = _Pacer(config.FANOUT_RATE)
+
+# Called with the items that succeeded since the last call, the number finished so far, and the total
+ProgressCallback = Callable[[list[T], int, int], Awaitable[Any]]
+
+
+async def _apply(action: Callable[[T], Awaitable[Any]], item: T) -> bool:
+    for attempt in range(config.FANOUT_ATTEMPTS):
+        await _pacer.wait()
+        try:
+            await action(item)
+            return True
+        except discord.HTTPException as error:
+            # discord.py retries rate limits itself, so only keep trying if it gave up on one
+            if error.status != 429 or attempt == config.FANOUT_ATTEMPTS - 1:
+                logging.error(f"Fan-out call failed for {item}: {error}")
+                return False
+            await asyncio.sleep(2 ** attempt)
+
+    return False
+
+
+async def fan_out(items: list[T],
+                  action: Callable[[T], Awaitable[Any]],
+                  on_progress: ProgressCallback | None = None) -> FanOutResult[T]:
+    """
+    Runs an action against every item, FANOUT_CONCURRENCY at a time.
+    :param items: The items to run the action against.
+    :param action: The coroutine to run for each item.
+    :param on_progress: Called every FANOUT_PROGRESS_INTERVAL seconds while running, and once at the end, with the
+    items that have succeeded since the previous call. Use it to report progress.
+    :return: Which items succeeded and which failed.
+    """
+    result: FanOutResult[T] = FanOutResult()
+    unreported: list[T] = []
+    remaining: Iterator[T] = iter(items)
+
+    async def worker():
+        # Workers share one iterator, so each item is only taken once
+        for item in remaining:
+            if await _apply(action, item):
+                result.Succeeded.append(item)
+                unreported.append(item)
+            else:
+                result.Failed.append(item)
+
+    async def report():
+        if on_progress is None:
+            return
+
+        batch: list[T] = unreported.copy()
+        unreported.clear()
+        await on_progress(batch, len(result.Succeeded) + len(result.Failed), len(items))
+
+    finished: asyncio.Event = asyncio.Event()
+
+    async def reporter():
+        # Never cancelled part way through a report, as that would lose the batch it was recording
+        while not finished.is_set():
+            try:
+                await asyncio.wait_for(finished.wait(), timeout=config.FANOUT_PROGRESS_INTERVAL)
+            except asyncio.TimeoutError:
+                await report()
+
+    reporter_task: asyncio.Task = asyncio.create_task(reporter())
+    try:
+        await asyncio.gather(*[worker() for _ in range(min(config.FANOUT_CONCURRENCY, len(items)))])
+    finally:
+        finished.set()
+        await reporter_task
+        await report()
+
+    return result
@@ -1,11 +1,12 @@
 """functions.py"""
+import asyncio
 import logging
 from typing import Dict, Any, List, Tuple
 
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 
 import discord
-from discord import User, Member, Guild, Embed, TextChannel, Thread, Message
+from discord import User, Member, Guild, Embed, TextChannel, Thread, Message, Role
 from discord.ext.commands import Bot
 
 import json
@@ -17,29 +18,43 @@ import inspirobot
 import meme_get
 from meme_get.memesites import RedditMemes, Meme
 
+import config
 import constants
 
-import repository
+import async_repository
+
+import caches
+
+import cachestore
+
+import ledger
+
+import contentpacks
 
 from classes import Error
 
-from enums import ErrorType, Claimable, ModerationType
+from enums import ErrorType, Claimable, ContentType, ModerationType
+
+from datatypes import Guilds, Guild as RepoGuild, CurrentClaimable, SpawnState, SpawnStates, GuildContent
 
-from datatypes import Guilds, Guild as RepoGuild, CurrentClaimable
+# Guilds whose content is being loaded, so messages arriving meanwhile wait on the same read rather than starting more
+_content_loads: dict[int, asyncio.Task] = {}
+# Guilds whose members' overall scores are still to be carried over to their leaderboards, loaded on first use
+_unseeded_guilds: set[int] | None = None
 
 
-def get_all_guilds() -> Guilds | None:
-    result = repository.get_all_guilds()
-    if isinstance(result, Error) and result.Status == ErrorType.MySqlException:
+async def get_all_guilds() -> Guilds | None:
+    result = await async_repository.get_all_guilds()
+    if isinstance(result, Error):
         logging.error(result.Message)
         return None
 
     return result
 
 
-def get_guild(guild_id: int) -> RepoGuild | bool | None:
-    result = repository.get_guild(guild_id)
-    if isinstance(result, Error) and result.Status == ErrorType.MySqlException:
+async def get_guild(guild_id: int) -> RepoGuild | bool | None:
+    result = await async_repository.get_guild(guild_id)
+    if isinstance(result, Error):
         logging.error(result.Message)
         return None
 
@@ -49,8 +64,17 @@ def get_guild(guild_id: int) -> RepoGuild | bool | None:
     return result
 
 
-def add_new_guild(guild_id: int) -> bool:
-    result = repository.add_guild(guild_id)
+async def add_new_guild(guild_id: int) -> bool:
+    result = await async_repository.add_guild(guild_id)
+    if result.Status == ErrorType.NoError:
+        return True
+
+    logging.error(result.Message)
+    return False
+
+
+async def set_active_guild(guild_id: int) -> bool:
+    result = await async_repository.set_active_guild(guild_id)
     if result.Status == ErrorType.NoError:
         return True
 
@@ -58,8 +82,8 @@ def add_new_guild(guild_id: int) -> bool:
     return False
 
 
-def set_active_guild(guild_id: int) -> bool:
-    result = repository.set_active_guild(guild_id)
+async def reconcile_guilds(new_guild_ids: list[int], reactivated_guild_ids: list[int]) -> bool:
+    result = await async_repository.reconcile_guilds(new_guild_ids, reactivated_guild_ids)
     if result.Status == ErrorType.NoError:
         return True
 
@@ -67,17 +91,26 @@ def set_active_guild(guild_id: int) -> bool:
     return False
 
 
-def get_guild_changelog_version(guild_id: int) -> int | None:
-    result = repository.get_guild_changelog_version(guild_id)
-    if isinstance(result, Error) and result.Status == ErrorType.MySqlException:
+async def claim_changelog(guild_ids: list[int], version: int) -> list[int] | None:
+    result = await async_repository.claim_changelog(guild_ids, version)
+    if isinstance(result, Error):
         logging.error(result.Message)
         return None
 
     return result
 
 
-def set_guild_changelog_version(guild_id: int, version: int) -> bool:
-    result = repository.set_guild_changelog_version(guild_id, version)
+async def get_guild_changelog_version(guild_id: int) -> int | None:
+    result = await async_repository.get_guild_changelog_version(guild_id)
+    if isinstance(result, Error):
+        logging.error(result.Message)
+        return None
+
+    return result
+
+
+async def set_guild_changelog_version(guild_id: int, version: int) -> bool:
+    result = await async_repository.set_guild_changelog_version(guild_id, version)
     if result.Status == ErrorType.NoError:
         return True
 
@@ -85,69 +118,202 @@ def set_guild_changelog_version(guild_id: int, version: int) -> bool:
     return False
 
 
-def get_last_reactor(guild_id: int) -> int | bool | None:
-    result = repository.get_last_reactor(guild_id)
-    if isinstance(result, Error) and result.Status == ErrorType.MySqlException:
-        logging.error(result.Message)
-        return None
+def load_last_reactors(guilds: Guilds):
+    for guild in guilds:
+        caches.LAST_REACTORS.load(guild["id"], guild["lastReactor"])
 
-    if result is None:
-        return False
 
-    return result
+def is_new_reactor(guild_id: int, user_id: int) -> bool:
+    return caches.LAST_REACTORS.swap(guild_id, user_id)
+
+
+async def flush_last_reactors() -> bool:
+    last_reactors: list[tuple[int, int]] = caches.LAST_REACTORS.take_dirty()
+    if not last_reactors:
+        return True
 
+    try:
+        result = await async_repository.set_last_reactors(last_reactors)
+    except asyncio.CancelledError:
+        caches.LAST_REACTORS.mark_dirty([guild_id for guild_id, _ in last_reactors])
+        raise
 
-def set_last_reactor(guild_id: int, user_id: int) -> bool:
-    result = repository.set_last_reactor(guild_id, user_id)
     if result.Status == ErrorType.NoError:
         return True
 
+    # Try again next time
+    caches.LAST_REACTORS.mark_dirty([guild_id for guild_id, _ in last_reactors])
     logging.error(result.Message)
     return False
 
 
-def get_current_coin_claimable(guild_id: int) -> CurrentClaimable | bool | None:
-    result = repository.get_current_claimable(guild_id, Claimable.Coin)
-    if isinstance(result, Error) and result.Status == ErrorType.MySqlException:
-        logging.error(result.Message)
+def load_jail_roles(guilds: Guilds):
+    for guild in guilds:
+        if guild["jailRole"] is not None:
+            caches.JAIL_ROLES[guild["id"]] = guild["jailRole"]
+
+
+def get_jail_role(guild: Guild) -> Role | None:
+    role_id: int | None = caches.JAIL_ROLES.get(guild.id)
+    return guild.get_role(role_id) if role_id is not None else None
+
+
+async def set_jail_role(guild_id: int, role_id: int) -> bool:
+    result = await async_repository.set_guild_jail_role(guild_id, role_id)
+    if result.Status == ErrorType.NoError:
+        caches.JAIL_ROLES[guild_id] = role_id
+        await cachestore.invalidate(caches.JAIL_ROLES_CHANNEL, guild_id)
+        return True
+
+    logging.error(result.Message)
+    return False
+
+
+async def get_spawn_states(guild_id: int) -> SpawnStates | None:
+    states: SpawnStates | None = caches.SPAWN_STATES.get(guild_id)
+    if states is not None:
+        return states
+
+    result: SpawnStates | Error = await async_repository.get_spawn_states(guild_id)
+    if isinstance(result, Error):
+        result.log()
         return None
 
-    if result["current"] is None:
-        return False
+    # Another message may have loaded (and since changed) the state while we were waiting, so keep that copy
+    return caches.SPAWN_STATES.put_if_absent(guild_id, result)
+
+
+async def _load_content_pack(guild_id: int) -> contentpacks.ContentPack:
+    generation: int = caches.GUILD_CONTENT.generation(guild_id)
+    result: GuildContent | Error = await async_repository.get_guild_content(guild_id)
+    if isinstance(result, Error):
+        # Make do with the built-in content for a while, rather than trying the database again on every message
+        result.log()
+        caches.GUILD_CONTENT.put(guild_id, generation, contentpacks.DEFAULT_PACK, constants.CONTENT_RETRY_DELAY)
+        return contentpacks.DEFAULT_PACK
+
+    pack: contentpacks.ContentPack = contentpacks.build_pack(result)
+    caches.GUILD_CONTENT.put(guild_id, generation, pack)
+    return pack
 
+
+async def get_content_pack(guild_id: int) -> contentpacks.ContentPack:
+    pack: contentpacks.ContentPack | None = caches.GUILD_CONTENT.get(guild_id)
+    if pack is not None:
+        return pack
+
+    load: asyncio.Task | None = _content_loads.get(guild_id)
+    if load is None:
+        load = asyncio.create_task(_load_content_pack(guild_id))
+        _content_loads[guild_id] = load
+        load.add_done_callback(lambda _: _content_loads.pop(guild_id, None))
+
+    # Shielded, so one waiting handler being cancelled doesn't cancel the load for the rest
+    return await asyncio.shield(load)
+
+
+async def _content_changed(guild_id: int):
+    caches.GUILD_CONTENT.evict(guild_id)
+    await cachestore.invalidate(caches.GUILD_CONTENT_CHANNEL, guild_id)
+
+
+async def add_guild_content(guild_id: int, content_type: ContentType, key: str | None, value: str) -> int | None:
+    result: int | Error = await async_repository.add_guild_content(guild_id, content_type, key, value)
+    if isinstance(result, Error):
+        result.log()
+        return None
+
+    await _content_changed(guild_id)
     return result
 
 
-def set_current_coin_claimable(guild_id: int, message_id: int | None, channel_id: int | None) -> bool:
-    result = repository.set_current_claimable(guild_id, Claimable.Coin, message_id, channel_id)
+async def remove_guild_content(guild_id: int, content_id: int) -> bool | None:
+    result: bool | Error = await async_repository.remove_guild_content(guild_id, content_id)
+    if isinstance(result, Error):
+        result.log()
+        return None
+
+    if result:
+        await _content_changed(guild_id)
+    return result
+
+
+async def set_guild_content_defaults(guild_id: int, content_type: ContentType, enabled: bool) -> bool:
+    result = await async_repository.set_guild_content_defaults(guild_id, content_type, enabled)
     if result.Status == ErrorType.NoError:
+        await _content_changed(guild_id)
         return True
 
     logging.error(result.Message)
     return False
 
 
-def get_current_clam_claimable(guild_id: int) -> CurrentClaimable | bool | None:
-    result = repository.get_current_claimable(guild_id, Claimable.Clam)
-    if isinstance(result, Error) and result.Status == ErrorType.MySqlException:
-        logging.error(result.Message)
+async def get_current_claimable(guild_id: int, claimable: Claimable) -> CurrentClaimable | bool | None:
+    states: SpawnStates | None = await get_spawn_states(guild_id)
+    if states is None:
         return None
 
-    if result["current"] is None:
+    if states[claimable]["current"] is None:
         return False
 
-    return result
+    return {
+        "current": states[claimable]["current"],
+        "currentChannel": states[claimable]["currentChannel"]
+    }
+
+
+async def set_current_claimable(guild_id: int,
+                                claimable: Claimable,
+                                message_id: int | None,
+                                channel_id: int | None) -> bool:
+    result = await async_repository.set_current_claimable(guild_id, claimable, message_id, channel_id)
+    if result.Status == ErrorType.NoError:
+        caches.SPAWN_STATES.set_current(guild_id, claimable, message_id, channel_id)
+        await cachestore.invalidate(caches.SPAWN_STATES_CHANNEL, guild_id)
+        return True
+
+    # Unsure what the database holds now, so reload it next time it's needed
+    caches.SPAWN_STATES.evict(guild_id)
+    logging.error(result.Message)
+    return False
 
 
-def set_current_clam_claimable(guild_id: int, message_id: int | None, channel_id: int | None) -> bool:
-    result = repository.set_current_claimable(guild_id, Claimable.Clam, message_id, channel_id)
+async def set_last_caught(guild_id: int, claimable: Claimable) -> bool:
+    # Only called once caught, so time is always "now"
+    now: datetime = datetime.now()
+    result = await async_repository.set_last_caught(guild_id, claimable, now)
     if result.Status == ErrorType.NoError:
+        caches.SPAWN_STATES.set_last_caught(guild_id, claimable, now)
+        await cachestore.invalidate(caches.SPAWN_STATES_CHANNEL, guild_id)
         return True
 
+    caches.SPAWN_STATES.evict(guild_id)
     logging.error(result.Message)
     return False
 
 
+async def take_claimable(guild_id: int, claimable: Claimable, message_id: int, user_id: int) -> bool:
+    # Whoever marks the message as claimed first gets it, even when claims race between awaits or between processes
+    return await cachestore.compare_and_set(f"nerdbot:claimed:{guild_id}:{claimable.value}:{message_id}",
+                                            None, str(user_id), constants.CLAIM_MARKER_TTL)
+
+
+async def get_current_coin_claimable(guild_id: int) -> CurrentClaimable | bool | None:
+    return await get_current_claimable(guild_id, Claimable.Coin)
+
+
+async def set_current_coin_claimable(guild_id: int, message_id: int | None, channel_id: int | None) -> bool:
+    return await set_current_claimable(guild_id, Claimable.Coin, message_id, channel_id)
+
+
+async def get_current_clam_claimable(guild_id: int) -> CurrentClaimable | bool | None:
+    return await get_current_claimable(guild_id, Claimable.Clam)
+
+
+async def set_current_clam_claimable(guild_id: int, message_id: int | None, channel_id: int | None) -> bool:
+    return await set_current_claimable(guild_id, Claimable.Clam, message_id, channel_id)
+
+
 def retrieve_changelog() -> Tuple[Dict[str, Any], str]:
     with open('changelog.json', 'r') as r_file:
         data: Dict[str, Any] = json.load(r_file)
@@ -193,7 +359,7 @@ async def generate_crate(guild_id: int,
 
     embed_message: Message = await channel.send(embed=crate_embed)
 
-    repository.set_current_claimable(guild_id, Claimable.Coin, embed_message.id, channel.id)
+    await set_current_claimable(guild_id, Claimable.Coin, embed_message.id, channel.id)
 
 
 async def generate_clam(guild_id: int,
@@ -211,63 +377,71 @@ async def generate_clam(guild_id: int,
 
     embed_message: Message = await channel.send(embed=clam_embed)
 
-    repository.set_current_claimable(guild_id, Claimable.Clam, embed_message.id, channel.id)
+    await set_current_claimable(guild_id, Claimable.Clam, embed_message.id, channel.id)
 
 
 async def generate_claimable(guild: Guild,
                              channel: TextChannel | Thread):
-    generate: List[bool] = [False, False]  # [Crate, Clam]
+    # Roll first, as most messages won't spawn anything and so don't need to look at the spawn state at all
+    number: int = random.randint(1, 20)
+    if number == 1:
+        claimable: Claimable = Claimable.Coin
+    elif number == 2:
+        claimable: Claimable = Claimable.Clam
+    else:
+        return
 
     """
         Two checks carried out to determine whether a crate or clam is allowed to spawn:
         1) There are no unclaimed crates/clams available
         2) The last crate/clam was claimed more than 15 minutes ago
     """
-    now: float = time.time()
-    coin_last_caught: datetime | Error = repository.get_last_caught(guild.id, Claimable.Coin)
-    if isinstance(coin_last_caught, Error):
-        coin_last_caught.log()
+    states: SpawnStates | None = await get_spawn_states(guild.id)
+    if states is None:
         return
-    coin_last_caught_timestamp: float = coin_last_caught.timestamp()
-    coin_unclaimed: CurrentClaimable = repository.get_current_claimable(guild.id, Claimable.Coin)
-    clam_last_caught: datetime | Error = repository.get_last_caught(guild.id, Claimable.Clam)
-    if isinstance(clam_last_caught, Error):
-        clam_last_caught.log()
+
+    state: SpawnState = states[claimable]
+    if state["current"] is not None:
+        return
+    if time.time() - state["lastCaught"].timestamp() < constants.FIFTEEN_MINUTES:
         return
-    clam_last_caught_timestamp: float = clam_last_caught.timestamp()
-    clam_unclaimed: CurrentClaimable = repository.get_current_claimable(guild.id, Claimable.Clam)
 
-    generate[0] = (now - coin_last_caught_timestamp >= constants.FIFTEEN_MINUTES) and \
-                  (coin_unclaimed["current"] is None)
-    generate[1] = (now - clam_last_caught_timestamp >= constants.FIFTEEN_MINUTES) and \
-                  (clam_unclaimed["current"] is None)
+    # Two messages can both pass the checks above before either spawn is recorded, so only let one through
+    if not await cachestore.compare_and_set(f"nerdbot:spawning:{guild.id}:{claimable.value}",
+                                            None, "1", constants.SPAWN_LOCK_TTL):
+        return
 
-    number: int = random.randint(1, 20)
-    if number == 1 and generate[0]:
+    if claimable == Claimable.Coin:
         await generate_crate(guild.id, channel)
-    elif number == 2 and generate[1]:
+    else:
         await generate_clam(guild.id, channel)
 
 
 async def respond_to_message(channel: TextChannel | Thread, content: str, bot: Bot):
-    for word in constants.SWEARS:
-        if word in content:
-            await channel.send("Ooh, do you kiss your momma with that mouth?")
-            break
+    pack: contentpacks.ContentPack = await get_content_pack(channel.guild.id)
+    found: dict[str, str] = pack.Matcher.match(content)
+    if "swear" in found:
+        await channel.send("Ooh, do you kiss your momma with that mouth?")
 
     # Specific cases
-    if re.findall(r'\bwork\b', content):
-        response: str = constants.WORK_RESPONSES[random.randint(0, len(constants.WORK_RESPONSES)-1)]
-        await channel.send(response)
-    elif re.findall('inspire me', content):
+    reply: str | None = found.get("reply")
+    if reply == "work":
+        response: str = pack.WorkResponses[random.randint(0, len(pack.WorkResponses)-1)]
+        await channel.send(response, allowed_mentions=discord.AllowedMentions.none())
+    elif reply == "inspire":
         inspiration = inspirobot.generate()
         await channel.send(inspiration.url)
-    elif bot.command_prefix == content or re.findall('nerdbot', content):
-        response: str = constants.NERD_RESPONSES[random.randint(0, len(constants.NERD_RESPONSES)-1)]
-        await channel.send(response)
+    elif (bot.command_prefix == content or reply == "nerdbot") and pack.NerdResponses:
+        response: str = pack.NerdResponses[random.randint(0, len(pack.NerdResponses)-1)]
+        await channel.send(response, allowed_mentions=discord.AllowedMentions.none())
+
+    # The guild's own triggers. Anyone who can add content could write a mention into a reply, so never ping
+    custom: str | None = found.get("custom")
+    if custom is not None:
+        await channel.send(pack.Replies[custom], allowed_mentions=discord.AllowedMentions.none())
 
 
-async def edit_crate_message(message_id: int, channel: TextChannel | Thread, member: Member):
+async def edit_crate_message(message_id: int, channel: TextChannel | Thread, member: User | Member):
     message: discord.Message = await channel.fetch_message(message_id)
 
     claim_embed: discord.Embed = discord.Embed(
@@ -282,7 +456,7 @@ async def edit_crate_message(message_id: int, channel: TextChannel | Thread, mem
     await message.edit(embed=claim_embed)
 
 
-async def edit_clam_message(message_id: int, channel: TextChannel | Thread, member: Member):
+async def edit_clam_message(message_id: int, channel: TextChannel | Thread, member: User | Member):
     message: discord.Message = await channel.fetch_message(message_id)
 
     claim_embed: discord.Embed = discord.Embed(
@@ -297,91 +471,249 @@ async def edit_clam_message(message_id: int, channel: TextChannel | Thread, memb
     await message.edit(embed=claim_embed)
 
 
-def get_coin_score(member_id: int) -> int | bool:
-    member_score: int = repository.get_user_score(member_id, Claimable.Coin)
-    if isinstance(member_score, Error) and member_score.Status == ErrorType.MySqlException:
+async def get_coin_score(member_id: int) -> int | bool:
+    # Includes claims that haven't been written to the database yet
+    member_score: int | Error = await ledger.SCORE_LEDGER.get_score(member_id, Claimable.Coin)
+    if isinstance(member_score, Error):
         logging.error(member_score.Message)
         return False
 
     return member_score
 
 
-def update_coin_score(member_id: int, score: int) -> bool:
-    member_score: int = get_coin_score(member_id)
+async def update_coin_score(guild_id: int, member_id: int, score: int) -> bool:
+    if ledger.SCORE_LEDGER.enabled:
+        ledger.SCORE_LEDGER.add(guild_id, member_id, Claimable.Coin, score)
+        caches.LEADERBOARDS.record_score(guild_id, member_id, Claimable.Coin, score)
+        await cachestore.invalidate(caches.LEADERBOARDS_CHANNEL, guild_id)
+        return True
 
-    member_score += score
-    result = repository.set_user_score(member_id, member_score, Claimable.Coin)
-    if result.Status == ErrorType.NoError:
+    result: int | Error = await async_repository.increment_user_score(guild_id, member_id, Claimable.Coin, score)
+    if not isinstance(result, Error):
+        caches.LEADERBOARDS.record_score(guild_id, member_id, Claimable.Coin, score)
+        await cachestore.invalidate(caches.LEADERBOARDS_CHANNEL, guild_id)
         return True
 
     logging.error(result.Message)
     return False
 
 
-def set_coin_last_caught(guild_id: int) -> bool:
-    # Only called once caught, so time is always "now"
-    result = repository.set_last_caught(guild_id, Claimable.Coin, datetime.now())
-    if result.Status == ErrorType.NoError:
-        return True
+async def set_coin_last_caught(guild_id: int) -> bool:
+    return await set_last_caught(guild_id, Claimable.Coin)
 
-    logging.error(result.Message)
-    return False
 
-
-def get_clam_score(member_id: int) -> int | bool:
-    member_score: int = repository.get_user_score(member_id, Claimable.Clam)
-    if isinstance(member_score, Error) and member_score.Status == ErrorType.MySqlException:
+async def get_clam_score(member_id: int) -> int | bool:
+    # Includes claims that haven't been written to the database yet
+    member_score: int | Error = await ledger.SCORE_LEDGER.get_score(member_id, Claimable.Clam)
+    if isinstance(member_score, Error):
         logging.error(member_score.Message)
         return False
 
     return member_score
 
 
-def update_clam_score(member_id: int):
-    member_score: int = get_clam_score(member_id)
+async def update_clam_score(guild_id: int, member_id: int) -> bool:
+    if ledger.SCORE_LEDGER.enabled:
+        ledger.SCORE_LEDGER.add(guild_id, member_id, Claimable.Clam, 1)
+        caches.LEADERBOARDS.record_score(guild_id, member_id, Claimable.Clam, 1)
+        await cachestore.invalidate(caches.LEADERBOARDS_CHANNEL, guild_id)
+        return True
 
-    member_score += 1
-    result = repository.set_user_score(member_id, member_score, Claimable.Clam)
-    if result.Status == ErrorType.NoError:
+    result: int | Error = await async_repository.increment_user_score(guild_id, member_id, Claimable.Clam, 1)
+    if not isinstance(result, Error):
+        caches.LEADERBOARDS.record_score(guild_id, member_id, Claimable.Clam, 1)
+        await cachestore.invalidate(caches.LEADERBOARDS_CHANNEL, guild_id)
         return True
 
     logging.error(result.Message)
     return False
 
 
-def set_clam_last_caught(guild_id: int) -> bool:
-    # Only called once caught, so time is always "now"
-    result = repository.set_last_caught(guild_id, Claimable.Clam, datetime.now())
-    if result.Status == ErrorType.NoError:
-        return True
+async def set_clam_last_caught(guild_id: int) -> bool:
+    return await set_last_caught(guild_id, Claimable.Clam)
 
-    logging.error(result.Message)
-    return False
 
+def remember_member(guild: Guild, member: User | Member):
+    # Anyone active in a guild is likely to be on its leaderboard, so keep their name handy
+    caches.MEMBER_NAMES.put(guild.id, member.id, member.display_name)
 
-async def get_leaderboard(guild: Guild, channel: TextChannel | Thread, coins: bool):
-    guild_members = [member.id for member in guild.members]
-    top_ten = repository.get_top_group_scores(guild_members, Claimable.Coin if coins else Claimable.Clam)
-    if isinstance(top_ten, Error) and top_ten.Status == ErrorType.MySqlException:
-        logging.error(top_ten.Message)
-        return
 
+async def _look_up_members(guild: Guild, user_ids: list[int]) -> dict[int, str]:
+    if config.MEMBER_CACHE != "none":
+        # A single gateway request covers up to 100 members
+        found: dict[int, str] = {}
+        for start in range(0, len(user_ids), constants.MEMBER_QUERY_SIZE):
+            chunk: list[int] = user_ids[start:start + constants.MEMBER_QUERY_SIZE]
+            members: list[Member] = await guild.query_members(user_ids=chunk, limit=len(chunk), cache=False)
+            found.update((member.id, member.display_name) for member in members)
+        return found
+
+    # Without the members intent, it's one API call per member
+    async def fetch(user_id: int) -> Member | None:
+        try:
+            return await guild.fetch_member(user_id)
+        except discord.NotFound:
+            return None
+
+    members: list[Member | None] = await asyncio.gather(*[fetch(user_id) for user_id in user_ids])
+    return {member.id: member.display_name for member in members if member is not None}
+
+
+async def resolve_member_names(guild: Guild, user_ids: list[int]) -> dict[int, str | None]:
+    """
+    Gets members' display names without needing every member in memory (see MEMBERCACHE). Cached members and
+    remembered names are used first, and up to MEMBER_FETCH_LIMIT of the rest are looked up.
+    :param guild: The guild the members are in.
+    :param user_ids: The members' IDs.
+    :return: Each member's name, or None if they've left the guild. Members that couldn't be looked up are left out.
+    """
+    names: dict[int, str | None] = {}
+    missing: list[int] = []
+    for user_id in user_ids:
+        member: Member | None = guild.get_member(user_id)
+        if member is not None:
+            names[user_id] = member.display_name
+            continue
+
+        known, name = caches.MEMBER_NAMES.get(guild.id, user_id)
+        if known:
+            names[user_id] = name
+        else:
+            missing.append(user_id)
+
+    missing = missing[:constants.MEMBER_FETCH_LIMIT]
+    if not missing:
+        return names
+
+    try:
+        found: dict[int, str] = await _look_up_members(guild, missing)
+    except (discord.DiscordException, asyncio.TimeoutError) as error:
+        # Not remembered, so they're tried again next time
+        logging.error(f"Couldn't look up members of guild {guild.id}: {error}")
+        return names
+
+    for user_id in missing:
+        # Anyone not found has left, and is remembered as such
+        names[user_id] = found.get(user_id)
+        caches.MEMBER_NAMES.put(guild.id, user_id, names[user_id])
+
+    return names
+
+
+def build_leaderboard_embed(rows: list[tuple[int, int]],
+                            names: dict[int, str | None],
+                            coins: bool) -> tuple[Embed, bool]:
+    """
+    Renders a leaderboard.
+    :param rows: The top scores, highest first.
+    :param names: Members' names, as from resolve_member_names.
+    :param coins: Whether it's the coins leaderboard, rather than the clams one.
+    :return: The embed, and whether the name of everyone on it was found.
+    """
     leaderboard_embed: discord.Embed = discord.Embed(
         title=f"{'Coins' if coins else 'Clams'} leaderboard",
         color=discord.Color.red()
     )
 
     # Display top 10
-    for count, record in enumerate(top_ten):
-        user: Member | None = guild.get_member(record[0])
-
+    count: int = 0
+    complete: bool = True
+    for record in rows:
+        if record[0] not in names:
+            # Still a member as far as anyone knows, so keep their place
+            name: str | None = f"Unknown member ({record[0]})"
+            complete = False
+        else:
+            name = names[record[0]]
+        # Some of the top scorers may have since left the guild
+        if name is None:
+            continue
+
+        count += 1
         leaderboard_embed.add_field(
-            name=f"{count+1} {user.nick if user.nick is not None else user.display_name}",
+            name=f"{count} {name}",
             value=f"{record[1]} {'coins' if coins else 'clams'}",
             inline=False
         )
+        if count == constants.LEADERBOARD_SIZE:
+            break
+
+    return leaderboard_embed, complete
 
-    await channel.send(embed=leaderboard_embed)
+
+async def seed_guild_scores(guild: Guild):
+    """
+    Carries a guild's members' overall scores over to its leaderboard the first time it's shown, for guilds from
+    before leaderboards were per guild (see repository.seed_guild_scores).
+    """
+    global _unseeded_guilds
+    if _unseeded_guilds is None:
+        unseeded: set[int] | Error = await async_repository.get_unseeded_guilds()
+        if isinstance(unseeded, Error):
+            unseeded.log()
+            return
+        _unseeded_guilds = unseeded
+
+    if guild.id not in _unseeded_guilds:
+        return
+    # Taken out before anything is awaited, so only one leaderboard request seeds the guild
+    _unseeded_guilds.discard(guild.id)
+
+    if config.MEMBER_CACHE == "none":
+        # Left for a restart with the members intent, which listing the members needs
+        logging.warning(f"Can't carry scores over to the leaderboard of guild {guild.id} without the members intent. "
+                        f"Set MEMBERCACHE to active or all.")
+        return
+
+    try:
+        members: list[Member] = await guild.chunk(cache=False)
+    except (discord.DiscordException, asyncio.TimeoutError) as error:
+        logging.error(f"Couldn't list the members of guild {guild.id}: {error}")
+        _unseeded_guilds.add(guild.id)
+        return
+
+    result: Error = await async_repository.seed_guild_scores(guild.id, [member.id for member in members])
+    if result.Status != ErrorType.NoError:
+        result.log()
+        _unseeded_guilds.add(guild.id)
+        return
+
+    caches.LEADERBOARDS.evict(guild.id)
+    await cachestore.invalidate(caches.LEADERBOARDS_CHANNEL, guild.id)
+
+
+async def get_leaderboard(guild: Guild, channel: TextChannel | Thread, coins: bool):
+    claimable: Claimable = Claimable.Coin if coins else Claimable.Clam
+
+    entry: caches.LeaderboardEntry | None = caches.LEADERBOARDS.get(guild.id, claimable)
+    if entry is None:
+        await seed_guild_scores(guild)
+
+        # Taken before anything is read, so a claim landing part way through is noticed
+        generation: int = caches.LEADERBOARDS.generation(guild.id, claimable)
+        # Scores still waiting in the ledger need to be in the database before it's read
+        if ledger.SCORE_LEDGER.has_pending_for_guild(guild.id):
+            await ledger.SCORE_LEDGER.flush()
+
+        # Fetch a few spare rows to cover top scorers that have left
+        top_scores = await async_repository.get_top_guild_scores(guild.id, claimable, constants.LEADERBOARD_FETCH)
+        if isinstance(top_scores, Error):
+            logging.error(top_scores.Message)
+            return
+
+        entry = caches.LEADERBOARDS.put(guild.id, claimable, generation, top_scores)
+
+    embed: Embed | None = entry.Embed
+    if embed is None:
+        rows: list[tuple[int, int]] = entry.Rows
+        names: dict[int, str | None] = await resolve_member_names(guild, [user_id for user_id, _ in rows])
+        embed, complete = build_leaderboard_embed(rows, names, coins)
+        # Names that couldn't be looked up are tried again next time. A claim may also have changed the rows while the
+        # names were being looked up, making this embed out of date
+        if complete and entry.Rows is rows:
+            entry.Embed = embed
+
+    await channel.send(embed=embed)
 
 
 def get_random_number(start: int, end: int) -> int:
@@ -397,12 +729,20 @@ def get_meme() -> str:
     return result
 
 
-def set_moderation_info(user_id: int,
-                        guild_id: int,
-                        moderator_id: int,
-                        moderation_type: ModerationType,
-                        extra: str | None = None):
-    result: Error = repository.set_user_moderation_info(user_id, guild_id, moderator_id, moderation_type, extra)
+def _expiry_to_db(expiry: datetime | None) -> datetime | None:
+    # Stored as UTC without a timezone, as MySQL's DATETIME can't hold one
+    return expiry.astimezone(timezone.utc).replace(tzinfo=None) if expiry is not None else None
+
+
+async def set_moderation_info(user_id: int,
+                              guild_id: int,
+                              moderator_id: int,
+                              moderation_type: ModerationType,
+                              channel_ids: set[int] | None = None,
+                              expiry: datetime | None = None):
+    result: Error = await async_repository.set_user_moderation_info(user_id, guild_id, moderator_id,
+                                                                    moderation_type, channel_ids,
+                                                                    _expiry_to_db(expiry))
     if result.Status == ErrorType.NoError:
         return True
 
@@ -410,11 +750,33 @@ def set_moderation_info(user_id: int,
     return False
 
 
-def get_moderation_info(user_id: int,
-                        guild_id: int,
-                        moderation_type: ModerationType):
-    result: list[int] | None | Error = repository.get_user_moderation_info(user_id, guild_id, moderation_type)
-    if isinstance(result, Error) and result.Status == ErrorType.MySqlException:
+async def set_moderation_expiry(user_id: int,
+                                guild_id: int,
+                                moderation_type: ModerationType,
+                                expiry: datetime | None) -> bool:
+    result: Error = await async_repository.set_moderation_expiry(user_id, guild_id, moderation_type,
+                                                                 _expiry_to_db(expiry))
+    if result.Status == ErrorType.NoError:
+        return True
+
+    logging.error(result.Message)
+    return False
+
+
+async def get_pending_expiries(moderation_type: ModerationType) -> list[tuple[int, int, datetime]] | None:
+    result = await async_repository.get_pending_expiries(moderation_type)
+    if isinstance(result, Error):
+        result.log()
+        return None
+
+    return [(guild_id, user_id, expiry.replace(tzinfo=timezone.utc)) for guild_id, user_id, expiry in result]
+
+
+async def get_moderation_info(user_id: int,
+                              guild_id: int,
+                              moderation_type: ModerationType):
+    result: set[int] | None | Error = await async_repository.get_user_moderation_info(user_id, guild_id, moderation_type)
+    if isinstance(result, Error):
         logging.error(result.Message)
         return None
 
@@ -424,10 +786,24 @@ def get_moderation_info(user_id: int,
     return result
 
 
-def remove_moderation_info(user_id: int,
-                           guild_id: int,
-                           moderation_type: ModerationType):
-    result: Error = repository.remove_user_moderation_info(user_id, guild_id, moderation_type)
+async def add_moderation_channels(user_id: int,
+                                  guild_id: int,
+                                  moderation_type: ModerationType,
+                                  channel_ids: list[int]) -> bool:
+    result: Error = await async_repository.add_moderation_channels(user_id, guild_id, moderation_type, channel_ids)
+    if result.Status == ErrorType.NoError:
+        return True
+
+    logging.error(result.Message)
+    return False
+
+
+async def remove_moderation_channels(user_id: int,
+                                     guild_id: int,
+                                     moderation_type: ModerationType,
+                                     channel_ids: list[int]) -> bool:
+    result: Error = await async_repository.remove_moderation_channels(user_id, guild_id, moderation_type,
+                                                                      channel_ids)
     if result.Status == ErrorType.NoError:
         return True
 
@@ -435,6 +811,35 @@ def remove_moderation_info(user_id: int,
     return False
 
 
+async def remove_moderation_info(user_id: int,
+                                 guild_id: int,
+                                 moderation_type: ModerationType):
+    result: Error = await async_repository.remove_user_moderation_info(user_id, guild_id, moderation_type)
+    if result.Status == ErrorType.NoError:
+        return True
+
+    logging.error(result.Message)
+    return False
+
+
+def parse_duration(text: str) -> timedelta | None:
+    # Any combination of weeks, days, hours, minutes and seconds, largest first, e.g. 10m or 1h30m
+    match: re.Match | None = re.fullmatch(r'(?:(\d+)w)?(?:(\d+)d)?(?:(\d+)h)?(?:(\d+)m)?(?:(\d+)s)?', text.lower())
+    if match is None or not any(match.groups()):
+        return None
+
+    weeks, days, hours, minutes, seconds = (int(x) if x else 0 for x in match.groups())
+    return timedelta(weeks=weeks, days=days, hours=hours, minutes=minutes, seconds=seconds)
+
+
+def owns_guild(bot: Bot, guild_id: int) -> bool:
+    # When the shards are split across processes, each guild belongs to the one running its shard
+    if not bot.shard_count or bot.shard_ids is None:
+        return True
+
+    return (guild_id >> 22) % bot.shard_count in bot.shard_ids
+
+
 def find_title(version: str, titles: List[Tuple[str, str]]) -> str:
     for title in titles:
         if re.search(version.lower(), title[1].lower()) is not None:
@@ -0,0 +1,142 @@
+"""instrumentation.py"""
+
+# IMPORTS #
+import logging
+from threading import local
+import time
+from typing import Any, Callable
+
+from enums import ErrorType, WarningType
+from classes import Error, QueryStats
+
+"""
+    Per-call timings for the repository. repository.py times each call as a whole, and the backends add the time
+    spent in each phase of it by reporting connection waits through add_phase, and by handing out connections
+    wrapped in TimedConnection, which times statements and fetches as they happen.
+    Phases are kept per thread, which works because each repository call runs start to finish on one thread.
+"""
+
+QUERY_STATS: QueryStats = QueryStats()
+
+_current: local = local()
+
+
+def add_phase(phase: str, seconds: float):
+    """
+    Adds time to a phase of the repository call running on this thread. Does nothing outside a timed call.
+    :param phase: One of QueryStats.PHASES.
+    :param seconds: The time spent.
+    """
+    phases: dict[str, float] | None = getattr(_current, "phases", None)
+    if phases is not None:
+        phases[phase] = phases.get(phase, 0.0) + seconds
+
+
+def timed_call(func: Callable[..., Any], *args: Any) -> Any:
+    """
+    Runs a repository function, recording how long it took and any error it returned.
+    :param func: The backend function to run.
+    :return: Whatever the function returns.
+    """
+    phases: dict[str, float] = {}
+    _current.phases = phases
+    error: str | None = None
+    start: float = time.perf_counter()
+    try:
+        result: Any = func(*args)
+        if isinstance(result, Error) and result.Status not in (ErrorType.NoError, WarningType.NoWarning):
+            error = result.Status.name
+        return result
+    except Exception as exception:
+        error = type(exception).__name__
+        raise
+    finally:
+        _current.phases = None
+        phases["total"] = time.perf_counter() - start
+        QUERY_STATS.record(func.__name__, phases, error)
+
+
+class TimedCursor:
+    """
+    Wraps a database cursor, adding the time spent running statements and fetching rows to the current call.
+    """
+
+    def __init__(self, cursor: Any):
+        self._cursor: Any = cursor
+
+    def __enter__(self) -> "TimedCursor":
+        return self
+
+    def __exit__(self, *exc_info: Any):
+        self._cursor.close()
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._cursor, name)
+
+    def _timed(self, phase: str, func: Callable[..., Any], *args: Any) -> Any:
+        start: float = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            add_phase(phase, time.perf_counter() - start)
+
+    def execute(self, *args: Any) -> Any:
+        return self._timed("execute", self._cursor.execute, *args)
+
+    def executemany(self, *args: Any) -> Any:
+        return self._timed("execute", self._cursor.executemany, *args)
+
+    def fetchone(self) -> Any:
+        return self._timed("fetch", self._cursor.fetchone)
+
+    def fetchall(self) -> Any:
+        return self._timed("fetch", self._cursor.fetchall)
+
+
+class TimedConnection:
+    """
+    Wraps a database connection so its cursors are timed. Commits count towards running statements.
+    """
+
+    def __init__(self, cnx: Any):
+        self._cnx: Any = cnx
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._cnx, name)
+
+    def cursor(self, *args: Any) -> TimedCursor:
+        return TimedCursor(self._cnx.cursor(*args))
+
+    def commit(self):
+        start: float = time.perf_counter()
+        try:
+            self._cnx.commit()
+        finally:
+            add_phase("execute", time.perf_counter() - start)
+
+
+def format_query_stats() -> str:
+    """
+    Lays out the recorded timings as a table, with the functions taking the most time in total first.
+    :return: The table.
+    """
+    stats: dict[str, dict[str, Any]] = QUERY_STATS.snapshot()
+    lines: list[str] = [
+        f"{'function':<28} {'calls':>8} {'errors':>6} {'total s':>9} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8} "
+        f"{'acq p99':>8} {'exec p99':>8} {'fetch p99':>9}"
+    ]
+    for name, stat in sorted(stats.items(), key=lambda item: item[1]["total"]["sum"], reverse=True):
+        lines.append(
+            f"{name:<28} {stat['calls']:>8} {sum(stat['errors'].values()):>6} {stat['total']['sum']:>9.3f} "
+            f"{stat['total']['p50'] * 1000:>8.1f} {stat['total']['p99'] * 1000:>8.1f} "
+            f"{stat['total']['max'] * 1000:>8.1f} {stat['acquire']['p99'] * 1000:>8.1f} "
+            f"{stat['execute']['p99'] * 1000:>8.1f} {stat['fetch']['p99'] * 1000:>9.1f}"
+        )
+        if stat["errors"]:
+            lines.append(f"    errors: {', '.join(f'{kind}={count}' for kind, count in stat['errors'].items())}")
+
+    return "\n".join(lines)
+
+
+def dump_query_stats():
+    logging.warning(f"Repository query timings:\n{format_query_stats()}")
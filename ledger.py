@@ -0,0 +1,135 @@
+"""ledger.py"""
+
+# IMPORTS #
+import asyncio
+import logging
+
+import config
+
+import async_repository
+
+from classes import Error
+
+from enums import Claimable, ErrorType
+
+LedgerKey = tuple[int, int, Claimable]
+
+
+class ScoreLedger:
+    """
+    Buffers score increments in memory and writes them to the database in batches.
+    Increments for the same guild, user and claimable are added together, so a busy claim event costs one upsert
+    row per user per flush. At most one flush interval's worth of claims can be lost if the bot dies without shutting down.
+    """
+
+    def __init__(self, interval: float, threshold: int):
+        self._interval: float = interval
+        self._threshold: int = threshold
+        self._pending: dict[LedgerKey, int] = {}
+        # Deltas currently being written. Still counted by pending() until the write succeeds
+        self._flushing: dict[LedgerKey, int] = {}
+        self._flush_lock: asyncio.Lock = asyncio.Lock()
+        self._wake: asyncio.Event = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self._stopping: bool = False
+
+    @property
+    def enabled(self) -> bool:
+        return self._interval > 0
+
+    def add(self, guild_id: int, user_id: int, claimable: Claimable, delta: int):
+        key: LedgerKey = (guild_id, user_id, claimable)
+        self._pending[key] = self._pending.get(key, 0) + delta
+
+        if len(self._pending) >= self._threshold:
+            self._wake.set()
+
+    def pending(self, user_id: int, claimable: Claimable) -> int:
+        """
+        Gets the total of the increments for a user, across all guilds, that haven't reached the database yet.
+        """
+        # Never more than SCORE_FLUSH_THRESHOLD entries or so in either, so a scan is cheap enough
+        return sum(
+            delta for (_, key_user_id, key_claimable), delta in [*self._pending.items(), *self._flushing.items()]
+            if key_user_id == user_id and key_claimable == claimable
+        )
+
+    async def get_score(self, user_id: int, claimable: Claimable) -> int | Error:
+        """
+        Gets a user's total score across all guilds, including increments that haven't reached the database yet.
+        """
+        # Not during a flush, or its deltas could be counted both in the database and as pending, or in neither
+        async with self._flush_lock:
+            score: int | Error = await async_repository.get_user_score(user_id, claimable)
+            if isinstance(score, Error):
+                return score
+
+            return score + self.pending(user_id, claimable)
+
+    def has_pending_for_guild(self, guild_id: int) -> bool:
+        return any(key[0] == guild_id for key in [*self._pending, *self._flushing])
+
+    async def flush(self) -> bool:
+        async with self._flush_lock:
+            if not self._pending:
+                return True
+
+            self._flushing, self._pending = self._pending, {}
+
+            totals: dict[tuple[int, int], list[int]] = {}
+            for (guild_id, user_id, claimable), delta in self._flushing.items():
+                totals.setdefault((guild_id, user_id), [0, 0])[claimable.value] += delta
+
+            # The write carries on in its thread even if this is cancelled, so it's shielded, and its outcome waited for
+            # before giving up. Otherwise its deltas could be lost, or written a second time by the next flush
+            write: asyncio.Future = asyncio.ensure_future(async_repository.increment_user_scores(
+                [(guild_id, user_id, coins, clams) for (guild_id, user_id), (coins, clams) in totals.items()]
+            ))
+            result: Error | None = None
+            try:
+                try:
+                    result = await asyncio.shield(write)
+                except asyncio.CancelledError:
+                    result = await write
+                    raise
+            finally:
+                if result is None or result.Status != ErrorType.NoError:
+                    if result is not None:
+                        result.log()
+                    # Keep the deltas so the next flush can try again
+                    for key, delta in self._flushing.items():
+                        self._pending[key] = self._pending.get(key, 0) + delta
+
+                self._flushing = {}
+
+            return result.Status == ErrorType.NoError
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self._interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+            try:
+                await self.flush()
+            except Exception:
+                logging.exception("Failed to flush score ledger.")
+
+    def start(self):
+        if self.enabled and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        # Let any write in progress finish rather than cancelling it part way, then write whatever is left
+        self._stopping = True
+        self._wake.set()
+        if self._task is not None:
+            await self._task
+            self._task = None
+
+        await self.flush()
+
+
+SCORE_LEDGER: ScoreLedger = ScoreLedger(config.SCORE_FLUSH_INTERVAL, config.SCORE_FLUSH_THRESHOLD)
@@ -0,0 +1,659 @@
+"""memory_repository.py"""
+from datetime import datetime
+import heapq
+from threading import Lock
+from typing import Iterable
+
+import constants
+
+from enums import Claimable, ContentType, ErrorType, ModerationType
+from classes import Error, PoolStats
+
+from datatypes import Guilds, Guild, CurrentClaimable, SpawnStates, ContentEntry, GuildContent
+
+"""
+    The repository functions, backed by plain dictionaries. Nothing is kept once the process exits, so this is for
+    benchmarks, load tests and trying the bot out without a database.
+    Every function holds one lock for its whole body, which makes each call atomic in the same way a transaction
+    would be. Values are copied on the way in and out, so callers can never change stored data by accident.
+"""
+
+ModerationKey = tuple[int, int, int]
+
+_lock: Lock = Lock()
+
+# Guild ID to its row, with the same columns as the GUILDS table
+_guilds: dict[int, dict[str, int | None]] = {}
+# Claimable to guild ID to that guild's spawn state
+_spawns: dict[Claimable, dict[int, dict[str, datetime | int | None]]] = {claimable: {} for claimable in Claimable}
+# User ID to [coins, clams]
+_users: dict[int, list[int]] = {}
+# (Guild ID, user ID) to [coins, clams]
+_guild_scores: dict[tuple[int, int], list[int]] = {}
+# Guilds whose members' overall scores are still to be carried over to _guild_scores
+_score_seeds: set[int] = set()
+# (User ID, guild ID, moderation type) to a (moderator ID, expiry) per recorded restriction
+_moderation: dict[ModerationKey, list[tuple[int, datetime | None]]] = {}
+_moderation_channels: dict[ModerationKey, set[int]] = {}
+# Guild ID to the content it has added, by content ID, and the types of built-in content it has switched off
+_content: dict[int, dict[int, ContentEntry]] = {}
+_hidden_defaults: dict[int, set[ContentType]] = {}
+_next_content_id: int = 1
+
+POOL_STATS: PoolStats = PoolStats()
+
+
+def get_pool_stats() -> dict[str, int | float]:
+    """
+    Gets the current connection counters. There are no connections to pool, so these never change.
+    :return: Borrow counts and wait times (in seconds).
+    """
+    return POOL_STATS.snapshot()
+
+
+def ping() -> Error:
+    """
+    Always succeeds, as there's nothing to connect to.
+    """
+    return Error(ErrorType.NoError)
+
+
+def clear():
+    """
+    Removes everything stored, such as between benchmark runs.
+    """
+    with _lock:
+        _guilds.clear()
+        for states in _spawns.values():
+            states.clear()
+        _users.clear()
+        _guild_scores.clear()
+        _moderation.clear()
+        _moderation_channels.clear()
+        _content.clear()
+        _hidden_defaults.clear()
+
+
+def _guild_from_row(guild_id: int, row: dict[str, int | None]) -> Guild:
+    return {
+        "id": guild_id,
+        "active": bool(row["Active"]),
+        "changelog": row["Changelog"],
+        "lastReactor": row["LastReactor"],
+        "jailRole": row["JailRoleId"]
+    }
+
+
+def _missing_guild(guild_id: int) -> Error:
+    return Error(ErrorType.InvalidArgument, f"Guild {guild_id} doesn't exist.")
+
+
+def get_all_guilds() -> Guilds | Error:
+    """
+    Retrieves all current guild IDs.
+    :return: A list of guild IDs.
+    """
+    with _lock:
+        return [_guild_from_row(guild_id, row) for guild_id, row in _guilds.items()]
+
+
+def get_guild(guild_id: int) -> Guild | None | Error:
+    """
+    Retrieves a single guild.
+    :param guild_id: The ID of the guild.
+    :return: The guild, or None if it isn't stored.
+    """
+    with _lock:
+        row: dict[str, int | None] | None = _guilds.get(guild_id)
+        return _guild_from_row(guild_id, row) if row is not None else None
+
+
+def _set_guild_column(guild_id: int, column: str, value: int | None) -> Error:
+    # Like an UPDATE, a guild that isn't stored is left alone rather than being an error
+    with _lock:
+        row: dict[str, int | None] | None = _guilds.get(guild_id)
+        if row is not None:
+            row[column] = value
+
+    return Error(ErrorType.NoError)
+
+
+def set_active_guild(guild_id: int) -> Error:
+    """
+    Sets a guild to active.
+    :param guild_id: The ID of the guild.
+    """
+    return _set_guild_column(guild_id, "Active", 1)
+
+
+def set_inactive_guild(guild_id: int) -> Error:
+    """
+    Sets a guild to inactive.
+    :param guild_id: The ID of the guild.
+    """
+    return _set_guild_column(guild_id, "Active", 0)
+
+
+def add_guild(guild_id: int) -> Error:
+    """
+    Add a new guild.
+    :param guild_id: The ID of the guild to add
+    """
+    return reconcile_guilds([guild_id], [])
+
+
+def reconcile_guilds(new_guild_ids: list[int], reactivated_guild_ids: list[int]) -> Error:
+    """
+    Brings the stored guilds in line with the guilds the bot is in, all at once.
+    :param new_guild_ids: The IDs of guilds to add. Any already stored, such as by another process, are left as they
+    are.
+    :param reactivated_guild_ids: The IDs of stored guilds to set back to active.
+    """
+    with _lock:
+        today: datetime = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        for guild_id in new_guild_ids:
+            _guilds.setdefault(guild_id, {"Active": 1, "Changelog": 0, "LastReactor": None, "JailRoleId": None})
+            for states in _spawns.values():
+                states.setdefault(guild_id, {"LastCaught": today, "Current": None, "CurrentChannelId": None})
+
+        for guild_id in reactivated_guild_ids:
+            if guild_id in _guilds:
+                _guilds[guild_id]["Active"] = 1
+
+    return Error(ErrorType.NoError)
+
+
+def claim_changelog(guild_ids: list[int], version: int) -> list[int] | Error:
+    """
+    Moves guilds on to a changelog version, for those that haven't had it yet.
+    :param guild_ids: The IDs of the guilds to claim.
+    :param version: The changelog index.
+    :return: The IDs of the guilds claimed by this call, which should be sent the changelog.
+    """
+    claimed: list[int] = []
+    with _lock:
+        for guild_id in guild_ids:
+            row: dict[str, int | None] | None = _guilds.get(guild_id)
+            if row is not None and (row["Changelog"] or 0) < version:
+                row["Changelog"] = version
+                claimed.append(guild_id)
+
+    return claimed
+
+
+def get_guild_changelog_version(guild_id: int) -> int | Error:
+    """
+    Gets the latest changelog version released to a guild.
+    :param guild_id: The guild ID.
+    :return: The changelog index.
+    """
+    with _lock:
+        row: dict[str, int | None] | None = _guilds.get(guild_id)
+        return row["Changelog"] if row is not None else _missing_guild(guild_id)
+
+
+def set_guild_changelog_version(guild_id: int, version: int) -> Error:
+    """
+    Sets the changelog version for a guild.
+    :param guild_id: The guild ID.
+    :param version: The changelog index.
+    """
+    return _set_guild_column(guild_id, "Changelog", version)
+
+
+def set_guild_jail_role(guild_id: int, role_id: int | None) -> Error:
+    """
+    Sets the role used to mute users in a guild.
+    :param guild_id: The guild ID.
+    :param role_id: The ID of the role, or None to clear it.
+    """
+    return _set_guild_column(guild_id, "JailRoleId", role_id)
+
+
+def get_last_caught(guild_id: int, claimable: Claimable) -> datetime | Error:
+    """
+    Retrieves the time at which a crate/clam was last caught.
+    :param guild_id: The guild ID.
+    :param claimable: The type of claimable.
+    :return: The datetime of the last caught item.
+    """
+    if claimable not in _spawns:
+        return Error(ErrorType.InvalidArgument, "Invalid argument for claimable.")
+
+    with _lock:
+        state = _spawns[claimable].get(guild_id)
+        return state["LastCaught"] if state is not None else _missing_guild(guild_id)
+
+
+def set_last_caught(guild_id: int, claimable: Claimable, time: datetime) -> Error:
+    """
+    Sets the time at which a crate/clam was last caught.
+    :param guild_id: The guild ID.
+    :param claimable: The type of claimable.
+    :param time: The time at which the item was caught.
+    """
+    if claimable not in _spawns:
+        return Error(ErrorType.InvalidArgument, "Invalid argument for claimable.")
+
+    with _lock:
+        state = _spawns[claimable].get(guild_id)
+        if state is not None:
+            state["LastCaught"] = time
+
+    return Error(ErrorType.NoError)
+
+
+def get_current_claimable(guild_id: int, claimable: Claimable) -> CurrentClaimable | Error:
+    """
+    Returns the channel and message IDs of the currently available claimable, if it exists.
+    :param guild_id: The ID of the guild.
+    :param claimable: The type of claimable.
+    :return: A message ID and channel ID or None
+    """
+    if claimable not in _spawns:
+        return Error(ErrorType.InvalidArgument, "Invalid argument for claimable.")
+
+    with _lock:
+        state = _spawns[claimable].get(guild_id)
+        if state is None:
+            return _missing_guild(guild_id)
+
+        return {
+            "current": state["Current"],
+            "currentChannel": state["CurrentChannelId"]
+        }
+
+
+def set_current_claimable(guild_id: int, claimable: Claimable, message_id: int | None, channel_id: int | None) -> Error:
+    """
+    Sets the message and channel of the currently available claimable.
+    :param guild_id: The ID of the guild.
+    :param claimable: The type of claimable.
+    :param message_id: The ID of the claimable message.
+    :param channel_id: The ID of the channel the claimable appeared in.
+    """
+    if claimable not in _spawns:
+        return Error(ErrorType.InvalidArgument, "Invalid argument for claimable.")
+
+    with _lock:
+        state = _spawns[claimable].get(guild_id)
+        if state is not None:
+            state["Current"] = message_id
+            state["CurrentChannelId"] = channel_id
+
+    return Error(ErrorType.NoError)
+
+
+def get_spawn_states(guild_id: int) -> SpawnStates | Error:
+    """
+    Retrieves the last caught time and any unclaimed message for every type of claimable in a guild.
+    :param guild_id: The ID of the guild.
+    :return: The spawn state of each claimable.
+    """
+    with _lock:
+        response: SpawnStates = {
+            claimable: {
+                "lastCaught": states[guild_id]["LastCaught"],
+                "current": states[guild_id]["Current"],
+                "currentChannel": states[guild_id]["CurrentChannelId"]
+            } for claimable, states in _spawns.items() if guild_id in states
+        }
+
+    if len(response) != len(Claimable):
+        return Error(ErrorType.InvalidArgument, f"Guild {guild_id} is missing spawn data.")
+
+    return response
+
+
+def _get_user(user_id: int) -> list[int]:
+    # Must be called with the lock held
+    return _users.setdefault(user_id, [constants.STARTING_COINS, 0])
+
+
+def get_user_score(user_id: int, claimable: Claimable) -> int | Error:
+    """
+    Gets the individual user's score for a particular claimable, creating the user if they don't exist yet.
+    :param user_id: The ID of the user.
+    :param claimable: The type of claimable.
+    :return: The score for the user.
+    """
+    if claimable not in (Claimable.Coin, Claimable.Clam):
+        return Error(ErrorType.InvalidArgument, "Invalid argument for claimable.")
+
+    with _lock:
+        return _get_user(user_id)[claimable.value]
+
+
+def set_user_score(user_id: int, score: int, claimable: Claimable) -> Error:
+    """
+    Sets the user's score for a particular claimable.
+    :param user_id: The user's ID.
+    :param score: The score to set.
+    :param claimable: The type of claimable.
+    """
+    if claimable not in (Claimable.Coin, Claimable.Clam):
+        return Error(ErrorType.InvalidArgument, "Invalid argument for claimable.")
+
+    with _lock:
+        if user_id in _users:
+            _users[user_id][claimable.value] = score
+
+    return Error(ErrorType.NoError)
+
+
+def increment_user_score(guild_id: int, user_id: int, claimable: Claimable, delta: int) -> int | Error:
+    """
+    Adds to the user's score for a particular claimable, both overall and within the guild it was claimed in,
+    creating the user if they don't exist yet.
+    :param guild_id: The ID of the guild the claimable was claimed in.
+    :param user_id: The user's ID.
+    :param claimable: The type of claimable.
+    :param delta: The amount to add to the score. Must be more than 0.
+    :return: The user's new overall score.
+    """
+    if claimable not in (Claimable.Coin, Claimable.Clam):
+        return Error(ErrorType.InvalidArgument, "Invalid argument for claimable.")
+    if delta <= 0:
+        return Error(ErrorType.InvalidArgument, "Invalid argument for delta. Scores only go up.")
+
+    with _lock:
+        user: list[int] = _get_user(user_id)
+        user[claimable.value] += delta
+        _guild_scores.setdefault((guild_id, user_id), [0, 0])[claimable.value] += delta
+        return user[claimable.value]
+
+
+def increment_user_scores(deltas: list[tuple[int, int, int, int]]) -> Error:
+    """
+    Adds to the scores of many users at once, both overall and per guild, creating any users that don't exist yet.
+    :param deltas: A list of (guild ID, user ID, coins to add, clams to add).
+    """
+    with _lock:
+        for guild_id, user_id, coins, clams in deltas:
+            user: list[int] = _get_user(user_id)
+            user[0] += coins
+            user[1] += clams
+
+            guild_score: list[int] = _guild_scores.setdefault((guild_id, user_id), [0, 0])
+            guild_score[0] += coins
+            guild_score[1] += clams
+
+    return Error(ErrorType.NoError)
+
+
+def get_top_guild_scores(guild_id: int, claimable: Claimable, limit: int) -> list[tuple[int, int]] | Error:
+    """
+    Gets the top scores for a particular claimable within a guild.
+    :param guild_id: The ID of the guild.
+    :param claimable: The type of claimable.
+    :param limit: The maximum number of scores to return.
+    :return: A list of scores attached to user IDs, highest first.
+    """
+    if claimable not in (Claimable.Coin, Claimable.Clam):
+        return Error(ErrorType.InvalidArgument, "Invalid argument for claimable.")
+
+    with _lock:
+        scores: list[tuple[int, int]] = [
+            (user_id, score[claimable.value]) for (score_guild_id, user_id), score in _guild_scores.items()
+            if score_guild_id == guild_id
+        ]
+
+    return heapq.nlargest(limit, scores, key=lambda row: row[1])
+
+
+def get_unseeded_guilds() -> set[int] | Error:
+    """
+    Gets the guilds whose members' overall scores still need carrying over to GUILD_USER_SCORES. Only databases
+    created before GUILD_USER_SCORES have any, added to GUILD_SCORE_SEEDS by migrate.py.
+    :return: The IDs of the guilds.
+    """
+    with _lock:
+        return set(_score_seeds)
+
+
+def seed_guild_scores(guild_id: int, user_ids: list[int]) -> Error:
+    """
+    Carries a guild's members' overall scores over to their scores within the guild, once. Each member's score in the
+    guild becomes their overall score, as the leaderboard showed before it was per guild, unless it's already higher.
+    Does nothing if the guild has already been seeded, such as by another process.
+    :param guild_id: The ID of the guild.
+    :param user_ids: The IDs of the guild's members.
+    """
+    with _lock:
+        if guild_id not in _score_seeds:
+            return Error(ErrorType.NoError)
+
+        _score_seeds.discard(guild_id)
+        for user_id in user_ids:
+            user: list[int] | None = _users.get(user_id)
+            if user is None:
+                continue
+
+            score: list[int] = _guild_scores.setdefault((guild_id, user_id), [0, 0])
+            score[0] = max(score[0], user[0])
+            score[1] = max(score[1], user[1])
+
+    return Error(ErrorType.NoError)
+
+
+def get_user_moderation_info(user_id: int, guild_id: int, moderation_type: ModerationType) -> set[int] | None | Error:
+    """
+    Retrieves a user's particular restriction within a guild, along with the channels it applies to.
+    :param user_id: The ID of the user.
+    :param guild_id: The ID of the guild.
+    :param moderation_type: The type of restriction.
+    :return: The IDs of the channels the restriction covers, or None if it doesn't exist.
+    """
+    key: ModerationKey = (user_id, guild_id, moderation_type.value)
+    with _lock:
+        if key not in _moderation:
+            return None
+
+        return set(_moderation_channels.get(key, ()))
+
+
+def set_user_moderation_info(
+        user_id: int,
+        guild_id: int,
+        moderator_id: int,
+        moderation_type: ModerationType,
+        channel_ids: Iterable[int] | None,
+        expiry: datetime | None = None) -> Error:
+    """
+    Adds moderation data for a user in a guild for a particular restriction.
+    :param user_id: The ID of the user having a moderation applied.
+    :param guild_id: The ID of the guild.
+    :param moderator_id: The ID of the moderator executing the command.
+    :param moderation_type: The type of restriction.
+    :param channel_ids: The IDs of the channels the restriction was applied to, if any.
+    :param expiry: When the restriction should be lifted, or None if it lasts until removed.
+    """
+    key: ModerationKey = (user_id, guild_id, moderation_type.value)
+    with _lock:
+        _moderation.setdefault(key, []).append((moderator_id, expiry))
+        if channel_ids:
+            _moderation_channels.setdefault(key, set()).update(channel_ids)
+
+    return Error(ErrorType.NoError)
+
+
+def set_moderation_expiry(user_id: int,
+                          guild_id: int,
+                          moderation_type: ModerationType,
+                          expiry: datetime | None) -> Error:
+    """
+    Changes when a user's existing restriction should be lifted.
+    :param user_id: The ID of the user.
+    :param guild_id: The ID of the guild.
+    :param moderation_type: The type of restriction.
+    :param expiry: When the restriction should be lifted, or None if it lasts until removed.
+    """
+    key: ModerationKey = (user_id, guild_id, moderation_type.value)
+    with _lock:
+        if key in _moderation:
+            _moderation[key] = [(moderator_id, expiry) for moderator_id, _ in _moderation[key]]
+
+    return Error(ErrorType.NoError)
+
+
+def get_pending_expiries(moderation_type: ModerationType) -> list[tuple[int, int, datetime]] | Error:
+    """
+    Retrieves every restriction of a particular type that is due to be lifted at some point.
+    :param moderation_type: The type of restriction.
+    :return: A list of (guild ID, user ID, expiry), soonest first.
+    """
+    with _lock:
+        pending: list[tuple[int, int, datetime]] = []
+        for (user_id, guild_id, key_type), records in _moderation.items():
+            expiries: list[datetime] = [expiry for _, expiry in records if expiry is not None]
+            if key_type == moderation_type.value and expiries:
+                pending.append((guild_id, user_id, min(expiries)))
+
+    return sorted(pending, key=lambda row: row[2])
+
+
+def add_moderation_channels(user_id: int,
+                            guild_id: int,
+                            moderation_type: ModerationType,
+                            channel_ids: Iterable[int]) -> Error:
+    """
+    Records more channels that a user's existing restriction has been applied to.
+    :param user_id: The ID of the user.
+    :param guild_id: The ID of the guild.
+    :param moderation_type: The type of restriction.
+    :param channel_ids: The IDs of the channels.
+    """
+    key: ModerationKey = (user_id, guild_id, moderation_type.value)
+    with _lock:
+        _moderation_channels.setdefault(key, set()).update(channel_ids)
+
+    return Error(ErrorType.NoError)
+
+
+def remove_moderation_channels(user_id: int,
+                               guild_id: int,
+                               moderation_type: ModerationType,
+                               channel_ids: Iterable[int]) -> Error:
+    """
+    Removes channels from a user's restriction, leaving the restriction itself in place.
+    :param user_id: The ID of the user.
+    :param guild_id: The ID of the guild.
+    :param moderation_type: The type of restriction.
+    :param channel_ids: The IDs of the channels.
+    """
+    key: ModerationKey = (user_id, guild_id, moderation_type.value)
+    with _lock:
+        if key in _moderation_channels:
+            _moderation_channels[key].difference_update(channel_ids)
+
+    return Error(ErrorType.NoError)
+
+
+def remove_user_moderation_info(user_id: int, guild_id: int, moderation_type: ModerationType) -> Error:
+    """
+    Removes a particular restriction for a user in a guild, along with its channels.
+    :param user_id: The ID of the user.
+    :param guild_id: The ID of the guild.
+    :param moderation_type: The type of restriction.
+    """
+    key: ModerationKey = (user_id, guild_id, moderation_type.value)
+    with _lock:
+        _moderation.pop(key, None)
+        _moderation_channels.pop(key, None)
+
+    return Error(ErrorType.NoError)
+
+
+def get_last_reactor(guild_id: int) -> int | None | Error:
+    """
+    Gets the ID of the last user to react to a message in a guild.
+    :param guild_id: The ID of the guild.
+    :return: The ID of the user.
+    """
+    with _lock:
+        row: dict[str, int | None] | None = _guilds.get(guild_id)
+        return row["LastReactor"] if row is not None else None
+
+
+def set_last_reactor(guild_id: int, user_id: int) -> Error:
+    """
+    Sets the ID of the last user to react to a message in a guild.
+    :param guild_id: The ID of the guild.
+    :param user_id: The ID of the user.
+    """
+    return _set_guild_column(guild_id, "LastReactor", user_id)
+
+
+def set_last_reactors(last_reactors: list[tuple[int, int]]) -> Error:
+    """
+    Sets the ID of the last user to react to a message for many guilds at once.
+    :param last_reactors: A list of (guild ID, user ID).
+    """
+    with _lock:
+        for guild_id, user_id in last_reactors:
+            if guild_id in _guilds:
+                _guilds[guild_id]["LastReactor"] = user_id
+
+    return Error(ErrorType.NoError)
+
+
+def get_guild_content(guild_id: int) -> GuildContent | Error:
+    """
+    Retrieves the content a guild has added, and the types of built-in content it has switched off.
+    :param guild_id: The ID of the guild.
+    :return: The guild's content.
+    """
+    with _lock:
+        # IDs only ever go up, so this is oldest first
+        entries: list[ContentEntry] = [dict(entry) for entry in _content.get(guild_id, {}).values()]
+        return {"entries": entries, "hiddenDefaults": set(_hidden_defaults.get(guild_id, ()))}
+
+
+def add_guild_content(guild_id: int, content_type: ContentType, key: str | None, value: str) -> int | Error:
+    """
+    Adds a piece of content to a guild.
+    :param guild_id: The ID of the guild.
+    :param content_type: The type of content.
+    :param key: The reaction for a reaction image, or the words for a trigger. None for every other type.
+    :param value: The content itself.
+    :return: The ID of the new content.
+    """
+    global _next_content_id
+    with _lock:
+        content_id: int = _next_content_id
+        _next_content_id += 1
+        _content.setdefault(guild_id, {})[content_id] = {
+            "id": content_id,
+            "type": content_type,
+            "key": key,
+            "value": value
+        }
+
+    return content_id
+
+
+def remove_guild_content(guild_id: int, content_id: int) -> bool | Error:
+    """
+    Removes a piece of content from a guild.
+    :param guild_id: The ID of the guild.
+    :param content_id: The ID of the content.
+    :return: Whether the guild had the content to remove.
+    """
+    with _lock:
+        return _content.get(guild_id, {}).pop(content_id, None) is not None
+
+
+def set_guild_content_defaults(guild_id: int, content_type: ContentType, enabled: bool) -> Error:
+    """
+    Switches the built-in content of a particular type on or off for a guild.
+    :param guild_id: The ID of the guild.
+    :param content_type: The type of content.
+    :param enabled: Whether the guild should get the built-in content of this type.
+    """
+    with _lock:
+        if enabled:
+            _hidden_defaults.get(guild_id, set()).discard(content_type)
+        else:
+            _hidden_defaults.setdefault(guild_id, set()).add(content_type)
+
+    return Error(ErrorType.NoError)
@@ -0,0 +1,222 @@
+"""metrics.py"""
+
+# IMPORTS #
+import asyncio
+import math
+import time
+from threading import Lock
+from typing import Any
+
+from discord.ext.commands import Bot, Context
+
+import config
+
+import async_repository
+import caches
+import repository
+import stallwatch
+
+from classes import CommandStats, LatencyHistogram
+
+"""
+    Performance figures for the whole bot, rendered in the Prometheus text format for the web server's /metrics.
+    Stats updated from the repository's worker threads are guarded by locks, so can be read here at any time.
+"""
+
+COMMAND_STATS: CommandStats = CommandStats()
+
+# Context to the time its command started. Entries are removed once the command completes or fails.
+_command_starts: dict[Context, float] = {}
+
+
+class LoopLagSampler:
+    """
+    Measures how late the event loop is in running a callback that was due now, by sleeping for a fixed interval and
+    seeing how much longer than that it took to wake up. A loop kept busy by blocking code wakes up late.
+    """
+
+    def __init__(self, interval: float):
+        self._interval: float = interval
+        self._lock: Lock = Lock()
+        self._histogram: LatencyHistogram = LatencyHistogram()
+        self.Last: float = 0.0
+        # time.monotonic() of the last sample, so a sampler that has stopped waking up can be spotted
+        self.LastSampled: float = time.monotonic()
+        self._task: asyncio.Task | None = None
+
+    async def _run(self):
+        loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+        while True:
+            start: float = loop.time()
+            await asyncio.sleep(self._interval)
+            lag: float = max(0.0, loop.time() - start - self._interval)
+            with self._lock:
+                self._histogram.record(lag)
+            self.Last = lag
+            self.LastSampled = time.monotonic()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def current(self) -> float:
+        """
+        Gets the most recent lag, counting a sample that is overdue as lag in itself.
+        """
+        overdue: float = time.monotonic() - self.LastSampled - self._interval
+        return max(self.Last, overdue)
+
+    def snapshot(self) -> dict[str, Any]:
+        with self._lock:
+            return self._histogram.snapshot()
+
+
+LOOP_LAG: LoopLagSampler = LoopLagSampler(config.LOOP_LAG_INTERVAL)
+
+
+def command_started(ctx: Context):
+    _command_starts[ctx] = time.perf_counter()
+
+
+def command_finished(ctx: Context, outcome: str):
+    start: float | None = _command_starts.pop(ctx, None)
+    if start is None or ctx.command is None:
+        return
+
+    COMMAND_STATS.record(ctx.command.qualified_name, outcome, time.perf_counter() - start)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _number(value: float) -> str:
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Writer:
+
+    def __init__(self):
+        self._lines: list[str] = []
+
+    def family(self, name: str, kind: str, description: str):
+        self._lines.append(f"# HELP {name} {description}")
+        self._lines.append(f"# TYPE {name} {kind}")
+
+    def sample(self, name: str, value: float, labels: dict[str, str] | None = None):
+        label_text: str = ""
+        if labels:
+            label_text = "{" + ",".join(f'{key}="{_escape(str(val))}"' for key, val in labels.items()) + "}"
+        self._lines.append(f"{name}{label_text} {_number(value)}")
+
+    def histogram(self, name: str, snapshot: dict[str, Any], labels: dict[str, str] | None = None):
+        labels = labels or {}
+        cumulative: int = 0
+        for bound, count in snapshot["buckets"]:
+            cumulative += count
+            self.sample(f"{name}_bucket", cumulative, {**labels, "le": _number(bound)})
+        self.sample(f"{name}_sum", snapshot["sum"], labels)
+        self.sample(f"{name}_count", snapshot["count"], labels)
+
+    def render(self) -> str:
+        return "\n".join(self._lines) + "\n"
+
+
+def render(bot: Bot) -> str:
+    """
+    Gathers every metric into the Prometheus text exposition format.
+    :param bot: The running bot.
+    :return: The metrics page.
+    """
+    out: _Writer = _Writer()
+
+    out.family("nerdbot_gateway_latency_seconds", "gauge", "Time between a gateway heartbeat and its acknowledgement.")
+    out.sample("nerdbot_gateway_latency_seconds", bot.latency)
+    out.family("nerdbot_shard_latency_seconds", "gauge", "Gateway heartbeat latency of each shard in this process.")
+    for shard_id, latency in bot.latencies:
+        out.sample("nerdbot_shard_latency_seconds", latency, {"shard": str(shard_id)})
+
+    out.family("nerdbot_event_loop_lag_seconds", "histogram", "How late the event loop ran a callback that was due.")
+    out.histogram("nerdbot_event_loop_lag_seconds", LOOP_LAG.snapshot())
+    out.family("nerdbot_event_loop_lag_last_seconds", "gauge", "The most recent event loop lag sample.")
+    out.sample("nerdbot_event_loop_lag_last_seconds", LOOP_LAG.Last)
+
+    stalls: dict[str, Any] = stallwatch.STALL_STATS.snapshot()
+    out.family("nerdbot_event_loop_stalls_total", "counter",
+               "Times the event loop was blocked past STALLTHRESHOLD, by handler and the line it was stuck on.")
+    for (handler, site), count in stalls["sites"].items():
+        out.sample("nerdbot_event_loop_stalls_total", count, {"handler": handler, "site": site})
+    out.family("nerdbot_event_loop_stall_seconds", "histogram", "How long each stall blocked the event loop for.")
+    for handler, snapshot in stalls["durations"].items():
+        out.histogram("nerdbot_event_loop_stall_seconds", snapshot, {"handler": handler})
+
+    guilds: list[Any] = list(bot.guilds)
+    out.family("nerdbot_guilds", "gauge", "Guilds the bot is in.")
+    out.sample("nerdbot_guilds", len(guilds))
+    out.family("nerdbot_members", "gauge", "Members across every guild the bot is in.")
+    out.sample("nerdbot_members", sum(guild.member_count or 0 for guild in guilds))
+    out.family("nerdbot_members_cached", "gauge", "Members held in the member cache (see MEMBERCACHE).")
+    out.sample("nerdbot_members_cached", sum(len(guild.members) for guild in guilds))
+
+    commands: dict[str, dict[str, Any]] = COMMAND_STATS.snapshot()
+    out.family("nerdbot_command_invocations_total", "counter", "Commands run, by command and outcome.")
+    for command, stats in commands.items():
+        for outcome, count in stats["outcomes"].items():
+            out.sample("nerdbot_command_invocations_total", count, {"command": command, "outcome": outcome})
+    out.family("nerdbot_command_duration_seconds", "histogram", "Time taken to run each command.")
+    for command, stats in commands.items():
+        out.histogram("nerdbot_command_duration_seconds", stats["latency"], {"command": command})
+
+    queries: dict[str, dict[str, Any]] = repository.get_query_stats()
+    out.family("nerdbot_repository_duration_seconds", "histogram",
+               "Time taken by each repository function, by phase of the call.")
+    for function, stats in queries.items():
+        for phase in ("total", "acquire", "execute", "fetch"):
+            out.histogram("nerdbot_repository_duration_seconds", stats[phase], {"function": function, "phase": phase})
+    out.family("nerdbot_repository_errors_total", "counter", "Errors returned by each repository function, by type.")
+    for function, stats in queries.items():
+        for error, count in stats["errors"].items():
+            out.sample("nerdbot_repository_errors_total", count, {"function": function, "error": error})
+
+    pool: dict[str, int | float] = repository.get_pool_stats()
+    out.family("nerdbot_db_connections_in_use", "gauge", "Database connections currently borrowed.")
+    out.sample("nerdbot_db_connections_in_use", pool["inUse"])
+    out.family("nerdbot_db_connection_timeouts_total", "counter", "Timeouts waiting for a database connection.")
+    out.sample("nerdbot_db_connection_timeouts_total", pool["timeouts"])
+
+    executor: dict[str, int | float] = async_repository.get_executor_stats()
+    out.family("nerdbot_repository_calls_waiting", "gauge", "Repository calls queued for a free worker thread.")
+    out.sample("nerdbot_repository_calls_waiting", executor["waiting"])
+    out.family("nerdbot_repository_calls_running", "gauge", "Repository calls running on a worker thread.")
+    out.sample("nerdbot_repository_calls_running", executor["running"])
+
+    cache_stats: dict[str, dict[str, int]] = {
+        "spawn_states": caches.SPAWN_STATES.snapshot(),
+        "leaderboards": caches.LEADERBOARDS.snapshot(),
+        "member_names": caches.MEMBER_NAMES.snapshot(),
+        "guild_content": caches.GUILD_CONTENT.snapshot()
+    }
+    out.family("nerdbot_cache_hits_total", "counter", "Cache lookups that found an entry.")
+    for cache, stats in cache_stats.items():
+        out.sample("nerdbot_cache_hits_total", stats["hits"], {"cache": cache})
+    out.family("nerdbot_cache_misses_total", "counter", "Cache lookups that found nothing.")
+    for cache, stats in cache_stats.items():
+        out.sample("nerdbot_cache_misses_total", stats["misses"], {"cache": cache})
+    out.family("nerdbot_cache_hit_ratio", "gauge", "Share of cache lookups that found an entry, since startup.")
+    for cache, stats in cache_stats.items():
+        lookups: int = stats["hits"] + stats["misses"]
+        out.sample("nerdbot_cache_hit_ratio", stats["hits"] / lookups if lookups else 0.0, {"cache": cache})
+    out.family("nerdbot_cache_entries", "gauge", "Entries currently held in each cache.")
+    for cache, stats in cache_stats.items():
+        out.sample("nerdbot_cache_entries", stats["entries"], {"cache": cache})
+
+    return out.render()
@@ -0,0 +1,128 @@
+"""migrate.py"""
+
+# IMPORTS #
+import sys
+
+import mysql.connector
+
+import config
+import mysql_repository
+
+from classes import Error
+from enums import ErrorType
+
+from instrumentation import TimedConnection
+
+"""
+    Brings a MySQL database created by an older version of the bot up to date with schema.sql.
+        python migrate.py
+    Each step checks information_schema for what it adds first, so running this again, or against a database
+    created from schema.sql, changes nothing. Run it before starting the new version of the bot.
+    SQLite databases are brought up to date by the bot itself, and the memory backend has nothing to migrate.
+"""
+
+# How to tell whether each kind of step has already been applied
+_CHECKS: dict[str, str] = {
+    "table": ("SELECT COUNT(*) "
+              "FROM information_schema.TABLES "
+              "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %(table)s"),
+    "column": ("SELECT COUNT(*) "
+               "FROM information_schema.COLUMNS "
+               "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %(table)s AND COLUMN_NAME = %(name)s"),
+    "index": ("SELECT COUNT(*) "
+              "FROM information_schema.STATISTICS "
+              "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %(table)s AND INDEX_NAME = %(name)s")
+}
+
+# In the order they must be applied, as (kind, table, column or index name, statement that adds it)
+_STEPS: list[tuple[str, str, str | None, str]] = [
+    ("table", "GUILD_USER_SCORES", None,
+     "CREATE TABLE GUILD_USER_SCORES ("
+     "GuildId BIGINT NOT NULL, "
+     "UserId BIGINT NOT NULL, "
+     "CoinsCaught INT NOT NULL DEFAULT 0, "
+     "ClamsCaught INT NOT NULL DEFAULT 0, "
+     "PRIMARY KEY (GuildId, UserId), "
+     "INDEX IX_GUILD_USER_SCORES_Coins (GuildId, CoinsCaught DESC), "
+     "INDEX IX_GUILD_USER_SCORES_Clams (GuildId, ClamsCaught DESC))"),
+    # Every guild so far, so the bot carries its members' overall scores over to the new table (see seed_guild_scores)
+    ("table", "GUILD_SCORE_SEEDS", None,
+     "CREATE TABLE GUILD_SCORE_SEEDS ("
+     "GuildId BIGINT NOT NULL, "
+     "PRIMARY KEY (GuildId)) "
+     "SELECT GuildId FROM GUILDS"),
+    ("index", "MODERATION", "IX_MODERATION_User",
+     "CREATE INDEX IX_MODERATION_User ON MODERATION (UserId, GuildId, ModerationType)"),
+    ("table", "MODERATION_CHANNELS", None,
+     "CREATE TABLE MODERATION_CHANNELS ("
+     "UserId BIGINT NOT NULL, "
+     "GuildId BIGINT NOT NULL, "
+     "ModerationType INT NOT NULL, "
+     "ChannelId BIGINT NOT NULL, "
+     "PRIMARY KEY (UserId, GuildId, ModerationType, ChannelId))"),
+    ("column", "GUILDS", "JailRoleId",
+     "ALTER TABLE GUILDS ADD COLUMN JailRoleId BIGINT NULL"),
+    ("column", "MODERATION", "Expiry",
+     "ALTER TABLE MODERATION ADD COLUMN Expiry DATETIME NULL"),
+    ("index", "MODERATION", "IX_MODERATION_Expiry",
+     "CREATE INDEX IX_MODERATION_Expiry ON MODERATION (ModerationType, Expiry)"),
+    ("table", "GUILD_CONTENT", None,
+     "CREATE TABLE GUILD_CONTENT ("
+     "ContentId BIGINT NOT NULL AUTO_INCREMENT, "
+     "GuildId BIGINT NOT NULL, "
+     "ContentType INT NOT NULL, "
+     "ContentKey VARCHAR(100) NULL, "
+     "Value TEXT NOT NULL, "
+     "PRIMARY KEY (ContentId), "
+     "INDEX IX_GUILD_CONTENT_Guild (GuildId))"),
+    ("table", "GUILD_HIDDEN_DEFAULTS", None,
+     "CREATE TABLE GUILD_HIDDEN_DEFAULTS ("
+     "GuildId BIGINT NOT NULL, "
+     "ContentType INT NOT NULL, "
+     "PRIMARY KEY (GuildId, ContentType))"),
+]
+
+
+def migrate() -> Error:
+    """
+    Applies every step the database doesn't have yet.
+    """
+    cnx: TimedConnection | Error = mysql_repository.create_connection()
+    if isinstance(cnx, Error):
+        return cnx
+
+    with cnx.cursor() as cursor:
+        try:
+            for kind, table, name, statement in _STEPS:
+                cursor.execute(_CHECKS[kind], {"table": table, "name": name})
+                if cursor.fetchone()[0]:
+                    continue
+
+                print(f"Adding {kind} {table}{f'.{name}' if name is not None else ''}")
+                # MySQL commits schema changes as it makes them
+                cursor.execute(statement)
+            response = Error(ErrorType.NoError)
+        except mysql.connector.Error as error:
+            response = Error(ErrorType.MySqlException, error.msg)
+        finally:
+            cursor.close()
+            mysql_repository.release_connection(cnx)
+
+    return response
+
+
+def main():
+    if config.DB_BACKEND != "mysql":
+        print(f"Nothing to migrate: DBBACKEND is '{config.DB_BACKEND}', and only MySQL needs migrating.")
+        return
+
+    result: Error = migrate()
+    if result.Status != ErrorType.NoError:
+        result.log()
+        sys.exit(1)
+
+    print("Database is up to date.")
+
+
+if __name__ == "__main__":
+    main()
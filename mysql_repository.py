@@ -0,0 +1,1665 @@
+"""mysql_repository.py"""
+from datetime import datetime
+from threading import BoundedSemaphore, Lock
+import time
+from typing import Any, Iterable
+
+import mysql.connector
+from mysql.connector import MySQLConnection
+from mysql.connector.pooling import PooledMySQLConnection, MySQLConnectionPool, CNX_POOL_MAXSIZE
+
+import config
+import constants
+
+from enums import Claimable, ContentType, ErrorType, WarningType, ModerationType
+from classes import Error, PoolStats
+
+from instrumentation import TimedConnection, TimedCursor, add_phase
+
+from types import UnionType
+
+from datatypes import Guilds, Guild, CurrentClaimable, SpawnStates, ContentEntry, GuildContent
+
+Connection: UnionType = MySQLConnection | PooledMySQLConnection
+PartialConnection: UnionType = TimedConnection | Error
+
+# Shared connection pool, created on first use. The semaphore bounds how many connections can be borrowed at once,
+# so callers wait (up to DB_POOL_TIMEOUT) for a free connection rather than failing straight away.
+_pool: MySQLConnectionPool | None = None
+_pool_lock: Lock = Lock()
+_pool_slots: BoundedSemaphore = BoundedSemaphore(min(config.DB_POOL_SIZE, CNX_POOL_MAXSIZE))
+
+POOL_STATS: PoolStats = PoolStats()
+
+
+def _get_pool() -> MySQLConnectionPool:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = MySQLConnectionPool(
+                    pool_name="nerdbot",
+                    pool_size=min(config.DB_POOL_SIZE, CNX_POOL_MAXSIZE),
+                    pool_reset_session=True,
+                    host=config.DB_HOST,
+                    user=config.DB_USER,
+                    password=config.DB_PASSWORD,
+                    database=config.DB_NAME
+                )
+    return _pool
+
+
+def create_connection() -> PartialConnection:
+    """
+    Borrows a connection from the shared pool. Must be called at the start of every other function in this file, with
+    the connection handed back through release_connection once finished.
+    Waits up to DB_POOL_TIMEOUT seconds for a free connection, and pings it before use so a connection dropped by
+    the server is re-established rather than failing the query.
+    :return: A connection object.
+    """
+    start: float = time.perf_counter()
+    if not _pool_slots.acquire(timeout=config.DB_POOL_TIMEOUT):
+        POOL_STATS.record_timeout(time.perf_counter() - start)
+        add_phase("acquire", time.perf_counter() - start)
+        return Error(WarningType.BadConnection, "Timed out waiting for a database connection.")
+
+    connection: Connection | None = None
+    try:
+        connection = _get_pool().get_connection()
+        if not connection.is_connected():
+            POOL_STATS.record_reconnect()
+            connection.reconnect(attempts=2, delay=0)
+    except mysql.connector.Error as error:
+        # A pooled connection only goes back in the pool's queue when closed, so one that failed to reconnect must be
+        # closed too, or the pool shrinks by one with every failure
+        if connection is not None:
+            try:
+                connection.close()
+            except mysql.connector.Error:
+                pass
+        _pool_slots.release()
+        add_phase("acquire", time.perf_counter() - start)
+        return Error(WarningType.BadConnection, f"Failed to connect to database. {error.msg}")
+
+    POOL_STATS.record_borrow(time.perf_counter() - start)
+    add_phase("acquire", time.perf_counter() - start)
+    # Wrapped so statements and fetches are timed for the query stats
+    return TimedConnection(connection)
+
+
+def release_connection(cnx: TimedConnection):
+    """
+    Returns a borrowed connection to the pool. Must be called exactly once for every successful create_connection.
+    :param cnx: The connection to return.
+    """
+    try:
+        cnx.close()
+    finally:
+        POOL_STATS.record_release()
+        _pool_slots.release()
+
+
+def get_pool_stats() -> dict[str, int | float]:
+    """
+    Gets the current connection pool counters.
+    :return: Borrow counts and wait times (in seconds) for the pool.
+    """
+    return POOL_STATS.snapshot()
+
+
+def ping() -> Error:
+    """
+    Checks the database can be reached, by borrowing a connection and running a trivial query on it.
+    """
+    cnx: PartialConnection = create_connection()
+    if isinstance(cnx, Error):
+        return cnx
+
+    with cnx.cursor() as cursor:
+        try:
+            cursor.execute("SELECT 1")
+            cursor.fetchall()
+            response = Error(ErrorType.NoError)
+        except mysql.connector.Error as error:
+            response = Error(ErrorType.MySqlException, error.msg)
+        finally:
+            cursor.close()
+            release_connection(cnx)
+
+    return response
+
+
+def get_all_guilds() -> Guilds | Error:
+    """
+    Retrieves all current guild IDs.
+    :return: A list of guild IDs.
+    """
+    cnx: PartialConnection = create_connection()
+    if isinstance(cnx, Error):
+        return cnx
+
+    q_select_all_guild_ids = ("SELECT GuildId, Active, Changelog, LastReactor, JailRoleId "
+                              "FROM GUILDS")
+
+    response: Guilds | Error
+    with cnx.cursor() as cursor:
+        try:
+            cursor.execute(q_select_all_guild_ids)
+            pre_response: Any = cursor.fetchall()
+
+            response = [{
+                "id": x[0],
+                "active": x[1],
+                "changelog": x[2],
+                "lastReactor": x[3],
+                "jailRole": x[4]
+            } for x in pre_response]
+        except mysql.connector.Error as error:
+            response = Error(ErrorType.MySqlException, error.msg)
+        finally:
+            cursor.close()
+            release_connection(cnx)
+
+    return response
+
+
+def get_guild(guild_id: int) -> Guild | None | Error:
+    """
+    Retrieves all current guild IDs.
+    :return: A list of guild IDs.
+    """
+    cnx: PartialConnection = create_connection()
+    if isinstance(cnx, Error):
+        return cnx
+
+    params = {
+        "guildId": guild_id
+    }
+
+    q_select_all_guild_ids = ("SELECT GuildId, Active, Changelog, LastReactor, JailRoleId "
+                              "FROM GUILDS "
+                              "WHERE GuildId = %(guildId)s")
+
+    response: Guild | None | Error
+    with cnx.cursor() as cursor:
+        try:
+            cursor.execute(q_select_all_guild_ids, params)
+            pre_response: Any = cursor.fetchone()
+
+            response = {
+                "id": pre_response[0],
+                "active": pre_response[1],
+                "changelog": pre_response[2],
+                "lastReactor": pre_response[3],
+                "jailRole": pre_response[4]
+            } if pre_response is not None else None
+        except mysql.connector.Error as error:
+            response = Error(ErrorType.MySqlException, error.msg)
+        finally:
+            cursor.close()
+            release_connection(cnx)
+
+    return response
+
+
+def set_active_guild(guild_id: int) -> Error:
+    """
+    Sets a guild to active.
+    :param guild_id: The ID of the guild.
+    """
+    cnx: PartialConnection = create_connection()
+    if isinstance(cnx, Error):
+        return cnx
+
+    params = {
+        'guildId': guild_id
+    }
+
+    q_update_guild_active = ("UPDATE GUILDS "
+                             "SET Active = 1 "
+                             "WHERE GuildId = %(guildId)s")
+
+    with cnx.cursor() as cursor:
+        try:
+            cursor.execute(q_update_guild_active, params)
+            cnx.commit()
+            response = Error(ErrorType.NoError)
+        except mysql.connector.Error as error:
+            response = Error(ErrorType.MySqlException, error.msg)
+        finally:
+            cursor.close()
+            release_connection(cnx)
+
+    return response
+
+
+def set_inactive_guild(guild_id: int) -> Error:
+    """
+    Sets a guild to inactive.
+    :param guild_id: The ID of the guild.
+    """
+    cnx: PartialConnection = create_connection()
+    if isinstance(cnx, Error):
+        return cnx
+
+    params = {
+        'guildId': guild_id
+    }
+
+    q_update_guild_active = ("UPDATE GUILDS "
+                             "SET Active = 0 "
+                             "WHERE GuildId = %(guildId)s")
+
+    with cnx.cursor() as cursor:
+        try:
+            cursor.execute(q_update_guild_active, params)
+            cnx.commit()
+            response = Error(ErrorType.NoError)
+        except mysql.connector.Error as error:
+            response = Error(ErrorType.MySqlException, error.msg)
+        finally:
+            cursor.close()
+            release_connection(cnx)
+
+    return response
+
+
+def add_guild(guild_id: int) -> Error:
+    """
+    Add a new guild to the database.
+    :param guild_id: The ID of the guild to add
+    """
+    cnx: PartialConnection = create_connection()
+    if isinstance(cnx, Error):
+        return cnx
+
+    params = {
+        'guildId': guild_id
+    }
+
+    q_insert_new_guild = ("INSERT "
+                          "INTO GUILDS (GuildId, Active) "
+                          "VALUES (%(guildId)s, 1)")
+
+    q_add_guild_id_to_coins = ("INSERT "
+                               "INTO GUILD_COINS (GuildID, LastCaught) "
+                               "SELECT %(guildId)s AS GuildId, CURRENT_DATE() AS LastCaught "
+                               "FROM GUILD_COINS "
+                               "WHERE (GuildId=%(guildId)s) "
+                               "HAVING COUNT(*)=0")
+    q_add_guild_id_to_clams = ("INSERT "
+                               "INTO GUILD_CLAMS (GuildID, LastCaught) "
+                               "SELECT %(guildId)s AS GuildId, CURRENT_DATE() AS LastCaught "
+                               "FROM GUILD_CLAMS "
+                               "WHERE (GuildId=%(guildId)s) "
+                               "HAVING COUNT(*)=0")
+
+    with cnx.cursor() as cursor:
+        try:
+            cursor.execute(q_insert_new_guild, params)
+            cnx.commit()
+            cursor.execute(q_add_guild_id_to_coins, params)
+            cnx.commit()
+            cursor.execute(q_add_guild_id_to_clams, params)
+            cnx.commit()
+            response = Error(ErrorType.NoError)
+        except mysql.connector.Error as error:
+            response = Error(ErrorType.MySqlException, error.msg)
+        finally:
+            cursor.close()
+            release_connection(cnx)
+
+    return response
+
+
+def _chunks(items: list[Any], size: int = 1000) -> list[list[Any]]:
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def reconcile_guilds(new_guild_ids: list[int], reactivated_guild_ids: list[int]) -> Error:
+    """
+    Brings the stored guilds in line with the guilds the bot is in, in a single transaction. Each kind of change is
+    applied with multi-row statements rather than one statement per guild.
+    :param new_guild_ids: The IDs of guilds to add. Any already stored, such as by another process, are left as they
+    are.
+    :param reactivated_guild_ids: The IDs of stored guilds to set back to active.
+    """
+    if not (new_guild_ids or reactivated_guild_ids):
+        return Error(ErrorType.NoError)
+
+    cnx: PartialConnection = create_connection()
+    if isinstance(cnx, Error):
+        return cnx
+
+    q_insert_new_guilds = ("INSERT "
+                           "INTO GUILDS (GuildId, Active) "
+                           "VALUES (%s, 1) "
+                           "ON DUPLICATE KEY UPDATE GuildId = GuildId")
+
+    q_add_guild_ids_to_coins = ("INSERT "
+                                "INTO GUILD_COINS (GuildId, LastCaught) "
+                                "VALUES (%s, CURRENT_DATE()) "
+                                "ON DUPLICATE KEY UPDATE GuildId = GuildId")
+
+    q_add_guild_ids_to_clams = ("INSERT "
+                                "INTO GUILD_CLAMS (GuildId, LastCaught) "
+                                "VALUES (%s, CURRENT_DATE()) "
+                                "ON DUPLICATE KEY UPDATE GuildId = GuildId")
+
+    q_update_guilds_active = ("UPDATE GUILDS "
+                              "SET Active = 1 "
+                              "WHERE GuildId IN (%s)")
+
+    with cnx.cursor() as cursor:
+        try:
+            # executemany sends each of these INSERTs as a single multi-row statement
+            new_rows = [(guild_id,) for guild_id in new_guild_ids]
+            if new_rows:
+                cursor.executemany(q_insert_new_guilds, new_rows)
+                cursor.executemany(q_add_guild_ids_to_coins, new_rows)
+                cursor.executemany(q_add_guild_ids_to_clams, new_rows)
+
+            for chunk in _chunks(reactivated_guild_ids):
+                cursor.execute(q_update_guilds_active % ','.join(['%s'] * len(chunk)), chunk)
+
+            cnx.commit()
+            response = Error(ErrorType.NoError)
+        except mysql.connector.Error as error:
+            cnx.rollback()
+            response = Error(ErrorType.MySqlException, error.msg)
+        finally:
+            cursor.close()
+            release_connection(cnx)
+
+    return response
+
+
+def claim_changelog(guild_ids: list[int], version: int) -> list[int] | Error:
+    """
+    Moves guilds on to a changelog version, for those that haven't had it yet. The rows are locked while they're
+    checked, so when several processes claim the same guild at once, only one of them gets it.
+    :param guild_ids: The IDs of the guilds to claim.
+    :param version: The changelog index.
+    :return: The IDs of the guilds claimed by this call, which should be sent the changelog.
+    """
+    if not guild_ids:
+        return []
+
+    cnx: PartialConnection = create_connection()
+    if isinstance(cnx, Error):
+        return cnx
+
+    q_get_outdated_guilds = ("SELECT GuildId "
+                             "FROM GUILDS "
+                             "WHERE GuildId IN (%s) AND COALESCE(Changelog, 0) < %%s "
+                             "FOR UPDATE")
+
+    q_set_guilds_changelog_version = ("UPDATE GUILDS "
+                                      "SET Changelog = %%s "
+                                      "WHERE GuildId IN (%s)")
+
+    with cnx.cursor() as cursor:
+        try:
+            claimed: list[int] = []
+            for chunk in _chunks(guild_ids):
+                cursor.execute(q_get_outdated_guilds % ','.join(['%s'] * len(chunk)), [*chunk, version])
+                claimed.extend(row[0] for row in cursor.fetchall())
+
+            for chunk in _chunks(claimed):
+                cursor.execute(q_set_guilds_changelog_version % ','.join(['%s'] * len(chunk)), [version, *chunk])
+
+            cnx.commit()
+            response = claimed
+        except mysql.connector.Error as error:
+            cnx.rollback()
+            response = Error(ErrorType.MySqlException, error.msg)
+        finally:
+            cursor.close()
+            release_connection(cnx)
+
+    return response
+
+
+def get_guild_changelog_version(guild_id: int) -> int | Error:
+    """
+    Gets the latest changelog version released to a guild.
+    :param guild_id: The guild ID.
+    :return: The changelog index.
+    """
+    cnx: PartialConnection = create_connection()
+    if isinstance(cnx, Error):
+        return cnx
+
+    params = {
+        'guildId': guild_id
+    }
+
+    q_get_guild_changelog_version = ("SELECT Changelog "
+                                     "FROM GUILDS "
+                                     "WHERE GuildID = %(guildId)s")
+
+    with cnx.cursor() as cursor:
+        try:
+            cursor.execute(q_get_guild_changelog_version, params)
+            response: Any = cursor.fetchone()[0]
+        except mysql.connector.Error as error:
+            response = Error(ErrorType.MySqlException, error.msg)
+        finally:
+            cursor.close()
+            release_connection(cnx)
+
+    return response
+
+
+def set_guild_changelog_version(guild_id: int, version: int) -> Error:
+    """
+    Sets the changelog version for a guild.
+    :param guild_id: The guild ID.
+    :param version: The changelog index.
+    """
+    cnx: PartialConnection = create_connection()
+    if isinstance(cnx, Error):
+        return cnx
+
+    params = {
+        'version': version,
+        'guildId': guild_id
+    }
+
+    q_set_guild_changelog_version = ("UPDATE GUILDS "
+                                     "SET Changelog = %(version)s "
+                                     "WHERE GuildID = %(guildId)s")
+
+    with cnx.cursor() as cursor:
+        try:
+            cursor.execute(q_set_guild_changelog_version, params)
+            cnx.commit()
+            response = Error(ErrorType.NoError)
+        except mysql.connector.Error as error:
+            response = Error(ErrorType.MySqlException, error.msg)
+        finally:
+            cursor.close()
+            release_connection(cnx)
+
+    return response
+
+
+def set_guild_jail_role(guild_id: int, role_id: int | None) -> Error:
+    """
+    Sets the role used to mute users in a guild.
+    :param guild_id: The guild ID.
+    :param role_id: The ID of the role, or None to clear it.
+    """
+    cnx: PartialConnection = create_connection()
+    if isinstance(cnx, Error):
+        return cnx
+
+    params = {
+        'roleId': role_id,
+        'guildId': guild_id
+    }
+
+    q_set_guild_jail_role = ("UPDATE GUILDS "
+                             "SET JailRoleId = %(roleId)s "
+                             "WHERE GuildId = %(guildId)s")
+
+    with cnx.cursor() as cursor:
+        try:
+            cursor.execute(q_set_guild_jail_role, params)
+            cnx.commit()
+            response = Error(ErrorType.NoError)
+        except mysql.connector.Error as error:
+            response = Error(ErrorType.MySqlException, error.msg)
+        finally:
+            cursor.close()
+            release_connection(cnx)
+
+    return response
+
+
+def get_last_caught(guild_id: int, claimable: Claimable) -> datetime | Error:
+    """
+    Retrieves the time at which a crate/clam was last caught.
+    :param guild_id: The guild ID.
+    :param claimable: The type of claimable.
+    :return: The datetime of the last caught item.
+    """
+    cnx: PartialConnection = create_connection()
+    if isinstance(cnx, Error):
+        return cnx
+
+    params = {
+        'guildId': guild_id
+    }
+
+    if claimable == Claimable.Coin:
+        q_get_last_caught = ("SELECT LastCaught "
+                             "FROM GUILD_COINS "
+                             "WHERE GuildId = %(guildId)s")
+    elif claimable == Claimable.Clam:
+        q_get_last_caught = ("SELECT LastCaught "
+                             "FROM GUILD_CLAMS "
+                             "WHERE GuildId = %(guildId)s")
+    else:
+        release_connection(cnx)
+        return Error(ErrorType.InvalidArgument, "Invalid argument for claimable.")
+
+    with cnx.cursor() as cursor:
+        try:
+            cursor.execute(q_get_last_caught, params)
+            response: Any = cursor.fetchone()[0]
+        except mysql.connector.Error as error:
+            response = Error(ErrorType.MySqlException, error.msg)
+        finally:
+            cursor.close()
+            release_connection(cnx)
+
+    return response
+
+
+def set_last_caught(guild_id: int, claimable: Claimable, time: datetime) -> Error:
+    """
+    Sets the time at which a crate/clam was last caught.
+    :param guild_id: The guild ID.
+    :param claimable: The type of claimable.
+    :param time: The time at which the item was caught.
+    """
+    cnx: PartialConnection = create_connection()
+    if isinstance(cnx, Error):
+        return cnx
+
+    params = {
+        'guildId': guild_id,
+        'time': time
+    }
+
+    if claimable == Claimable.Coin:
+        q_set_last_caught = ("UPDATE GUILD_COINS "
+                             "SET LastCaught = %(time)s "
+                             "WHERE GuildID = %(guildId)s")
+    elif claimable == Claimable.Clam:
+        q_set_last_caught = ("UPDATE GUILD_CLAMS "
+                             "SET LastCaught = %(time)s "
+                             "WHERE GuildID = %(guildId)s")
+    else:
+        release_connection(cnx)
+        return Error(ErrorType.InvalidArgument, "Invalid argument for claimable.")
+
+    with cnx.cursor() as cursor:
+        try:
+            cursor.execute(q_set_last_caught, params)
+            cnx.commit()
+            response = Error(ErrorType.NoError)
+        except mysql.connector.Error as error:
+            response = Error(ErrorType.MySqlException, error.msg)
+        finally:
+            cursor.close()
+            release_connection(cnx)
+
+    return response
+
+
+def get_current_claimable(guild_id: int, claimable: Claimable) -> CurrentClaimable | Error:
+    """
+    Returns the channel and message IDs of the currently available claimable, if it exists.
+    :param guild_id: The ID of the guild.
+    :param claimable: The type of claimable.
+    :return: A message ID and channel ID or None
+    """
+    cnx: PartialConnection = create_connection()
+    if isinstance(cnx, Error):
+        return cnx
+
+    params = {
+        "guildId": guild_id
+    }
+
+    q_current_coin = ("SELECT Current, CurrentChannelId "
+                      "FROM GUILD_COINS "
+                      "WHERE GuildId = %(guildId)s")
+
+    q_current_clam = ("SELECT Current, CurrentChannelId "
+                      "FROM GUILD_CLAMS "
+                      "WHERE GuildId = %(guildId)s")
+
+    response: CurrentClaimable | Error
+    with cnx.cursor() as cursor:
+        try:
+            if claimable == Claimable.Coin:
+                cursor.execute(q_current_coin, params)
+            elif claimable == Claimable.Clam:
+                cursor.execute(q_current_clam, params)
+            pre_response: Any = cursor.fetchone()
+            response = {
+                "current": pre_response[0],
+                "currentChannel": pre_response[1]
+            }
+        except mysql.connector.Error as error:
+            response = Error(ErrorType.MySqlException, error.msg)
+        finally:
+            cursor.close()
+            release_connection(cnx)
+
+    return response
+
+
+def set_current_claimable(guild_id: int, claimable: Claimable, message_id: int | None, channel_id: int | None) -> Error:
+    """
+    Returns whether a particular claimable is currently unclaimed.
+    :param guild_id: The ID of the guild.
+    :param claimable: The type of claimable.
+    :param message_id: The ID of the claimable message.
+    :param channel_id: The ID of the channel the claimable appeared in.
+    :return:
+    """
+    cnx: PartialConnection = create_connection()
+    if isinstance(cnx, Error):
+        return cnx
+
+    params = {
+        "guildId": guild_id,
+        "current": message_id,
+        "currentChannel": channel_id
+    }
+
+    q_current_coin = ("UPDATE GUILD_COINS "
+                      "SET Current = %(current)s, "
+                      "CurrentChannelId = %(currentChannel)s "
+                      "WHERE GuildId = %(guildId)s")
+
+    q_current_clam = ("UPDATE GUILD_CLAMS "
+                      "SET Current = %(current)s, "
+                      "CurrentChannelId = %(currentChannel)s "
+                      "WHERE GuildId = %(guildId)s")
+
+    with cnx.cursor() as cursor:
+        try:
+            if claimable == Claimable.Coin:
+                cursor.execute(q_current_coin, params)
+            elif claimable == Claimable.Clam:
+                cursor.execute(q_current_clam, params)
+            cnx.commit()
+            response = Error(ErrorType.NoError)
+        except mysql.connector.Error as error:
+            response = Error(ErrorType.MySqlException, error.msg)
+        finally:
+            cursor.close()
+            release_connection(cnx)
+
+    return response
+
+
+def get_spawn_states(guild_id: int) -> SpawnStates | Error:
+    """
+    Retrieves the last caught time and any unclaimed message for every type of claimable in a guild, in one query.
+    :param guild_id: The ID of the guild.
+    :return: The spawn state of each claimable.
+    """
+    cnx: PartialConnection = create_connection()
+    if isinstance(cnx, Error):
+        return cnx
+
+    params = {
+        "guildId": guild_id,
+        "coin": Claimable.Coin.value,
+        "clam": Claimable.Clam.value
+    }
+
+    q_get_spawn_states = ("SELECT %(coin)s AS Claimable, LastCaught, Current, CurrentChannelId "
+                          "FROM GUILD_COINS "
+                          "WHERE GuildId = %(guildId)s "
+                          "UNION ALL "
+                          "SELECT %(clam)s AS Claimable, LastCaught, Current, CurrentChannelId "
+                          "FROM GUILD_CLAMS "
+                          "WHERE GuildId = %(guildId)s")
+
+    response: SpawnStates | Error
+    with cnx.cursor() as cursor:
+        try:
+            cursor.execute(q_get_spawn_states, params)
+            pre_response: Any = cursor.fetchall()
+
+            response = {
+                Claimable(x[0]): {
+                    "lastCaught": x[1],
+                    "current": x[2],
+                    "currentChannel": x[3]
+                } for x in pre_response
+            }
+            if len(response) != len(Claimable):
+                response = Error(ErrorType.InvalidArgument, f"Guild {guild_id} is missing spawn data.")
+        except mysql.connector.Error as error:
+            response = Error(ErrorType.MySqlException, error.msg)
+        finally:
+            cursor.close()
+            release_connection(cnx)
+
+    return response
+
+
+# Internal use only
+def insert_user(user_id: int, cnx: PartialConnection, cursor: TimedCursor) -> Error:
+    params = {
+        "userId": user_id,
+        "startingCoins": constants.STARTING_COINS
+    }
+
+    q_insert_user = ("INSERT "
+                     "INTO USERS (UserId, CoinsCaught)"
+                     "VALUES (%(userId)s, %(startingCoins)s)")
+
+    try:
+        cursor.execute(q_insert_user, params)
+        cnx.commit()
+        response = Error(ErrorType.NoError)
+    except mysql.connector.Error as error:
+        response = Error(ErrorType.MySqlException, error.msg)
+
+    return response
+
+
+def get_user_score(user_id: int, claimable: Claimable) -> int | Error:
+    """
+    Gets the individual user's score for a particular claimable.
+    :param user_id: The ID of the user.
+    :param claimable: The type of claimable.
+    :return: The score for the user.
+    """
+    cnx: PartialConnection = create_connection()
+    if isinstance(cnx, Error):
+        return cnx
+
+    params = {
+        "userId": user_id
+    }
+
+    q_select_user = ("SELECT 1 "
+                     "FROM USERS "
+                     "WHERE UserId = %(userId)s")
+
+    q_get_user_coin_score = ("SELECT CoinsCaught "
+                             "FROM USERS "
+                             "WHERE UserId = %(userId)s")
+
+    q_get_user_clam_score = ("SELECT ClamsCaught "
+                             "FROM USERS "
+                             "WHERE UserId = %(userId)s")
+
+    with cnx.cursor() as cursor:
+        try:
+            cursor.execute(q_select_user, params)
+            user_exists = cursor.fetchone()
+            if user_exists is None:
+                new_user_response = insert_user(user_id, cnx, cursor)
+                if new_user_response.Status == ErrorType.NoError:
+                    response = constants.STARTING_COINS if claimable == Claimable.Coin else 0
+                else:
+                    response = new_user_response
+            else:
+                if claimable == Claimable.Clam:
+                    cursor.execute(q_get_user_clam_score, params)
+                elif claimable == Claimable.Coin:
+                    cursor.execute(q_get_user_coin_score, params)
+
+                response = cursor.fetchone()[0]
+        except mysql.connector.Error as error:
+            response = Error(ErrorType.MySqlException, error.msg)
+        finally:
+            cursor.close()
+            release_connection(cnx)
+
+    return response
+
+
+def set_user_score(user_id: int, score: int, claimable: Claimable) -> Error:
+    """
+    Sets the user's score for a particular claimable.
+    :param user_id: The user's ID.
+    :param score: The score to set.
+    :param claimable: The type of claimable.
+    """
+    cnx: PartialConnection = create_connection()
+    if isinstance(cnx, Error):
+        return cnx
+
+    params = {
+        "userId": user_id,
+        "score": score
+    }
+
+    q_update_coin_score = ("UPDATE USERS "
+                           "SET CoinsCaught = %(score)s "
+                           "WHERE UserId = %(userId)s")
+
+    q_update_clam_score = ("UPDATE USERS "
+                           "SET ClamsCaught = %(score)s "
+                           "WHERE UserId = %(userId)s")
+
+    with cnx.cursor() as cursor:
+        try:
+            if claimable == Claimable.Clam:
+                cursor.execute(q_update_clam_score, params)
+            elif claimable == Claimable.Coin:
+                cursor.execute(q_update_coin_score, params)
+            cnx.commit()
+            response = Error(ErrorType.NoError)
+        except mysql.connector.Error as error:
+            response = Error(ErrorType.MySqlException, error.msg)
+        finally:
+            cursor.close()
+            release_connection(cnx)
+
+    return response
+
+
+def increment_user_score(guild_id: int, user_id: int, claimable: Claimable, delta: int) -> int | Error:
+    """
+    Adds to the user's score for a particular claimable, both overall and within the guild it was claimed in,
+    creating the user if they don't exist yet.
+    The additions happen in the database, so concurrent increments are never lost.
+    :param guild_id: The ID of the guild the claimable was claimed in.
+    :param user_id: The user's ID.
+    :param claimable: The type of claimable.
+    :param delta: The amount to add to the score. Must be more than 0.
+    :return: The user's new overall score.
+    """
+    if claimable not in (Claimable.Coin, Claimable.Clam):
+        return Error(ErrorType.InvalidArgument, "Invalid argument for claimable.")
+    if delta <= 0:
+        return Error(ErrorType.InvalidArgument, "Invalid argument for delta. Scores only go up.")
+
+    cnx: PartialConnection = create_connection()
+    if isinstance(cnx, Error):
+        return cnx
+
+    params = {
+        "guildId": guild_id,
+        "userId": user_id,
+        "startingCoins": constants.STARTING_COINS,
+        "delta": delta
+    }
+
+    # LAST_INSERT_ID(expr) hands the updated value back with the statement's result, saving a second SELECT
+    q_increment_coin_score = ("INSERT "
+                              "INTO USERS (UserId, CoinsCaught) "
+                              "VALUES (%(userId)s, %(startingCoins)s + %(delta)s) "
+                              "ON DUPLICATE KEY UPDATE CoinsCaught = LAST_INSERT_ID(CoinsCaught + %(delta)s)")
+
+    q_increment_clam_score = ("INSERT "
+                              "INTO USERS (UserId, CoinsCaught, ClamsCaught) "
+                              "VALUES (%(userId)s, %(startingCoins)s, %(delta)s) "
+                              "ON DUPLICATE KEY UPDATE ClamsCaught = LAST_INSERT_ID(ClamsCaught + %(delta)s)")
+
+    q_increment_guild_coin_score = ("INSERT "
+                                    "INTO GUILD_USER_SCORES (GuildId, UserId, CoinsCaught) "
+                                    "VALUES (%(guildId)s, %(userId)s, %(delta)s) "
+                                    "ON DUPLICATE KEY UPDATE CoinsCaught = CoinsCaught + %(delta)s")
+
+    q_increment_guild_clam_score = ("INSERT "
+                                    "INTO GUILD_USER_SCORES (GuildId, UserId, ClamsCaught) "
+                                    "VALUES (%(guildId)s, %(userId)s, %(delta)s) "
+                                    "ON DUPLICATE KEY UPDATE ClamsCaught = ClamsCaught + %(delta)s")
+
+    response: int | Error
+    with cnx.cursor() as cursor:
+        try:
+            if claimable == Claimable.Coin:
+                cursor.execute(q_increment_coin_score, params)
+            elif claimable == Claimable.Clam:
+                cursor.execute(q_increment_clam_score, params)
+
+            # One affected row means the user was inserted, and two that the existing row was updated. As delta is more
+            # than 0, an existing row always changes, so it's never anything else
+            if cursor.rowcount == 1:
+                response = constants.STARTING_COINS + delta if claimable == Claimable.Coin else delta
+            else:
+                response = cursor.lastrowid
+
+            if claimable == Claimable.Coin:
+                cursor.execute(q_increment_guild_coin_score, params)
+            elif claimable == Claimable.Clam:
+                cursor.execute(q_increment_guild_clam_score, params)
+            cnx.commit()
+        except mysql.connector.Error as error:
+            cnx.rollback()
+            response = Error(ErrorType.MySqlException, error.msg)
+        finally:
+            cursor.close()
+            release_connection(cnx)
+
+    return response
+
+
+def increment_user_scores(deltas: list[tuple[int, int, int, int]]) -> Error:
+    """
+    Adds to the scores of many users at once, both overall and per guild, creating any users that don't exist yet.
+    All rows are sent as batched upserts and committed together.
+    :param deltas: A list of (guild ID, user ID, coins to add, clams to add).
+    """
+    if not deltas:
+        return Error(ErrorType.NoError)
+
+    cnx: PartialConnection = create_connection()
+    if isinstance(cnx, Error):
+        return cnx
+
+    # New users start with STARTING_COINS on top of their delta, which has to be taken back off for existing users
+    q_increment_user_scores = ("INSERT "
+                               "INTO USERS (UserId, CoinsCaught, ClamsCaught) "
+                               "VALUES (%s, %s, %s) "
+                               "ON DUPLICATE KEY UPDATE "
+                               "CoinsCaught = CoinsCaught + VALUES(CoinsCaught) - {starting}, "
+                               "ClamsCaught = ClamsCaught + VALUES(ClamsCaught)"
+                               ).format(starting=int(constants.STARTING_COINS))
+
+    q_increment_guild_user_scores = ("INSERT "
+                                     "INTO GUILD_USER_SCORES (GuildId, UserId, CoinsCaught, ClamsCaught) "
+                                     "VALUES (%s, %s, %s, %s) "
+                                     "ON DUPLICATE KEY UPDATE "
+                                     "CoinsCaught = CoinsCaught + VALUES(CoinsCaught), "
+                                     "ClamsCaught = ClamsCaught + VALUES(ClamsCaught)")
+
+    user_totals: dict[int, list[int]] = {}
+    for _, user_id, coins, clams in deltas:
+        totals: list[int] = user_totals.setdefault(user_id, [0, 0])
+        totals[0] += coins
+        totals[1] += clams
+
+    user_rows = [(user_id, constants.STARTING_COINS + coins, clams) for user_id, (coins, clams) in user_totals.items()]
+
+    with cnx.cursor() as cursor:
+        try:
+            cursor.executemany(q_increment_user_scores, user_rows)
+            cursor.executemany(q_increment_guild_user_scores, deltas)
+            cnx.commit()
+            response = Error(ErrorType.NoError)
+        except mysql.connector.Error as error:
+            cnx.rollback()
+            response = Error(ErrorType.MySqlException, error.msg)
+        finally:
+            cursor.close()
+            release_connection(cnx)
+
+    return response
+
+
+def get_top_guild_scores(guild_id: int, claimable: Claimable, limit: int) -> list[tuple[int, int]] | Error:
+    """
+    Gets the top scores for a particular claimable within a guild.
+    :param guild_id: The ID of the guild.
+    :param claimable: The type of claimable.
+    :param limit: The maximum number of scores to return.
+    :return: A list of scores attached to user IDs, highest first.
+    """
+    cnx: PartialConnection = create_connection()
+    if isinstance(cnx, Error):
+        return cnx
+
+    params = {
+        "guildId": guild_id,
+        "limit": limit
+    }
+
+    q_get_guild_coin_scores = ("SELECT UserId, CoinsCaught "
+                               "FROM GUILD_USER_SCORES "
+                               "WHERE GuildId = %(guildId)s "
+                               "ORDER BY CoinsCaught DESC "
+                               "LIMIT %(limit)s")
+
+    q_get_guild_clam_scores = ("SELECT UserId, ClamsCaught "
+                               "FROM GUILD_USER_SCORES "
+                               "WHERE GuildId = %(guildId)s "
+                               "ORDER BY ClamsCaught DESC "
+                               "LIMIT %(limit)s")
+
+    with cnx.cursor() as cursor:
+        try:
+            if claimable == Claimable.Coin:
+                cursor.execute(q_get_guild_coin_scores, params)
+            elif claimable == Claimable.Clam:
+                cursor.execute(q_get_guild_clam_scores, params)
+            response = cursor.fetchall()
+        except mysql.connector.Error as error:
+            response = Error(ErrorType.MySqlException, error.msg)
+        finally:
+            cursor.close()
+            release_connection(cnx)
+
+    return response
+
+
+def get_unseeded_guilds() -> set[int] | Error:
+    """
+    Gets the guilds whose members' overall scores still need carrying over to GUILD_USER_SCORES. Only databases
+    created before GUILD_USER_SCORES have any, added to GUILD_SCORE_SEEDS by migrate.py.
+    :return: The IDs of the guilds.
+    """
+    cnx: PartialConnection = create_connection()
+    if isinstance(cnx, Error):
+        return cnx
+
+    q_get_unseeded_guilds = ("SELECT GuildId "
+                             "FROM GUILD_SCORE_SEEDS")
+
+    with cnx.cursor() as cursor:
+        try:
+            cursor.execute(q_get_unseeded_guilds)
+            response = {x[0] for x in cursor.fetchall()}
+        except mysql.connector.Error as error:
+            response = Error(ErrorType.MySqlException, error.msg)
+        finally:
+            cursor.close()
+            release_connection(cnx)
+
+    return response
+
+
+def seed_guild_scores(guild_id: int, user_ids: list[int]) -> Error:
+    """
+    Carries a guild's members' overall scores over to their scores within the guild, once. Each member's score in the
+    guild becomes their overall score, as the leaderboard showed before it was per guild, unless it's already higher.
+    Does nothing if the guild has already been seeded, such as by another process.
+    :param guild_id: The ID of the guild.
+    :param user_ids: The IDs of the guild's members.
+    """
+    cnx: PartialConnection = create_connection()
+    if isinstance(cnx, Error):
+        return cnx
+
+    # Deleted first, so the row stays locked until this commits and a second process seeding the guild finds it gone
+    q_remove_guild_seed = ("DELETE FROM GUILD_SCORE_SEEDS "
+                           "WHERE GuildId = %s")
+
+    q_seed_guild_scores = ("INSERT "
+                           "INTO GUILD_USER_SCORES (GuildId, UserId, CoinsCaught, ClamsCaught) "
+                           "SELECT %%s, u.UserId, u.CoinsCaught, u.ClamsCaught "
+                           "FROM USERS u "
+                           "WHERE u.UserId IN (%s) "
+                           "ON DUPLICATE KEY UPDATE "
+                           "CoinsCaught = GREATEST(GUILD_USER_SCORES.CoinsCaught, u.CoinsCaught), "
+                           "ClamsCaught = GREATEST(GUILD_USER_SCORES.ClamsCaught, u.ClamsCaught)")
+
+    with cnx.cursor() as cursor:
+        try:
+            cursor.execute(q_remove_guild_seed, (guild_id,))
+            if cursor.rowcount:
+                for chunk in _chunks(user_ids):
+                    cursor.execute(q_seed_guild_scores % ','.join(['%s'] * len(chunk)), [guild_id, *chunk])
+            cnx.commit()
+            response = Error(ErrorType.NoError)
+        except mysql.connector.Error as error:
+            cnx.rollback()
+            response = Error(ErrorType.MySqlException, error.msg)
+        finally:
+            cursor.close()
+            release_connection(cnx)
+
+    return response
+
+
+def _legacy_channels(additional_data: list[str | None]) -> set[int]:
+    # Written as str() of a list of channel IDs, e.g. "[123, 456]"
+    return {int(x) for data in additional_data if data for x in data.strip("[]").split(",") if x.strip()}
+
+
+def get_user_moderation_info(user_id: int, guild_id: int, moderation_type: ModerationType) -> set[int] | None | Error:
+    """
+    Retrieves data from the MODERATION table about a user's particular restriction within a guild, along with the
+    channels it applies to.
+    :param user_id: The ID of the user.
+    :param guild_id: The ID of the guild.
+    :param moderation_type: The type of restriction.
+    :return: The IDs of the channels the restriction covers, or None if it doesn't exist.
+    """
+    cnx: PartialConnection = create_connection()
+    if isinstance(cnx, Error):
+        return cnx
+
+    params = {
+        "userId": user_id,
+        "guildId": guild_id,
+        "moderationType": moderation_type.value
+    }
+
+    q_get_user_moderation_info = ("SELECT m.AdditionalData, c.ChannelId "
+                                  "FROM MODERATION m "
+                                  "LEFT JOIN MODERATION_CHANNELS c "
+                                  "ON c.UserId = m.UserId "
+                                  "AND c.GuildId = m.GuildId "
+                                  "AND c.ModerationType = m.ModerationType "
+                                  "WHERE m.UserId = %(userId)s "
+                                  "AND m.GuildId = %(guildId)s "
+                                  "AND m.ModerationType = %(moderationType)s")
+
+    response: set[int] | None | Error
+    with cnx.cursor() as cursor:
+        try:
+            cursor.execute(q_get_user_moderation_info, params)
+            fetched: Any = cursor.fetchall()
+            if not fetched:
+                response = None
+            else:
+                # Restrictions from before MODERATION_CHANNELS kept their channels as a list in AdditionalData, and
+                # may have had more channels added to MODERATION_CHANNELS since
+                response = {x[1] for x in fetched if x[1] is not None} | _legacy_channels([x[0] for x in fetched])
+        except mysql.connector.Error as error:
+            response = Error(ErrorType.MySqlException, error.msg)
+        finally:
+            cursor.close()
+            release_connection(cnx)
+
+    return response
+
+
+def set_user_moderation_info(
+        user_id: int,
+        guild_id: int,
+        moderator_id: int,
+        moderation_type: ModerationType,
+        channel_ids: Iterable[int] | None,
+        expiry: datetime | None = None) -> Error:
+    """
+    Adds moderation data to the MODERATION table for a user in a guild for a particular restriction.
+    :param user_id: The ID of the user having a moderation applied.
+    :param guild_id: The ID of the guild.
+    :param moderator_id: The ID of the moderator executing the command.
+    :param moderation_type: The type of restriction.
+    :param channel_ids: The IDs of the channels the restriction was applied to, if any.
+    :param expiry: When the restriction should be lifted, or None if it lasts until removed.
+    """
+    cnx: PartialConnection = create_connection()
+    if isinstance(cnx, Error):
+        return cnx
+
+    params = {
+        "userId": user_id,
+        "guildId": guild_id,
+        "moderatorId": moderator_id,
+        "moderationType": moderation_type.value,
+        "expiry": expiry
+    }
+
+    q_set_user_moderation_info = ("INSERT INTO "
+                                  "MODERATION (UserId, GuildId, ModeratorId, ModerationType, Expiry) "
+                                  "VALUES (%(userId)s, %(guildId)s, %(moderatorId)s, %(moderationType)s, %(expiry)s)")
+
+    q_add_moderation_channels = ("INSERT INTO "
+                                 "MODERATION_CHANNELS (UserId, GuildId, ModerationType, ChannelId) "
+                                 "VALUES (%s, %s, %s, %s) "
+                                 "ON DUPLICATE KEY UPDATE ChannelId = ChannelId")
+
+    channel_rows = [(user_id, guild_id, moderation_type.value, channel_id) for channel_id in channel_ids or []]
+
+    with cnx.cursor() as cursor:
+        try:
+            cursor.execute(q_set_user_moderation_info, params)
+            if channel_rows:
+                cursor.executemany(q_add_moderation_channels, channel_rows)
+            cnx.commit()
+            response = Error(ErrorType.NoError)
+        except mysql.connector.Error as error:
+            cnx.rollback()
+            response = Error(ErrorType.MySqlException, error.msg)
+        finally:
+            cursor.close()
+            release_connection(cnx)
+
+    return response
+
+
+def set_moderation_expiry(user_id: int,
+                          guild_id: int,
+                          moderation_type: ModerationType,
+                          expiry: datetime | None) -> Error:
+    """
+    Changes when a user's existing restriction should be lifted.
+    :param user_id: The ID of the user.
+    :param guild_id: The ID of the guild.
+    :param moderation_type: The type of restriction.
+    :param expiry: When the restriction should be lifted, or None if it lasts until removed.
+    """
+    cnx: PartialConnection = create_connection()
+    if isinstance(cnx, Error):
+        return cnx
+
+    params = {
+        "userId": user_id,
+        "guildId": guild_id,
+        "moderationType": moderation_type.value,
+        "expiry": expiry
+    }
+
+    q_set_moderation_expiry = ("UPDATE MODERATION "
+                               "SET Expiry = %(expiry)s "
+                               "WHERE UserId = %(userId)s "
+                               "AND GuildId = %(guildId)s "
+                               "AND ModerationType = %(moderationType)s")
+
+    with cnx.cursor() as cursor:
+        try:
+            cursor.execute(q_set_moderation_expiry, params)
+            cnx.commit()
+            response = Error(ErrorType.NoError)
+        except mysql.connector.Error as error:
+            response = Error(ErrorType.MySqlException, error.msg)
+        finally:
+            cursor.close()
+            release_connection(cnx)
+
+    return response
+
+
+def get_pending_expiries(moderation_type: ModerationType) -> list[tuple[int, int, datetime]] | Error:
+    """
+    Retrieves every restriction of a particular type that is due to be lifted at some point.
+    :param moderation_type: The type of restriction.
+    :return: A list of (guild ID, user ID, expiry), soonest first.
+    """
+    cnx: PartialConnection = create_connection()
+    if isinstance(cnx, Error):
+        return cnx
+
+    params = {
+        "moderationType": moderation_type.value
+    }
+
+    # Served by IX_MODERATION_Expiry, so only restrictions with an expiry are read
+    q_get_pending_expiries = ("SELECT GuildId, UserId, MIN(Expiry) AS NextExpiry "
+                              "FROM MODERATION "
+                              "WHERE ModerationType = %(moderationType)s "
+                              "AND Expiry IS NOT NULL "
+                              "GROUP BY GuildId, UserId "
+                              "ORDER BY NextExpiry")
+
+    with cnx.cursor() as cursor:
+        try:
+            cursor.execute(q_get_pending_expiries, params)
+            response = [(x[0], x[1], x[2]) for x in cursor.fetchall()]
+        except mysql.connector.Error as error:
+            response = Error(ErrorType.MySqlException, error.msg)
+        finally:
+            cursor.close()
+            release_connection(cnx)
+
+    return response
+
+
+def add_moderation_channels(user_id: int,
+                            guild_id: int,
+                            moderation_type: ModerationType,
+                            channel_ids: Iterable[int]) -> Error:
+    """
+    Records more channels that a user's existing restriction has been applied to.
+    :param user_id: The ID of the user.
+    :param guild_id: The ID of the guild.
+    :param moderation_type: The type of restriction.
+    :param channel_ids: The IDs of the channels.
+    """
+    channel_rows = [(user_id, guild_id, moderation_type.value, channel_id) for channel_id in channel_ids]
+    if not channel_rows:
+        return Error(ErrorType.NoError)
+
+    cnx: PartialConnection = create_connection()
+    if isinstance(cnx, Error):
+        return cnx
+
+    q_add_moderation_channels = ("INSERT INTO "
+                                 "MODERATION_CHANNELS (UserId, GuildId, ModerationType, ChannelId) "
+                                 "VALUES (%s, %s, %s, %s) "
+                                 "ON DUPLICATE KEY UPDATE ChannelId = ChannelId")
+
+    with cnx.cursor() as cursor:
+        try:
+            cursor.executemany(q_add_moderation_channels, channel_rows)
+            cnx.commit()
+            response = Error(ErrorType.NoError)
+        except mysql.connector.Error as error:
+            cnx.rollback()
+            response = Error(ErrorType.MySqlException, error.msg)
+        finally:
+            cursor.close()
+            release_connection(cnx)
+
+    return response
+
+
+def remove_moderation_channels(user_id: int,
+                               guild_id: int,
+                               moderation_type: ModerationType,
+                               channel_ids: Iterable[int]) -> Error:
+    """
+    Removes channels from a user's restriction, leaving the restriction itself in place.
+    :param user_id: The ID of the user.
+    :param guild_id: The ID of the guild.
+    :param moderation_type: The type of restriction.
+    :param channel_ids: The IDs of the channels.
+    """
+    channel_ids = list(channel_ids)
+    if not channel_ids:
+        return Error(ErrorType.NoError)
+
+    cnx: PartialConnection = create_connection()
+    if isinstance(cnx, Error):
+        return cnx
+
+    q_remove_moderation_channels = ("DELETE FROM MODERATION_CHANNELS "
+                                    "WHERE UserId = %%s "
+                                    "AND GuildId = %%s "
+                                    "AND ModerationType = %%s "
+                                    "AND ChannelId IN (%s)")
+
+    with cnx.cursor() as cursor:
+        try:
+            for chunk in _chunks(channel_ids):
+                cursor.execute(q_remove_moderation_channels % ','.join(['%s'] * len(chunk)),
+                               [user_id, guild_id, moderation_type.value, *chunk])
+            cnx.commit()
+            response = Error(ErrorType.NoError)
+        except mysql.connector.Error as error:
+            cnx.rollback()
+            response = Error(ErrorType.MySqlException, error.msg)
+        finally:
+            cursor.close()
+            release_connection(cnx)
+
+    return response
+
+
+def remove_user_moderation_info(user_id: int, guild_id: int, moderation_type: ModerationType) -> Error:
+    """
+    Removes a particular restriction for a user in a guild, along with its channels. Any duplicate entries with
+    different moderator IDs are also removed.
+    :param user_id: The ID of the user.
+    :param guild_id: The ID of the guild.
+    :param moderation_type: The type of restriction.
+    """
+    cnx: PartialConnection = create_connection()
+    if isinstance(cnx, Error):
+        return cnx
+
+    params = {
+        "userId": user_id,
+        "guildId": guild_id,
+        "moderationType": moderation_type.value
+    }
+
+    q_remove_user_moderation_info = ("DELETE FROM MODERATION "
+                                     "WHERE UserId = %(userId)s "
+                                     "AND GuildId = %(guildId)s "
+                                     "AND ModerationType = %(moderationType)s")
+
+    q_remove_moderation_channels = ("DELETE FROM MODERATION_CHANNELS "
+                                    "WHERE UserId = %(userId)s "
+                                    "AND GuildId = %(guildId)s "
+                                    "AND ModerationType = %(moderationType)s")
+
+    with cnx.cursor() as cursor:
+        try:
+            cursor.execute(q_remove_moderation_channels, params)
+            cursor.execute(q_remove_user_moderation_info, params)
+            cnx.commit()
+            response = Error(ErrorType.NoError)
+        except mysql.connector.Error as error:
+            cnx.rollback()
+            response = Error(ErrorType.MySqlException, error.msg)
+        finally:
+            cursor.close()
+            release_connection(cnx)
+
+    return response
+
+
+def get_last_reactor(guild_id: int) -> int | None | Error:
+    """
+    Gets the ID of the last user to react to a message in a guild.
+    :param guild_id: The ID of the guild.
+    :return: The ID of the user.
+    """
+    cnx: PartialConnection = create_connection()
+    if isinstance(cnx, Error):
+        return cnx
+
+    params = {
+        "guildId": guild_id
+    }
+
+    q_get_last_reactor = ("SELECT LastReactor "
+                          "FROM GUILDS "
+                          "WHERE GuildId = %(guildId)s")
+
+    with cnx.cursor() as cursor:
+        try:
+            cursor.execute(q_get_last_reactor, params)
+            fetched = cursor.fetchone()
+            response = fetched[0] if fetched is not None else None
+        except mysql.connector.Error as error:
+            response = Error(ErrorType.MySqlException, error.msg)
+        finally:
+            cursor.close()
+            release_connection(cnx)
+
+    return response
+
+
+def set_last_reactor(guild_id: int, user_id: int) -> Error:
+    """
+    Sets the ID of the last user to react to a message in a guild.
+    :param guild_id: The ID of the guild.
+    :param user_id: The ID of the user.
+    """
+    cnx: PartialConnection = create_connection()
+    if isinstance(cnx, Error):
+        return cnx
+
+    params = {
+        "guildId": guild_id,
+        "userId": user_id
+    }
+
+    q_set_last_reactor = ("UPDATE GUILDS "
+                          "SET LastReactor = %(userId)s "
+                          "WHERE GuildId = %(guildId)s")
+
+    with cnx.cursor() as cursor:
+        try:
+            cursor.execute(q_set_last_reactor, params)
+            cnx.commit()
+            response = Error(ErrorType.NoError)
+        except mysql.connector.Error as error:
+            response = Error(ErrorType.MySqlException, error.msg)
+        finally:
+            cursor.close()
+            release_connection(cnx)
+
+    return response
+
+
+def set_last_reactors(last_reactors: list[tuple[int, int]]) -> Error:
+    """
+    Sets the ID of the last user to react to a message for many guilds at once, in one transaction.
+    :param last_reactors: A list of (guild ID, user ID).
+    """
+    if not last_reactors:
+        return Error(ErrorType.NoError)
+
+    cnx: PartialConnection = create_connection()
+    if isinstance(cnx, Error):
+        return cnx
+
+    q_set_last_reactor = ("UPDATE GUILDS "
+                          "SET LastReactor = %(userId)s "
+                          "WHERE GuildId = %(guildId)s")
+
+    params = [{"guildId": guild_id, "userId": user_id} for guild_id, user_id in last_reactors]
+
+    with cnx.cursor() as cursor:
+        try:
+            cursor.executemany(q_set_last_reactor, params)
+            cnx.commit()
+            response = Error(ErrorType.NoError)
+        except mysql.connector.Error as error:
+            cnx.rollback()
+            response = Error(ErrorType.MySqlException, error.msg)
+        finally:
+            cursor.close()
+            release_connection(cnx)
+
+    return response
+
+
+def get_guild_content(guild_id: int) -> GuildContent | Error:
+    """
+    Retrieves the content a guild has added, and the types of built-in content it has switched off.
+    :param guild_id: The ID of the guild.
+    :return: The guild's content.
+    """
+    cnx: PartialConnection = create_connection()
+    if isinstance(cnx, Error):
+        return cnx
+
+    params = {
+        "guildId": guild_id
+    }
+
+    # Served by IX_GUILD_CONTENT_Guild
+    q_get_guild_content = ("SELECT ContentId, ContentType, ContentKey, Value "
+                           "FROM GUILD_CONTENT "
+                           "WHERE GuildId = %(guildId)s "
+                           "ORDER BY ContentId")
+
+    q_get_hidden_defaults = ("SELECT ContentType "
+                             "FROM GUILD_HIDDEN_DEFAULTS "
+                             "WHERE GuildId = %(guildId)s")
+
+    response: GuildContent | Error
+    with cnx.cursor() as cursor:
+        try:
+            cursor.execute(q_get_guild_content, params)
+            entries: list[ContentEntry] = [
+                {"id": x[0], "type": ContentType(x[1]), "key": x[2], "value": x[3]} for x in cursor.fetchall()
+            ]
+            cursor.execute(q_get_hidden_defaults, params)
+            response = {"entries": entries, "hiddenDefaults": {ContentType(x[0]) for x in cursor.fetchall()}}
+        except mysql.connector.Error as error:
+            response = Error(ErrorType.MySqlException, error.msg)
+        finally:
+            cursor.close()
+            release_connection(cnx)
+
+    return response
+
+
+def add_guild_content(guild_id: int, content_type: ContentType, key: str | None, value: str) -> int | Error:
+    """
+    Adds a piece of content to a guild.
+    :param guild_id: The ID of the guild.
+    :param content_type: The type of content.
+    :param key: The reaction for a reaction image, or the words for a trigger. None for every other type.
+    :param value: The content itself.
+    :return: The ID of the new content.
+    """
+    cnx: PartialConnection = create_connection()
+    if isinstance(cnx, Error):
+        return cnx
+
+    params = {
+        "guildId": guild_id,
+        "contentType": content_type.value,
+        "key": key,
+        "value": value
+    }
+
+    q_add_guild_content = ("INSERT INTO "
+                           "GUILD_CONTENT (GuildId, ContentType, ContentKey, Value) "
+                           "VALUES (%(guildId)s, %(contentType)s, %(key)s, %(value)s)")
+
+    response: int | Error
+    with cnx.cursor() as cursor:
+        try:
+            cursor.execute(q_add_guild_content, params)
+            response = cursor.lastrowid
+            cnx.commit()
+        except mysql.connector.Error as error:
+            cnx.rollback()
+            response = Error(ErrorType.MySqlException, error.msg)
+        finally:
+            cursor.close()
+            release_connection(cnx)
+
+    return response
+
+
+def remove_guild_content(guild_id: int, content_id: int) -> bool | Error:
+    """
+    Removes a piece of content from a guild.
+    :param guild_id: The ID of the guild.
+    :param content_id: The ID of the content.
+    :return: Whether the guild had the content to remove.
+    """
+    cnx: PartialConnection = create_connection()
+    if isinstance(cnx, Error):
+        return cnx
+
+    params = {
+        "contentId": content_id,
+        "guildId": guild_id
+    }
+
+    q_remove_guild_content = ("DELETE FROM GUILD_CONTENT "
+                              "WHERE ContentId = %(contentId)s "
+                              "AND GuildId = %(guildId)s")
+
+    response: bool | Error
+    with cnx.cursor() as cursor:
+        try:
+            cursor.execute(q_remove_guild_content, params)
+            response = cursor.rowcount > 0
+            cnx.commit()
+        except mysql.connector.Error as error:
+            cnx.rollback()
+            response = Error(ErrorType.MySqlException, error.msg)
+        finally:
+            cursor.close()
+            release_connection(cnx)
+
+    return response
+
+
+def set_guild_content_defaults(guild_id: int, content_type: ContentType, enabled: bool) -> Error:
+    """
+    Switches the built-in content of a particular type on or off for a guild.
+    :param guild_id: The ID of the guild.
+    :param content_type: The type of content.
+    :param enabled: Whether the guild should get the built-in content of this type.
+    """
+    cnx: PartialConnection = create_connection()
+    if isinstance(cnx, Error):
+        return cnx
+
+    params = {
+        "guildId": guild_id,
+        "contentType": content_type.value
+    }
+
+    q_show_defaults = ("DELETE FROM GUILD_HIDDEN_DEFAULTS "
+                       "WHERE GuildId = %(guildId)s "
+                       "AND ContentType = %(contentType)s")
+
+    q_hide_defaults = ("INSERT INTO "
+                       "GUILD_HIDDEN_DEFAULTS (GuildId, ContentType) "
+                       "VALUES (%(guildId)s, %(contentType)s) "
+                       "ON DUPLICATE KEY UPDATE ContentType = ContentType")
+
+    with cnx.cursor() as cursor:
+        try:
+            cursor.execute(q_show_defaults if enabled else q_hide_defaults, params)
+            cnx.commit()
+            response = Error(ErrorType.NoError)
+        except mysql.connector.Error as error:
+            cnx.rollback()
+            response = Error(ErrorType.MySqlException, error.msg)
+        finally:
+            cursor.close()
+            release_connection(cnx)
+
+    return response
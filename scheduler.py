@@ -0,0 +1,87 @@
+"""scheduler.py"""
+
+# IMPORTS #
+import asyncio
+from datetime import datetime, timezone
+import heapq
+import logging
+from typing import Awaitable, Callable
+
+ExpiryKey = tuple[int, int]
+ExpiryCallback = Callable[[int, int], Awaitable[None]]
+
+
+class ExpiryScheduler:
+    """
+    Runs a callback for each (guild ID, user ID) once its expiry time passes. Expiries must be timezone-aware.
+    Expiries are kept in a min-heap, and the scheduler sleeps until the earliest one is due, only waking early when
+    something due even sooner is added. Cancelled or rescheduled entries are left in the heap and skipped when
+    they reach the top.
+    """
+
+    def __init__(self, callback: ExpiryCallback):
+        self._callback: ExpiryCallback = callback
+        self._heap: list[tuple[datetime, ExpiryKey]] = []
+        # The live expiry for each key. Anything in the heap that doesn't match is stale
+        self._expiries: dict[ExpiryKey, datetime] = {}
+        self._changed: asyncio.Event = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        # Callbacks still running, kept so they aren't garbage collected part way through
+        self._firing: set[asyncio.Task] = set()
+
+    def __len__(self) -> int:
+        return len(self._expiries)
+
+    def schedule(self, guild_id: int, user_id: int, expiry: datetime):
+        key: ExpiryKey = (guild_id, user_id)
+        self._expiries[key] = expiry
+
+        # Only the front of the heap decides how long to sleep for
+        if not self._heap or expiry < self._heap[0][0]:
+            self._changed.set()
+        heapq.heappush(self._heap, (expiry, key))
+
+    def cancel(self, guild_id: int, user_id: int):
+        self._expiries.pop((guild_id, user_id), None)
+
+    async def _run(self):
+        while True:
+            if not self._heap:
+                await self._changed.wait()
+                self._changed.clear()
+                continue
+
+            expiry, key = self._heap[0]
+            delay: float = (expiry - datetime.now(timezone.utc)).total_seconds()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._changed.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                self._changed.clear()
+                continue
+
+            heapq.heappop(self._heap)
+            if self._expiries.get(key) != expiry:
+                continue
+
+            del self._expiries[key]
+            # Run separately so a slow callback doesn't hold up anything due just after it
+            task: asyncio.Task = asyncio.create_task(self._fire(*key))
+            self._firing.add(task)
+            task.add_done_callback(self._firing.discard)
+
+    async def _fire(self, guild_id: int, user_id: int):
+        try:
+            await self._callback(guild_id, user_id)
+        except Exception:
+            logging.exception(f"Expiry failed for user {user_id} in guild {guild_id}.")
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
@@ -0,0 +1,96 @@
+-- Database schema used by mysql_repository.py. sqlite_repository.py creates the same tables for itself.
+-- Anything added here must also be added to migrate.py, for databases created before it.
+
+CREATE TABLE GUILDS (
+    GuildId BIGINT NOT NULL,
+    Active TINYINT(1) NOT NULL DEFAULT 1,
+    Changelog INT NOT NULL DEFAULT 0,
+    LastReactor BIGINT NULL,
+    -- Role given to muted users when MUTEMODE is "role"
+    JailRoleId BIGINT NULL,
+    PRIMARY KEY (GuildId)
+);
+
+CREATE TABLE GUILD_COINS (
+    GuildId BIGINT NOT NULL,
+    LastCaught DATETIME NOT NULL,
+    Current BIGINT NULL,
+    CurrentChannelId BIGINT NULL,
+    PRIMARY KEY (GuildId)
+);
+
+CREATE TABLE GUILD_CLAMS (
+    GuildId BIGINT NOT NULL,
+    LastCaught DATETIME NOT NULL,
+    Current BIGINT NULL,
+    CurrentChannelId BIGINT NULL,
+    PRIMARY KEY (GuildId)
+);
+
+-- Overall scores, shown by the coins and clams commands
+CREATE TABLE USERS (
+    UserId BIGINT NOT NULL,
+    CoinsCaught INT NOT NULL DEFAULT 0,
+    ClamsCaught INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (UserId)
+);
+
+-- Scores earned within each guild, ranked by the leaderboards. The descending indexes let the top of a guild's
+-- leaderboard be read straight off the index, however many members the guild has.
+CREATE TABLE GUILD_USER_SCORES (
+    GuildId BIGINT NOT NULL,
+    UserId BIGINT NOT NULL,
+    CoinsCaught INT NOT NULL DEFAULT 0,
+    ClamsCaught INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (GuildId, UserId),
+    INDEX IX_GUILD_USER_SCORES_Coins (GuildId, CoinsCaught DESC),
+    INDEX IX_GUILD_USER_SCORES_Clams (GuildId, ClamsCaught DESC)
+);
+
+-- Guilds whose members' overall scores are still to be carried over to GUILD_USER_SCORES, so their leaderboards
+-- don't start from nothing. Filled by migrate.py for databases from before GUILD_USER_SCORES, and empty otherwise.
+CREATE TABLE GUILD_SCORE_SEEDS (
+    GuildId BIGINT NOT NULL,
+    PRIMARY KEY (GuildId)
+);
+
+CREATE TABLE MODERATION (
+    UserId BIGINT NOT NULL,
+    GuildId BIGINT NOT NULL,
+    ModeratorId BIGINT NOT NULL,
+    ModerationType INT NOT NULL,
+    -- Only used by restrictions recorded before MODERATION_CHANNELS
+    AdditionalData TEXT NULL,
+    -- When the restriction is lifted automatically, if ever
+    Expiry DATETIME NULL,
+    INDEX IX_MODERATION_User (UserId, GuildId, ModerationType),
+    INDEX IX_MODERATION_Expiry (ModerationType, Expiry)
+);
+
+-- The channels each restriction in MODERATION was applied to
+CREATE TABLE MODERATION_CHANNELS (
+    UserId BIGINT NOT NULL,
+    GuildId BIGINT NOT NULL,
+    ModerationType INT NOT NULL,
+    ChannelId BIGINT NOT NULL,
+    PRIMARY KEY (UserId, GuildId, ModerationType, ChannelId)
+);
+
+-- Content guilds have added for themselves (see contentpacks.py)
+CREATE TABLE GUILD_CONTENT (
+    ContentId BIGINT NOT NULL AUTO_INCREMENT,
+    GuildId BIGINT NOT NULL,
+    ContentType INT NOT NULL,
+    -- The reaction for a reaction image, or the words for a trigger
+    ContentKey VARCHAR(100) NULL,
+    Value TEXT NOT NULL,
+    PRIMARY KEY (ContentId),
+    INDEX IX_GUILD_CONTENT_Guild (GuildId)
+);
+
+-- Types of content each guild has switched the built-in content (from constants.py) off for
+CREATE TABLE GUILD_HIDDEN_DEFAULTS (
+    GuildId BIGINT NOT NULL,
+    ContentType INT NOT NULL,
+    PRIMARY KEY (GuildId, ContentType)
+);
@@ -0,0 +1,1322 @@
+"""sqlite_repository.py"""
+from datetime import datetime
+import sqlite3
+from threading import Lock, local
+import time
+from typing import Any, Iterable
+
+import config
+import constants
+
+from enums import Claimable, ContentType, ErrorType, ModerationType
+from classes import Error, PoolStats
+
+from instrumentation import TimedConnection, TimedCursor, add_phase
+
+from datatypes import Guilds, Guild, CurrentClaimable, SpawnStates, ContentEntry, GuildContent
+
+"""
+    The repository functions, backed by a local SQLite file instead of a MySQL server.
+    Each thread that calls in gets its own connection, kept open for as long as the thread lives. The file is put in
+    WAL mode, so reads carry on while another thread is writing.
+"""
+
+# The tables in schema.sql, in SQLite's dialect
+_SCHEMA: str = """
+CREATE TABLE IF NOT EXISTS GUILDS (
+    GuildId INTEGER NOT NULL PRIMARY KEY,
+    Active INTEGER NOT NULL DEFAULT 1,
+    Changelog INTEGER NOT NULL DEFAULT 0,
+    LastReactor INTEGER NULL,
+    JailRoleId INTEGER NULL
+);
+
+CREATE TABLE IF NOT EXISTS GUILD_COINS (
+    GuildId INTEGER NOT NULL PRIMARY KEY,
+    LastCaught DATETIME NOT NULL,
+    Current INTEGER NULL,
+    CurrentChannelId INTEGER NULL
+);
+
+CREATE TABLE IF NOT EXISTS GUILD_CLAMS (
+    GuildId INTEGER NOT NULL PRIMARY KEY,
+    LastCaught DATETIME NOT NULL,
+    Current INTEGER NULL,
+    CurrentChannelId INTEGER NULL
+);
+
+CREATE TABLE IF NOT EXISTS USERS (
+    UserId INTEGER NOT NULL PRIMARY KEY,
+    CoinsCaught INTEGER NOT NULL DEFAULT 0,
+    ClamsCaught INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS GUILD_USER_SCORES (
+    GuildId INTEGER NOT NULL,
+    UserId INTEGER NOT NULL,
+    CoinsCaught INTEGER NOT NULL DEFAULT 0,
+    ClamsCaught INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (GuildId, UserId)
+);
+CREATE INDEX IF NOT EXISTS IX_GUILD_USER_SCORES_Coins ON GUILD_USER_SCORES (GuildId, CoinsCaught DESC);
+CREATE INDEX IF NOT EXISTS IX_GUILD_USER_SCORES_Clams ON GUILD_USER_SCORES (GuildId, ClamsCaught DESC);
+
+CREATE TABLE IF NOT EXISTS GUILD_SCORE_SEEDS (
+    GuildId INTEGER NOT NULL PRIMARY KEY
+);
+
+CREATE TABLE IF NOT EXISTS MODERATION (
+    UserId INTEGER NOT NULL,
+    GuildId INTEGER NOT NULL,
+    ModeratorId INTEGER NOT NULL,
+    ModerationType INTEGER NOT NULL,
+    AdditionalData TEXT NULL,
+    Expiry DATETIME NULL
+);
+CREATE INDEX IF NOT EXISTS IX_MODERATION_User ON MODERATION (UserId, GuildId, ModerationType);
+CREATE INDEX IF NOT EXISTS IX_MODERATION_Expiry ON MODERATION (ModerationType, Expiry);
+
+CREATE TABLE IF NOT EXISTS MODERATION_CHANNELS (
+    UserId INTEGER NOT NULL,
+    GuildId INTEGER NOT NULL,
+    ModerationType INTEGER NOT NULL,
+    ChannelId INTEGER NOT NULL,
+    PRIMARY KEY (UserId, GuildId, ModerationType, ChannelId)
+);
+
+CREATE TABLE IF NOT EXISTS GUILD_CONTENT (
+    ContentId INTEGER NOT NULL PRIMARY KEY,
+    GuildId INTEGER NOT NULL,
+    ContentType INTEGER NOT NULL,
+    ContentKey TEXT NULL,
+    Value TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS IX_GUILD_CONTENT_Guild ON GUILD_CONTENT (GuildId);
+
+CREATE TABLE IF NOT EXISTS GUILD_HIDDEN_DEFAULTS (
+    GuildId INTEGER NOT NULL,
+    ContentType INTEGER NOT NULL,
+    PRIMARY KEY (GuildId, ContentType)
+);
+"""
+
+# Datetimes are stored as ISO 8601 text, and turned back into datetimes for any column declared as DATETIME
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(" "))
+sqlite3.register_converter("DATETIME", lambda value: datetime.fromisoformat(value.decode()))
+
+_connections: local = local()
+_schema_lock: Lock = Lock()
+_schema_created: bool = False
+
+POOL_STATS: PoolStats = PoolStats()
+
+
+def _create_schema(cnx: sqlite3.Connection):
+    global _schema_created
+    with _schema_lock:
+        if not _schema_created:
+            cnx.executescript(_SCHEMA)
+            # Older files were created without AdditionalData, which holds mutes copied over from a MySQL database
+            columns: set[str] = {row[1] for row in cnx.execute("PRAGMA table_info(MODERATION)")}
+            if "AdditionalData" not in columns:
+                cnx.execute("ALTER TABLE MODERATION ADD COLUMN AdditionalData TEXT NULL")
+            _schema_created = True
+
+
+def create_connection() -> TimedConnection | Error:
+    """
+    Gets this thread's connection to the database file, opening it on first use. Must be called at the start of every
+    other function in this file, with the connection handed back through release_connection once finished.
+    :return: A connection object.
+    """
+    start: float = time.perf_counter()
+    cnx: sqlite3.Connection | None = getattr(_connections, "cnx", None)
+    if cnx is None:
+        try:
+            cnx = sqlite3.connect(config.DB_PATH,
+                                  timeout=config.DB_POOL_TIMEOUT,
+                                  detect_types=sqlite3.PARSE_DECLTYPES)
+            cnx.execute("PRAGMA journal_mode=WAL")
+            cnx.execute("PRAGMA synchronous=NORMAL")
+            _create_schema(cnx)
+        except sqlite3.Error as error:
+            add_phase("acquire", time.perf_counter() - start)
+            return Error(ErrorType.SqliteException, f"Failed to open database. {error}")
+        _connections.cnx = cnx
+
+    POOL_STATS.record_borrow(time.perf_counter() - start)
+    add_phase("acquire", time.perf_counter() - start)
+    # Wrapped so statements and fetches are timed for the query stats
+    return TimedConnection(cnx)
+
+
+def release_connection(cnx: TimedConnection):
+    """
+    Hands back a connection from create_connection. The connection stays open for the thread's next call, so this
+    only ends any transaction left open.
+    :param cnx: The connection to hand back.
+    """
+    try:
+        if cnx.in_transaction:
+            cnx.rollback()
+    finally:
+        POOL_STATS.record_release()
+
+
+def get_pool_stats() -> dict[str, int | float]:
+    """
+    Gets the current connection counters.
+    :return: Borrow counts and wait times (in seconds) for the connections.
+    """
+    return POOL_STATS.snapshot()
+
+
+def ping() -> Error:
+    """
+    Checks the database file can be read, by running a trivial query on it.
+    """
+    cnx: TimedConnection | Error = create_connection()
+    if isinstance(cnx, Error):
+        return cnx
+
+    cursor: TimedCursor = cnx.cursor()
+    try:
+        cursor.execute("SELECT 1")
+        cursor.fetchall()
+        response = Error(ErrorType.NoError)
+    except sqlite3.Error as error:
+        response = Error(ErrorType.SqliteException, str(error))
+    finally:
+        cursor.close()
+        release_connection(cnx)
+
+    return response
+
+
+def _chunks(items: list[Any], size: int = 1000) -> list[list[Any]]:
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def _spawn_table(claimable: Claimable) -> str | None:
+    if claimable == Claimable.Coin:
+        return "GUILD_COINS"
+    if claimable == Claimable.Clam:
+        return "GUILD_CLAMS"
+    return None
+
+
+def _score_column(claimable: Claimable) -> str | None:
+    if claimable == Claimable.Coin:
+        return "CoinsCaught"
+    if claimable == Claimable.Clam:
+        return "ClamsCaught"
+    return None
+
+
+def _today() -> datetime:
+    # Matches MySQL's CURRENT_DATE(), which new guilds start with as their last caught time
+    return datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _to_datetime(value: datetime | str) -> datetime:
+    # Columns read through an expression (such as MIN()) lose their declared type, and come back as plain text
+    return value if isinstance(value, datetime) else datetime.fromisoformat(value)
+
+
+def _guild_from_row(row: Any) -> Guild:
+    return {
+        "id": row[0],
+        "active": bool(row[1]),
+        "changelog": row[2],
+        "lastReactor": row[3],
+        "jailRole": row[4]
+    }
+
+
+def get_all_guilds() -> Guilds | Error:
+    """
+    Retrieves all current guild IDs.
+    :return: A list of guild IDs.
+    """
+    cnx: TimedConnection | Error = create_connection()
+    if isinstance(cnx, Error):
+        return cnx
+
+    q_select_all_guild_ids = ("SELECT GuildId, Active, Changelog, LastReactor, JailRoleId "
+                              "FROM GUILDS")
+
+    response: Guilds | Error
+    cursor: TimedCursor = cnx.cursor()
+    try:
+        cursor.execute(q_select_all_guild_ids)
+        response = [_guild_from_row(x) for x in cursor.fetchall()]
+    except sqlite3.Error as error:
+        response = Error(ErrorType.SqliteException, str(error))
+    finally:
+        cursor.close()
+        release_connection(cnx)
+
+    return response
+
+
+def get_guild(guild_id: int) -> Guild | None | Error:
+    """
+    Retrieves a single guild.
+    :param guild_id: The ID of the guild.
+    :return: The guild, or None if it isn't stored.
+    """
+    cnx: TimedConnection | Error = create_connection()
+    if isinstance(cnx, Error):
+        return cnx
+
+    q_select_guild = ("SELECT GuildId, Active, Changelog, LastReactor, JailRoleId "
+                      "FROM GUILDS "
+                      "WHERE GuildId = :guildId")
+
+    response: Guild | None | Error
+    cursor: TimedCursor = cnx.cursor()
+    try:
+        cursor.execute(q_select_guild, {"guildId": guild_id})
+        row: Any = cursor.fetchone()
+        response = _guild_from_row(row) if row is not None else None
+    except sqlite3.Error as error:
+        response = Error(ErrorType.SqliteException, str(error))
+    finally:
+        cursor.close()
+        release_connection(cnx)
+
+    return response
+
+
+def _execute(query: str, params: dict[str, Any] | list[Any]) -> Error:
+    # Runs a single write and commits it
+    cnx: TimedConnection | Error = create_connection()
+    if isinstance(cnx, Error):
+        return cnx
+
+    cursor: TimedCursor = cnx.cursor()
+    try:
+        cursor.execute(query, params)
+        cnx.commit()
+        response = Error(ErrorType.NoError)
+    except sqlite3.Error as error:
+        response = Error(ErrorType.SqliteException, str(error))
+    finally:
+        cursor.close()
+        release_connection(cnx)
+
+    return response
+
+
+def set_active_guild(guild_id: int) -> Error:
+    """
+    Sets a guild to active.
+    :param guild_id: The ID of the guild.
+    """
+    return _execute("UPDATE GUILDS SET Active = 1 WHERE GuildId = :guildId", {"guildId": guild_id})
+
+
+def set_inactive_guild(guild_id: int) -> Error:
+    """
+    Sets a guild to inactive.
+    :param guild_id: The ID of the guild.
+    """
+    return _execute("UPDATE GUILDS SET Active = 0 WHERE GuildId = :guildId", {"guildId": guild_id})
+
+
+def add_guild(guild_id: int) -> Error:
+    """
+    Add a new guild to the database.
+    :param guild_id: The ID of the guild to add
+    """
+    return reconcile_guilds([guild_id], [])
+
+
+def reconcile_guilds(new_guild_ids: list[int], reactivated_guild_ids: list[int]) -> Error:
+    """
+    Brings the stored guilds in line with the guilds the bot is in, in a single transaction.
+    :param new_guild_ids: The IDs of guilds to add. Any already stored, such as by another process, are left as they
+    are.
+    :param reactivated_guild_ids: The IDs of stored guilds to set back to active.
+    """
+    if not (new_guild_ids or reactivated_guild_ids):
+        return Error(ErrorType.NoError)
+
+    cnx: TimedConnection | Error = create_connection()
+    if isinstance(cnx, Error):
+        return cnx
+
+    q_insert_new_guilds = ("INSERT OR IGNORE "
+                           "INTO GUILDS (GuildId, Active) "
+                           "VALUES (?, 1)")
+
+    q_add_guild_ids_to_coins = ("INSERT OR IGNORE "
+                                "INTO GUILD_COINS (GuildId, LastCaught) "
+                                "VALUES (?, ?)")
+
+    q_add_guild_ids_to_clams = ("INSERT OR IGNORE "
+                                "INTO GUILD_CLAMS (GuildId, LastCaught) "
+                                "VALUES (?, ?)")
+
+    q_update_guilds_active = ("UPDATE GUILDS "
+                              "SET Active = 1 "
+                              "WHERE GuildId IN (%s)")
+
+    today: datetime = _today()
+    cursor: TimedCursor = cnx.cursor()
+    try:
+        if new_guild_ids:
+            cursor.executemany(q_insert_new_guilds, [(guild_id,) for guild_id in new_guild_ids])
+            cursor.executemany(q_add_guild_ids_to_coins, [(guild_id, today) for guild_id in new_guild_ids])
+            cursor.executemany(q_add_guild_ids_to_clams, [(guild_id, today) for guild_id in new_guild_ids])
+
+        for chunk in _chunks(reactivated_guild_ids):
+            cursor.execute(q_update_guilds_active % ','.join(['?'] * len(chunk)), chunk)
+
+        cnx.commit()
+        response = Error(ErrorType.NoError)
+    except sqlite3.Error as error:
+        cnx.rollback()
+        response = Error(ErrorType.SqliteException, str(error))
+    finally:
+        cursor.close()
+        release_connection(cnx)
+
+    return response
+
+
+def claim_changelog(guild_ids: list[int], version: int) -> list[int] | Error:
+    """
+    Moves guilds on to a changelog version, for those that haven't had it yet. SQLite lets one writer in at a time, so
+    when several processes claim the same guild at once, only one of them gets it.
+    :param guild_ids: The IDs of the guilds to claim.
+    :param version: The changelog index.
+    :return: The IDs of the guilds claimed by this call, which should be sent the changelog.
+    """
+    if not guild_ids:
+        return []
+
+    cnx: TimedConnection | Error = create_connection()
+    if isinstance(cnx, Error):
+        return cnx
+
+    q_claim_guilds_changelog = ("UPDATE GUILDS "
+                                "SET Changelog = ? "
+                                "WHERE GuildId IN (%s) AND COALESCE(Changelog, 0) < ? "
+                                "RETURNING GuildId")
+
+    cursor: TimedCursor = cnx.cursor()
+    try:
+        claimed: list[int] = []
+        for chunk in _chunks(guild_ids):
+            cursor.execute(q_claim_guilds_changelog % ','.join(['?'] * len(chunk)), [version, *chunk, version])
+            claimed.extend(row[0] for row in cursor.fetchall())
+
+        cnx.commit()
+        response = claimed
+    except sqlite3.Error as error:
+        cnx.rollback()
+        response = Error(ErrorType.SqliteException, str(error))
+    finally:
+        cursor.close()
+        release_connection(cnx)
+
+    return response
+
+
+def _select_one(query: str, params: dict[str, Any], missing: str) -> Any:
+    # Reads a single value, reporting a missing row as an invalid argument
+    cnx: TimedConnection | Error = create_connection()
+    if isinstance(cnx, Error):
+        return cnx
+
+    cursor: TimedCursor = cnx.cursor()
+    try:
+        cursor.execute(query, params)
+        row: Any = cursor.fetchone()
+        response = row[0] if row is not None else Error(ErrorType.InvalidArgument, missing)
+    except sqlite3.Error as error:
+        response = Error(ErrorType.SqliteException, str(error))
+    finally:
+        cursor.close()
+        release_connection(cnx)
+
+    return response
+
+
+def get_guild_changelog_version(guild_id: int) -> int | Error:
+    """
+    Gets the latest changelog version released to a guild.
+    :param guild_id: The guild ID.
+    :return: The changelog index.
+    """
+    return _select_one("SELECT Changelog FROM GUILDS WHERE GuildId = :guildId",
+                       {"guildId": guild_id}, f"Guild {guild_id} doesn't exist.")
+
+
+def set_guild_changelog_version(guild_id: int, version: int) -> Error:
+    """
+    Sets the changelog version for a guild.
+    :param guild_id: The guild ID.
+    :param version: The changelog index.
+    """
+    return _execute("UPDATE GUILDS SET Changelog = :version WHERE GuildId = :guildId",
+                    {"version": version, "guildId": guild_id})
+
+
+def set_guild_jail_role(guild_id: int, role_id: int | None) -> Error:
+    """
+    Sets the role used to mute users in a guild.
+    :param guild_id: The guild ID.
+    :param role_id: The ID of the role, or None to clear it.
+    """
+    return _execute("UPDATE GUILDS SET JailRoleId = :roleId WHERE GuildId = :guildId",
+                    {"roleId": role_id, "guildId": guild_id})
+
+
+def get_last_caught(guild_id: int, claimable: Claimable) -> datetime | Error:
+    """
+    Retrieves the time at which a crate/clam was last caught.
+    :param guild_id: The guild ID.
+    :param claimable: The type of claimable.
+    :return: The datetime of the last caught item.
+    """
+    table: str | None = _spawn_table(claimable)
+    if table is None:
+        return Error(ErrorType.InvalidArgument, "Invalid argument for claimable.")
+
+    return _select_one(f"SELECT LastCaught FROM {table} WHERE GuildId = :guildId",
+                       {"guildId": guild_id}, f"Guild {guild_id} is missing spawn data.")
+
+
+def set_last_caught(guild_id: int, claimable: Claimable, time: datetime) -> Error:
+    """
+    Sets the time at which a crate/clam was last caught.
+    :param guild_id: The guild ID.
+    :param claimable: The type of claimable.
+    :param time: The time at which the item was caught.
+    """
+    table: str | None = _spawn_table(claimable)
+    if table is None:
+        return Error(ErrorType.InvalidArgument, "Invalid argument for claimable.")
+
+    return _execute(f"UPDATE {table} SET LastCaught = :time WHERE GuildId = :guildId",
+                    {"time": time, "guildId": guild_id})
+
+
+def get_current_claimable(guild_id: int, claimable: Claimable) -> CurrentClaimable | Error:
+    """
+    Returns the channel and message IDs of the currently available claimable, if it exists.
+    :param guild_id: The ID of the guild.
+    :param claimable: The type of claimable.
+    :return: A message ID and channel ID or None
+    """
+    states: SpawnStates | Error = get_spawn_states(guild_id)
+    if isinstance(states, Error):
+        return states
+
+    return {
+        "current": states[claimable]["current"],
+        "currentChannel": states[claimable]["currentChannel"]
+    }
+
+
+def set_current_claimable(guild_id: int, claimable: Claimable, message_id: int | None, channel_id: int | None) -> Error:
+    """
+    Sets the message and channel of the currently available claimable.
+    :param guild_id: The ID of the guild.
+    :param claimable: The type of claimable.
+    :param message_id: The ID of the claimable message.
+    :param channel_id: The ID of the channel the claimable appeared in.
+    """
+    table: str | None = _spawn_table(claimable)
+    if table is None:
+        return Error(ErrorType.InvalidArgument, "Invalid argument for claimable.")
+
+    return _execute(f"UPDATE {table} "
+                    "SET Current = :current, CurrentChannelId = :currentChannel "
+                    "WHERE GuildId = :guildId",
+                    {"current": message_id, "currentChannel": channel_id, "guildId": guild_id})
+
+
+def get_spawn_states(guild_id: int) -> SpawnStates | Error:
+    """
+    Retrieves the last caught time and any unclaimed message for every type of claimable in a guild, in one query.
+    :param guild_id: The ID of the guild.
+    :return: The spawn state of each claimable.
+    """
+    cnx: TimedConnection | Error = create_connection()
+    if isinstance(cnx, Error):
+        return cnx
+
+    params = {
+        "guildId": guild_id,
+        "coin": Claimable.Coin.value,
+        "clam": Claimable.Clam.value
+    }
+
+    q_get_spawn_states = ("SELECT :coin AS Claimable, LastCaught, Current, CurrentChannelId "
+                          "FROM GUILD_COINS "
+                          "WHERE GuildId = :guildId "
+                          "UNION ALL "
+                          "SELECT :clam AS Claimable, LastCaught, Current, CurrentChannelId "
+                          "FROM GUILD_CLAMS "
+                          "WHERE GuildId = :guildId")
+
+    response: SpawnStates | Error
+    cursor: TimedCursor = cnx.cursor()
+    try:
+        cursor.execute(q_get_spawn_states, params)
+        response = {
+            Claimable(x[0]): {
+                "lastCaught": _to_datetime(x[1]),
+                "current": x[2],
+                "currentChannel": x[3]
+            } for x in cursor.fetchall()
+        }
+        if len(response) != len(Claimable):
+            response = Error(ErrorType.InvalidArgument, f"Guild {guild_id} is missing spawn data.")
+    except sqlite3.Error as error:
+        response = Error(ErrorType.SqliteException, str(error))
+    finally:
+        cursor.close()
+        release_connection(cnx)
+
+    return response
+
+
+def get_user_score(user_id: int, claimable: Claimable) -> int | Error:
+    """
+    Gets the individual user's score for a particular claimable, creating the user if they don't exist yet.
+    :param user_id: The ID of the user.
+    :param claimable: The type of claimable.
+    :return: The score for the user.
+    """
+    column: str | None = _score_column(claimable)
+    if column is None:
+        return Error(ErrorType.InvalidArgument, "Invalid argument for claimable.")
+
+    cnx: TimedConnection | Error = create_connection()
+    if isinstance(cnx, Error):
+        return cnx
+
+    params = {
+        "userId": user_id,
+        "startingCoins": constants.STARTING_COINS
+    }
+
+    q_insert_user = ("INSERT OR IGNORE "
+                     "INTO USERS (UserId, CoinsCaught) "
+                     "VALUES (:userId, :startingCoins)")
+
+    q_get_user_score = (f"SELECT {column} "
+                        "FROM USERS "
+                        "WHERE UserId = :userId")
+
+    cursor: TimedCursor = cnx.cursor()
+    try:
+        cursor.execute(q_insert_user, params)
+        cursor.execute(q_get_user_score, params)
+        response: Any = cursor.fetchone()[0]
+        cnx.commit()
+    except sqlite3.Error as error:
+        response = Error(ErrorType.SqliteException, str(error))
+    finally:
+        cursor.close()
+        release_connection(cnx)
+
+    return response
+
+
+def set_user_score(user_id: int, score: int, claimable: Claimable) -> Error:
+    """
+    Sets the user's score for a particular claimable.
+    :param user_id: The user's ID.
+    :param score: The score to set.
+    :param claimable: The type of claimable.
+    """
+    column: str | None = _score_column(claimable)
+    if column is None:
+        return Error(ErrorType.InvalidArgument, "Invalid argument for claimable.")
+
+    return _execute(f"UPDATE USERS SET {column} = :score WHERE UserId = :userId",
+                    {"score": score, "userId": user_id})
+
+
+def increment_user_score(guild_id: int, user_id: int, claimable: Claimable, delta: int) -> int | Error:
+    """
+    Adds to the user's score for a particular claimable, both overall and within the guild it was claimed in,
+    creating the user if they don't exist yet.
+    :param guild_id: The ID of the guild the claimable was claimed in.
+    :param user_id: The user's ID.
+    :param claimable: The type of claimable.
+    :param delta: The amount to add to the score. Must be more than 0.
+    :return: The user's new overall score.
+    """
+    column: str | None = _score_column(claimable)
+    if column is None:
+        return Error(ErrorType.InvalidArgument, "Invalid argument for claimable.")
+    if delta <= 0:
+        return Error(ErrorType.InvalidArgument, "Invalid argument for delta. Scores only go up.")
+
+    cnx: TimedConnection | Error = create_connection()
+    if isinstance(cnx, Error):
+        return cnx
+
+    params = {
+        "guildId": guild_id,
+        "userId": user_id,
+        "coins": constants.STARTING_COINS + (delta if claimable == Claimable.Coin else 0),
+        "clams": delta if claimable == Claimable.Clam else 0,
+        "delta": delta
+    }
+
+    q_increment_user_score = ("INSERT "
+                              "INTO USERS (UserId, CoinsCaught, ClamsCaught) "
+                              "VALUES (:userId, :coins, :clams) "
+                              f"ON CONFLICT (UserId) DO UPDATE SET {column} = {column} + :delta "
+                              f"RETURNING {column}")
+
+    q_increment_guild_user_score = ("INSERT "
+                                    f"INTO GUILD_USER_SCORES (GuildId, UserId, {column}) "
+                                    "VALUES (:guildId, :userId, :delta) "
+                                    f"ON CONFLICT (GuildId, UserId) DO UPDATE SET {column} = {column} + :delta")
+
+    response: int | Error
+    cursor: TimedCursor = cnx.cursor()
+    try:
+        cursor.execute(q_increment_user_score, params)
+        response = cursor.fetchone()[0]
+        cursor.execute(q_increment_guild_user_score, params)
+        cnx.commit()
+    except sqlite3.Error as error:
+        cnx.rollback()
+        response = Error(ErrorType.SqliteException, str(error))
+    finally:
+        cursor.close()
+        release_connection(cnx)
+
+    return response
+
+
+def increment_user_scores(deltas: list[tuple[int, int, int, int]]) -> Error:
+    """
+    Adds to the scores of many users at once, both overall and per guild, creating any users that don't exist yet.
+    All rows are committed together.
+    :param deltas: A list of (guild ID, user ID, coins to add, clams to add).
+    """
+    if not deltas:
+        return Error(ErrorType.NoError)
+
+    cnx: TimedConnection | Error = create_connection()
+    if isinstance(cnx, Error):
+        return cnx
+
+    # New users start with STARTING_COINS on top of their delta, which has to be taken back off for existing users
+    q_increment_user_scores = ("INSERT "
+                               "INTO USERS (UserId, CoinsCaught, ClamsCaught) "
+                               "VALUES (?, ?, ?) "
+                               "ON CONFLICT (UserId) DO UPDATE SET "
+                               "CoinsCaught = CoinsCaught + excluded.CoinsCaught - {starting}, "
+                               "ClamsCaught = ClamsCaught + excluded.ClamsCaught"
+                               ).format(starting=int(constants.STARTING_COINS))
+
+    q_increment_guild_user_scores = ("INSERT "
+                                     "INTO GUILD_USER_SCORES (GuildId, UserId, CoinsCaught, ClamsCaught) "
+                                     "VALUES (?, ?, ?, ?) "
+                                     "ON CONFLICT (GuildId, UserId) DO UPDATE SET "
+                                     "CoinsCaught = CoinsCaught + excluded.CoinsCaught, "
+                                     "ClamsCaught = ClamsCaught + excluded.ClamsCaught")
+
+    user_totals: dict[int, list[int]] = {}
+    for _, user_id, coins, clams in deltas:
+        totals: list[int] = user_totals.setdefault(user_id, [0, 0])
+        totals[0] += coins
+        totals[1] += clams
+
+    user_rows = [(user_id, constants.STARTING_COINS + coins, clams) for user_id, (coins, clams) in user_totals.items()]
+
+    cursor: TimedCursor = cnx.cursor()
+    try:
+        cursor.executemany(q_increment_user_scores, user_rows)
+        cursor.executemany(q_increment_guild_user_scores, deltas)
+        cnx.commit()
+        response = Error(ErrorType.NoError)
+    except sqlite3.Error as error:
+        cnx.rollback()
+        response = Error(ErrorType.SqliteException, str(error))
+    finally:
+        cursor.close()
+        release_connection(cnx)
+
+    return response
+
+
+def get_top_guild_scores(guild_id: int, claimable: Claimable, limit: int) -> list[tuple[int, int]] | Error:
+    """
+    Gets the top scores for a particular claimable within a guild.
+    :param guild_id: The ID of the guild.
+    :param claimable: The type of claimable.
+    :param limit: The maximum number of scores to return.
+    :return: A list of scores attached to user IDs, highest first.
+    """
+    column: str | None = _score_column(claimable)
+    if column is None:
+        return Error(ErrorType.InvalidArgument, "Invalid argument for claimable.")
+
+    cnx: TimedConnection | Error = create_connection()
+    if isinstance(cnx, Error):
+        return cnx
+
+    q_get_guild_scores = (f"SELECT UserId, {column} "
+                          "FROM GUILD_USER_SCORES "
+                          "WHERE GuildId = :guildId "
+                          f"ORDER BY {column} DESC "
+                          "LIMIT :limit")
+
+    cursor: TimedCursor = cnx.cursor()
+    try:
+        cursor.execute(q_get_guild_scores, {"guildId": guild_id, "limit": limit})
+        response = cursor.fetchall()
+    except sqlite3.Error as error:
+        response = Error(ErrorType.SqliteException, str(error))
+    finally:
+        cursor.close()
+        release_connection(cnx)
+
+    return response
+
+
+def get_unseeded_guilds() -> set[int] | Error:
+    """
+    Gets the guilds whose members' overall scores still need carrying over to GUILD_USER_SCORES. Only databases
+    created before GUILD_USER_SCORES have any, added to GUILD_SCORE_SEEDS by migrate.py.
+    :return: The IDs of the guilds.
+    """
+    cnx: TimedConnection | Error = create_connection()
+    if isinstance(cnx, Error):
+        return cnx
+
+    q_get_unseeded_guilds = ("SELECT GuildId "
+                             "FROM GUILD_SCORE_SEEDS")
+
+    cursor: TimedCursor = cnx.cursor()
+    try:
+        cursor.execute(q_get_unseeded_guilds)
+        response = {x[0] for x in cursor.fetchall()}
+    except sqlite3.Error as error:
+        response = Error(ErrorType.SqliteException, str(error))
+    finally:
+        cursor.close()
+        release_connection(cnx)
+
+    return response
+
+
+def seed_guild_scores(guild_id: int, user_ids: list[int]) -> Error:
+    """
+    Carries a guild's members' overall scores over to their scores within the guild, once. Each member's score in the
+    guild becomes their overall score, as the leaderboard showed before it was per guild, unless it's already higher.
+    Does nothing if the guild has already been seeded, such as by another process.
+    :param guild_id: The ID of the guild.
+    :param user_ids: The IDs of the guild's members.
+    """
+    cnx: TimedConnection | Error = create_connection()
+    if isinstance(cnx, Error):
+        return cnx
+
+    q_remove_guild_seed = ("DELETE FROM GUILD_SCORE_SEEDS "
+                           "WHERE GuildId = ?")
+
+    q_seed_guild_scores = ("INSERT "
+                           "INTO GUILD_USER_SCORES (GuildId, UserId, CoinsCaught, ClamsCaught) "
+                           "SELECT ?, UserId, CoinsCaught, ClamsCaught "
+                           "FROM USERS "
+                           "WHERE UserId IN (%s) "
+                           "ON CONFLICT (GuildId, UserId) DO UPDATE SET "
+                           "CoinsCaught = MAX(CoinsCaught, excluded.CoinsCaught), "
+                           "ClamsCaught = MAX(ClamsCaught, excluded.ClamsCaught)")
+
+    cursor: TimedCursor = cnx.cursor()
+    try:
+        cursor.execute(q_remove_guild_seed, (guild_id,))
+        if cursor.rowcount:
+            for chunk in _chunks(user_ids):
+                cursor.execute(q_seed_guild_scores % ','.join(['?'] * len(chunk)), [guild_id, *chunk])
+        cnx.commit()
+        response = Error(ErrorType.NoError)
+    except sqlite3.Error as error:
+        cnx.rollback()
+        response = Error(ErrorType.SqliteException, str(error))
+    finally:
+        cursor.close()
+        release_connection(cnx)
+
+    return response
+
+
+def _legacy_channels(additional_data: list[str | None]) -> set[int]:
+    # Written as str() of a list of channel IDs, e.g. "[123, 456]"
+    return {int(x) for data in additional_data if data for x in data.strip("[]").split(",") if x.strip()}
+
+
+def get_user_moderation_info(user_id: int, guild_id: int, moderation_type: ModerationType) -> set[int] | None | Error:
+    """
+    Retrieves a user's particular restriction within a guild, along with the channels it applies to.
+    :param user_id: The ID of the user.
+    :param guild_id: The ID of the guild.
+    :param moderation_type: The type of restriction.
+    :return: The IDs of the channels the restriction covers, or None if it doesn't exist.
+    """
+    cnx: TimedConnection | Error = create_connection()
+    if isinstance(cnx, Error):
+        return cnx
+
+    params = {
+        "userId": user_id,
+        "guildId": guild_id,
+        "moderationType": moderation_type.value
+    }
+
+    q_get_user_moderation_info = ("SELECT m.AdditionalData, c.ChannelId "
+                                  "FROM MODERATION m "
+                                  "LEFT JOIN MODERATION_CHANNELS c "
+                                  "ON c.UserId = m.UserId "
+                                  "AND c.GuildId = m.GuildId "
+                                  "AND c.ModerationType = m.ModerationType "
+                                  "WHERE m.UserId = :userId "
+                                  "AND m.GuildId = :guildId "
+                                  "AND m.ModerationType = :moderationType")
+
+    response: set[int] | None | Error
+    cursor: TimedCursor = cnx.cursor()
+    try:
+        cursor.execute(q_get_user_moderation_info, params)
+        fetched: Any = cursor.fetchall()
+        if not fetched:
+            response = None
+        else:
+            # Restrictions from before MODERATION_CHANNELS kept their channels as a list in AdditionalData, and may
+            # have had more channels added to MODERATION_CHANNELS since
+            response = {x[1] for x in fetched if x[1] is not None} | _legacy_channels([x[0] for x in fetched])
+    except sqlite3.Error as error:
+        response = Error(ErrorType.SqliteException, str(error))
+    finally:
+        cursor.close()
+        release_connection(cnx)
+
+    return response
+
+
+def set_user_moderation_info(
+        user_id: int,
+        guild_id: int,
+        moderator_id: int,
+        moderation_type: ModerationType,
+        channel_ids: Iterable[int] | None,
+        expiry: datetime | None = None) -> Error:
+    """
+    Adds moderation data for a user in a guild for a particular restriction.
+    :param user_id: The ID of the user having a moderation applied.
+    :param guild_id: The ID of the guild.
+    :param moderator_id: The ID of the moderator executing the command.
+    :param moderation_type: The type of restriction.
+    :param channel_ids: The IDs of the channels the restriction was applied to, if any.
+    :param expiry: When the restriction should be lifted, or None if it lasts until removed.
+    """
+    cnx: TimedConnection | Error = create_connection()
+    if isinstance(cnx, Error):
+        return cnx
+
+    params = {
+        "userId": user_id,
+        "guildId": guild_id,
+        "moderatorId": moderator_id,
+        "moderationType": moderation_type.value,
+        "expiry": expiry
+    }
+
+    q_set_user_moderation_info = ("INSERT INTO "
+                                  "MODERATION (UserId, GuildId, ModeratorId, ModerationType, Expiry) "
+                                  "VALUES (:userId, :guildId, :moderatorId, :moderationType, :expiry)")
+
+    q_add_moderation_channels = ("INSERT OR IGNORE INTO "
+                                 "MODERATION_CHANNELS (UserId, GuildId, ModerationType, ChannelId) "
+                                 "VALUES (?, ?, ?, ?)")
+
+    channel_rows = [(user_id, guild_id, moderation_type.value, channel_id) for channel_id in channel_ids or []]
+
+    cursor: TimedCursor = cnx.cursor()
+    try:
+        cursor.execute(q_set_user_moderation_info, params)
+        if channel_rows:
+            cursor.executemany(q_add_moderation_channels, channel_rows)
+        cnx.commit()
+        response = Error(ErrorType.NoError)
+    except sqlite3.Error as error:
+        cnx.rollback()
+        response = Error(ErrorType.SqliteException, str(error))
+    finally:
+        cursor.close()
+        release_connection(cnx)
+
+    return response
+
+
+def set_moderation_expiry(user_id: int,
+                          guild_id: int,
+                          moderation_type: ModerationType,
+                          expiry: datetime | None) -> Error:
+    """
+    Changes when a user's existing restriction should be lifted.
+    :param user_id: The ID of the user.
+    :param guild_id: The ID of the guild.
+    :param moderation_type: The type of restriction.
+    :param expiry: When the restriction should be lifted, or None if it lasts until removed.
+    """
+    return _execute("UPDATE MODERATION "
+                    "SET Expiry = :expiry "
+                    "WHERE UserId = :userId "
+                    "AND GuildId = :guildId "
+                    "AND ModerationType = :moderationType",
+                    {"expiry": expiry, "userId": user_id, "guildId": guild_id,
+                     "moderationType": moderation_type.value})
+
+
+def get_pending_expiries(moderation_type: ModerationType) -> list[tuple[int, int, datetime]] | Error:
+    """
+    Retrieves every restriction of a particular type that is due to be lifted at some point.
+    :param moderation_type: The type of restriction.
+    :return: A list of (guild ID, user ID, expiry), soonest first.
+    """
+    cnx: TimedConnection | Error = create_connection()
+    if isinstance(cnx, Error):
+        return cnx
+
+    q_get_pending_expiries = ("SELECT GuildId, UserId, MIN(Expiry) AS NextExpiry "
+                              "FROM MODERATION "
+                              "WHERE ModerationType = :moderationType "
+                              "AND Expiry IS NOT NULL "
+                              "GROUP BY GuildId, UserId "
+                              "ORDER BY NextExpiry")
+
+    cursor: TimedCursor = cnx.cursor()
+    try:
+        cursor.execute(q_get_pending_expiries, {"moderationType": moderation_type.value})
+        response = [(x[0], x[1], _to_datetime(x[2])) for x in cursor.fetchall()]
+    except sqlite3.Error as error:
+        response = Error(ErrorType.SqliteException, str(error))
+    finally:
+        cursor.close()
+        release_connection(cnx)
+
+    return response
+
+
+def add_moderation_channels(user_id: int,
+                            guild_id: int,
+                            moderation_type: ModerationType,
+                            channel_ids: Iterable[int]) -> Error:
+    """
+    Records more channels that a user's existing restriction has been applied to.
+    :param user_id: The ID of the user.
+    :param guild_id: The ID of the guild.
+    :param moderation_type: The type of restriction.
+    :param channel_ids: The IDs of the channels.
+    """
+    channel_rows = [(user_id, guild_id, moderation_type.value, channel_id) for channel_id in channel_ids]
+    if not channel_rows:
+        return Error(ErrorType.NoError)
+
+    cnx: TimedConnection | Error = create_connection()
+    if isinstance(cnx, Error):
+        return cnx
+
+    q_add_moderation_channels = ("INSERT OR IGNORE INTO "
+                                 "MODERATION_CHANNELS (UserId, GuildId, ModerationType, ChannelId) "
+                                 "VALUES (?, ?, ?, ?)")
+
+    cursor: TimedCursor = cnx.cursor()
+    try:
+        cursor.executemany(q_add_moderation_channels, channel_rows)
+        cnx.commit()
+        response = Error(ErrorType.NoError)
+    except sqlite3.Error as error:
+        cnx.rollback()
+        response = Error(ErrorType.SqliteException, str(error))
+    finally:
+        cursor.close()
+        release_connection(cnx)
+
+    return response
+
+
+def remove_moderation_channels(user_id: int,
+                               guild_id: int,
+                               moderation_type: ModerationType,
+                               channel_ids: Iterable[int]) -> Error:
+    """
+    Removes channels from a user's restriction, leaving the restriction itself in place.
+    :param user_id: The ID of the user.
+    :param guild_id: The ID of the guild.
+    :param moderation_type: The type of restriction.
+    :param channel_ids: The IDs of the channels.
+    """
+    channel_ids = list(channel_ids)
+    if not channel_ids:
+        return Error(ErrorType.NoError)
+
+    cnx: TimedConnection | Error = create_connection()
+    if isinstance(cnx, Error):
+        return cnx
+
+    q_remove_moderation_channels = ("DELETE FROM MODERATION_CHANNELS "
+                                    "WHERE UserId = ? "
+                                    "AND GuildId = ? "
+                                    "AND ModerationType = ? "
+                                    "AND ChannelId IN (%s)")
+
+    cursor: TimedCursor = cnx.cursor()
+    try:
+        for chunk in _chunks(channel_ids):
+            cursor.execute(q_remove_moderation_channels % ','.join(['?'] * len(chunk)),
+                           [user_id, guild_id, moderation_type.value, *chunk])
+        cnx.commit()
+        response = Error(ErrorType.NoError)
+    except sqlite3.Error as error:
+        cnx.rollback()
+        response = Error(ErrorType.SqliteException, str(error))
+    finally:
+        cursor.close()
+        release_connection(cnx)
+
+    return response
+
+
+def remove_user_moderation_info(user_id: int, guild_id: int, moderation_type: ModerationType) -> Error:
+    """
+    Removes a particular restriction for a user in a guild, along with its channels. Any duplicate entries with
+    different moderator IDs are also removed.
+    :param user_id: The ID of the user.
+    :param guild_id: The ID of the guild.
+    :param moderation_type: The type of restriction.
+    """
+    cnx: TimedConnection | Error = create_connection()
+    if isinstance(cnx, Error):
+        return cnx
+
+    params = {
+        "userId": user_id,
+        "guildId": guild_id,
+        "moderationType": moderation_type.value
+    }
+
+    q_remove_user_moderation_info = ("DELETE FROM MODERATION "
+                                     "WHERE UserId = :userId "
+                                     "AND GuildId = :guildId "
+                                     "AND ModerationType = :moderationType")
+
+    q_remove_moderation_channels = ("DELETE FROM MODERATION_CHANNELS "
+                                    "WHERE UserId = :userId "
+                                    "AND GuildId = :guildId "
+                                    "AND ModerationType = :moderationType")
+
+    cursor: TimedCursor = cnx.cursor()
+    try:
+        cursor.execute(q_remove_moderation_channels, params)
+        cursor.execute(q_remove_user_moderation_info, params)
+        cnx.commit()
+        response = Error(ErrorType.NoError)
+    except sqlite3.Error as error:
+        cnx.rollback()
+        response = Error(ErrorType.SqliteException, str(error))
+    finally:
+        cursor.close()
+        release_connection(cnx)
+
+    return response
+
+
+def get_last_reactor(guild_id: int) -> int | None | Error:
+    """
+    Gets the ID of the last user to react to a message in a guild.
+    :param guild_id: The ID of the guild.
+    :return: The ID of the user.
+    """
+    response: int | None | Error = _select_one("SELECT LastReactor FROM GUILDS WHERE GuildId = :guildId",
+                                               {"guildId": guild_id}, "")
+    # A guild that isn't stored has no last reactor, rather than being an error
+    if isinstance(response, Error) and response.Status == ErrorType.InvalidArgument:
+        return None
+
+    return response
+
+
+def set_last_reactor(guild_id: int, user_id: int) -> Error:
+    """
+    Sets the ID of the last user to react to a message in a guild.
+    :param guild_id: The ID of the guild.
+    :param user_id: The ID of the user.
+    """
+    return set_last_reactors([(guild_id, user_id)])
+
+
+def set_last_reactors(last_reactors: list[tuple[int, int]]) -> Error:
+    """
+    Sets the ID of the last user to react to a message for many guilds at once, in one transaction.
+    :param last_reactors: A list of (guild ID, user ID).
+    """
+    if not last_reactors:
+        return Error(ErrorType.NoError)
+
+    cnx: TimedConnection | Error = create_connection()
+    if isinstance(cnx, Error):
+        return cnx
+
+    q_set_last_reactor = ("UPDATE GUILDS "
+                          "SET LastReactor = ? "
+                          "WHERE GuildId = ?")
+
+    cursor: TimedCursor = cnx.cursor()
+    try:
+        cursor.executemany(q_set_last_reactor, [(user_id, guild_id) for guild_id, user_id in last_reactors])
+        cnx.commit()
+        response = Error(ErrorType.NoError)
+    except sqlite3.Error as error:
+        cnx.rollback()
+        response = Error(ErrorType.SqliteException, str(error))
+    finally:
+        cursor.close()
+        release_connection(cnx)
+
+    return response
+
+
+def get_guild_content(guild_id: int) -> GuildContent | Error:
+    """
+    Retrieves the content a guild has added, and the types of built-in content it has switched off.
+    :param guild_id: The ID of the guild.
+    :return: The guild's content.
+    """
+    cnx: TimedConnection | Error = create_connection()
+    if isinstance(cnx, Error):
+        return cnx
+
+    q_get_guild_content = ("SELECT ContentId, ContentType, ContentKey, Value "
+                           "FROM GUILD_CONTENT "
+                           "WHERE GuildId = :guildId "
+                           "ORDER BY ContentId")
+
+    q_get_hidden_defaults = ("SELECT ContentType "
+                             "FROM GUILD_HIDDEN_DEFAULTS "
+                             "WHERE GuildId = :guildId")
+
+    response: GuildContent | Error
+    cursor: TimedCursor = cnx.cursor()
+    try:
+        cursor.execute(q_get_guild_content, {"guildId": guild_id})
+        entries: list[ContentEntry] = [
+            {"id": x[0], "type": ContentType(x[1]), "key": x[2], "value": x[3]} for x in cursor.fetchall()
+        ]
+        cursor.execute(q_get_hidden_defaults, {"guildId": guild_id})
+        response = {"entries": entries, "hiddenDefaults": {ContentType(x[0]) for x in cursor.fetchall()}}
+    except sqlite3.Error as error:
+        response = Error(ErrorType.SqliteException, str(error))
+    finally:
+        cursor.close()
+        release_connection(cnx)
+
+    return response
+
+
+def add_guild_content(guild_id: int, content_type: ContentType, key: str | None, value: str) -> int | Error:
+    """
+    Adds a piece of content to a guild.
+    :param guild_id: The ID of the guild.
+    :param content_type: The type of content.
+    :param key: The reaction for a reaction image, or the words for a trigger. None for every other type.
+    :param value: The content itself.
+    :return: The ID of the new content.
+    """
+    cnx: TimedConnection | Error = create_connection()
+    if isinstance(cnx, Error):
+        return cnx
+
+    params = {
+        "guildId": guild_id,
+        "contentType": content_type.value,
+        "key": key,
+        "value": value
+    }
+
+    q_add_guild_content = ("INSERT INTO "
+                           "GUILD_CONTENT (GuildId, ContentType, ContentKey, Value) "
+                           "VALUES (:guildId, :contentType, :key, :value)")
+
+    response: int | Error
+    cursor: TimedCursor = cnx.cursor()
+    try:
+        cursor.execute(q_add_guild_content, params)
+        response = cursor.lastrowid
+        cnx.commit()
+    except sqlite3.Error as error:
+        cnx.rollback()
+        response = Error(ErrorType.SqliteException, str(error))
+    finally:
+        cursor.close()
+        release_connection(cnx)
+
+    return response
+
+
+def remove_guild_content(guild_id: int, content_id: int) -> bool | Error:
+    """
+    Removes a piece of content from a guild.
+    :param guild_id: The ID of the guild.
+    :param content_id: The ID of the content.
+    :return: Whether the guild had the content to remove.
+    """
+    cnx: TimedConnection | Error = create_connection()
+    if isinstance(cnx, Error):
+        return cnx
+
+    q_remove_guild_content = ("DELETE FROM GUILD_CONTENT "
+                              "WHERE ContentId = :contentId "
+                              "AND GuildId = :guildId")
+
+    response: bool | Error
+    cursor: TimedCursor = cnx.cursor()
+    try:
+        cursor.execute(q_remove_guild_content, {"contentId": content_id, "guildId": guild_id})
+        response = cursor.rowcount > 0
+        cnx.commit()
+    except sqlite3.Error as error:
+        cnx.rollback()
+        response = Error(ErrorType.SqliteException, str(error))
+    finally:
+        cursor.close()
+        release_connection(cnx)
+
+    return response
+
+
+def set_guild_content_defaults(guild_id: int, content_type: ContentType, enabled: bool) -> Error:
+    """
+    Switches the built-in content of a particular type on or off for a guild.
+    :param guild_id: The ID of the guild.
+    :param content_type: The type of content.
+    :param enabled: Whether the guild should get the built-in content of this type.
+    """
+    params = {
+        "guildId": guild_id,
+        "contentType": content_type.value
+    }
+
+    if enabled:
+        return _execute("DELETE FROM GUILD_HIDDEN_DEFAULTS "
+                        "WHERE GuildId = :guildId "
+                        "AND ContentType = :contentType", params)
+
+    return _execute("INSERT OR IGNORE INTO "
+                    "GUILD_HIDDEN_DEFAULTS (GuildId, ContentType) "
+                    "VALUES (:guildId, :contentType)", params)
@@ -0,0 +1,153 @@
+"""stallwatch.py"""
+
+# IMPORTS #
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from types import FrameType
+from typing import Iterator
+
+import config
+
+from classes import StallStats
+
+"""
+    Catches code that blocks the event loop (a synchronous database call, inspirobot or meme_get inside a coroutine)
+    while it's happening. A watchdog thread asks the loop to note the time every so often; when the loop hasn't done so
+    for STALL_THRESHOLD seconds, the watchdog reads the loop thread's stack to see which handler is running and which
+    line it's stuck on, and logs it. Once the loop catches up, the length of the stall is added to STALL_STATS.
+"""
+
+STALL_STATS: StallStats = StallStats()
+
+_PACKAGE_DIR: str = os.path.dirname(os.path.abspath(__file__))
+# Enough to get from a handler down into whichever library call is blocking
+_STACK_LIMIT: int = 25
+# Where the loop runs each callback. Frames outside this belong to the loop itself, not to what it's running
+_CALLBACK_CODE = asyncio.Handle._run.__code__
+
+
+def _in_package(frame: FrameType) -> bool:
+    return os.path.dirname(os.path.abspath(frame.f_code.co_filename)) == _PACKAGE_DIR
+
+
+def _describe(frame: FrameType) -> str:
+    return f"{os.path.basename(frame.f_code.co_filename)}:{frame.f_lineno} in {frame.f_code.co_name}"
+
+
+def _callback_frames(frame: FrameType) -> Iterator[FrameType]:
+    """
+    Walks outwards from a frame to the callback the event loop is running, leaving out the loop's own frames.
+    """
+    current: FrameType | None = frame
+    while current is not None and current.f_code is not _CALLBACK_CODE:
+        yield current
+        current = current.f_back
+
+
+def find_culprit(frame: FrameType) -> tuple[str, str]:
+    """
+    Works out, from the loop thread's stack, what was running when it stalled.
+    :param frame: The innermost frame of the loop thread.
+    :return: The handler (a command or listener from bot.py, otherwise the outermost of our own functions on the stack,
+    such as a background task) and the blocking call site (the innermost of our own frames).
+    """
+    handler: str = "unknown"
+    site: str = "unknown"
+    for current in _callback_frames(frame):
+        if _in_package(current):
+            if site == "unknown":
+                site = _describe(current)
+            name: str = os.path.splitext(os.path.basename(current.f_code.co_filename))[0]
+            if name == "bot":
+                # Commands and listeners are named as they are in bot.py
+                handler = current.f_code.co_name
+                break
+            # Keep walking, as the outermost of our functions is the one that started this piece of work
+            handler = f"{name}.{current.f_code.co_name}"
+
+    return handler, site
+
+
+class StallWatchdog:
+    """
+    Watches the event loop from a separate thread, as nothing on a blocked loop can notice it's blocked.
+    """
+
+    def __init__(self, threshold: float):
+        self._threshold: float = threshold
+        # Beats come several times per threshold, so a stall is spotted soon after it passes the threshold
+        self._interval: float = threshold / 4
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._loop_thread_id: int | None = None
+        self._last_beat: float = time.monotonic()
+        self._stop: threading.Event = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def _beat(self):
+        self._last_beat = time.monotonic()
+
+    def start(self):
+        """
+        Starts watching the running event loop. Must be called from the loop's thread.
+        """
+        if self._threshold <= 0 or self._thread is not None:
+            return
+
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="stall-watchdog", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+
+        self._stop.set()
+        self._thread.join(timeout=self._interval * 2)
+        self._thread = None
+
+    def _run(self):
+        # The beat the current stall began after, and what was stuck, while a stall is in progress
+        stalled_since: float | None = None
+        culprit: tuple[str, str] = ("unknown", "unknown")
+
+        while not self._stop.wait(self._interval):
+            try:
+                self._loop.call_soon_threadsafe(self._beat)
+            except RuntimeError:
+                # The loop has been closed
+                return
+
+            last_beat: float = self._last_beat
+            if stalled_since is not None and last_beat > stalled_since:
+                handler, site = culprit
+                blocked: float = last_beat - stalled_since
+                STALL_STATS.record(handler, site, blocked)
+                logging.warning(f"Event loop was blocked for {blocked:.3f}s by {handler} at {site}")
+                stalled_since = None
+
+            if stalled_since is None and time.monotonic() - last_beat > self._threshold:
+                frame: FrameType | None = sys._current_frames().get(self._loop_thread_id)
+                if frame is None:
+                    continue
+
+                stalled_since = last_beat
+                culprit = find_culprit(frame)
+                frames: list[tuple[FrameType, int]] = [
+                    (current, current.f_lineno) for current in _callback_frames(frame)
+                ]
+                stack: str = "".join(traceback.StackSummary.extract(reversed(frames[:_STACK_LIMIT])).format())
+                logging.warning(
+                    f"Event loop blocked for over {self._threshold}s by {culprit[0]} at {culprit[1]}:\n{stack}"
+                )
+                del frame, frames
+
+
+WATCHDOG: StallWatchdog = StallWatchdog(config.STALL_THRESHOLD)
@@ -0,0 +1,8 @@
+"""tests"""
+
+# IMPORTS #
+import os
+
+# Run against the in-memory backend unless told otherwise, so no database server is needed. Set before config is
+# imported by any test, and not overridden by a .env file
+os.environ.setdefault("DBBACKEND", "memory")
@@ -0,0 +1,75 @@
+"""test_caches.py"""
+
+# IMPORTS #
+import time
+import unittest
+from unittest import mock
+
+import caches
+import constants
+
+from enums import Claimable
+
+
+class LeaderboardCacheTests(unittest.TestCase):
+
+    def setUp(self):
+        self.cache: caches.LeaderboardCache = caches.LeaderboardCache(ttl=60)
+
+    def put(self, rows: list[tuple[int, int]], guild_id: int = 1) -> caches.LeaderboardEntry:
+        generation: int = self.cache.generation(guild_id, Claimable.Coin)
+        return self.cache.put(guild_id, Claimable.Coin, generation, rows)
+
+    def test_put_and_get(self):
+        entry: caches.LeaderboardEntry = self.put([(10, 5)])
+        self.assertIs(self.cache.get(1, Claimable.Coin), entry)
+        self.assertIsNone(self.cache.get(1, Claimable.Clam))
+
+    def test_put_skipped_when_claim_lands_during_fetch(self):
+        generation: int = self.cache.generation(1, Claimable.Coin)
+        # A claim between starting the fetch and putting its rows, which may or may not include it
+        self.cache.record_score(1, 10, Claimable.Coin, 5)
+        entry: caches.LeaderboardEntry = self.cache.put(1, Claimable.Coin, generation, [(10, 5)])
+
+        # Still handed back to show, but not kept
+        self.assertEqual(entry.Rows, [(10, 5)])
+        self.assertIsNone(self.cache.get(1, Claimable.Coin))
+
+    def test_put_skipped_when_evicted_during_fetch(self):
+        generation: int = self.cache.generation(1, Claimable.Clam)
+        self.cache.evict(1)
+        self.cache.put(1, Claimable.Clam, generation, [(10, 1)])
+        self.assertIsNone(self.cache.get(1, Claimable.Clam))
+
+    def test_generations_are_per_guild_and_claimable(self):
+        coins: int = self.cache.generation(1, Claimable.Coin)
+        clams: int = self.cache.generation(1, Claimable.Clam)
+        other_guild: int = self.cache.generation(2, Claimable.Coin)
+        self.cache.record_score(1, 10, Claimable.Coin, 5)
+
+        self.assertNotEqual(self.cache.generation(1, Claimable.Coin), coins)
+        self.assertEqual(self.cache.generation(1, Claimable.Clam), clams)
+        self.assertEqual(self.cache.generation(2, Claimable.Coin), other_guild)
+
+    def test_record_score_patches_rows(self):
+        entry: caches.LeaderboardEntry = self.put([(10, 20), (11, 15)])
+        entry.Embed = mock.Mock()
+        self.cache.record_score(1, 11, Claimable.Coin, 10)
+        self.cache.record_score(1, 12, Claimable.Coin, 1)
+
+        self.assertEqual(self.cache.get(1, Claimable.Coin).Rows, [(11, 25), (10, 20), (12, 1)])
+        self.assertIsNone(entry.Embed)
+
+    def test_record_score_drops_full_leaderboard_for_unknown_user(self):
+        self.put([(user_id, 100) for user_id in range(constants.LEADERBOARD_FETCH)])
+        self.cache.record_score(1, 999, Claimable.Coin, 1)
+        self.assertIsNone(self.cache.get(1, Claimable.Coin))
+
+    def test_entries_expire(self):
+        self.put([(10, 5)])
+        with mock.patch.object(time, "monotonic", return_value=time.monotonic() + 61):
+            self.assertIsNone(self.cache.get(1, Claimable.Coin))
+
+
+if __name__ == "__main__":
+    unittest.main()
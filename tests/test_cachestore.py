@@ -0,0 +1,138 @@
+"""test_cachestore.py"""
+
+# IMPORTS #
+import asyncio
+import importlib.util
+import unittest
+from unittest import mock
+
+import cachestore
+
+"""
+    Runs the same cases against LocalStore and RedisStore, to check the local store is a faithful stand-in. RedisStore
+    runs against fakeredis, with lupa for its Lua scripting, and is skipped where those aren't installed.
+"""
+
+_HAS_FAKEREDIS: bool = all(importlib.util.find_spec(name) is not None for name in ("fakeredis", "lupa"))
+
+
+class StoreCases:
+    """
+    Cases every store must pass. Mixed into a test case that sets self.store in asyncSetUp.
+    """
+    store: cachestore.CacheStore
+
+    async def asyncTearDown(self):
+        await self.store.close()
+
+    async def test_get_missing(self):
+        self.assertIsNone(await self.store.get("missing"))
+
+    async def test_set_and_get(self):
+        await self.store.set("key", "value")
+        self.assertEqual(await self.store.get("key"), "value")
+
+    async def test_set_expires(self):
+        await self.store.set("key", "value", ttl=0.05)
+        await asyncio.sleep(0.1)
+        self.assertIsNone(await self.store.get("key"))
+
+    async def test_delete(self):
+        await self.store.set("key", "value")
+        await self.store.delete("key")
+        self.assertIsNone(await self.store.get("key"))
+
+    async def test_compare_and_set_missing_key(self):
+        self.assertTrue(await self.store.compare_and_set("key", None, "first"))
+        self.assertFalse(await self.store.compare_and_set("key", None, "second"))
+        self.assertEqual(await self.store.get("key"), "first")
+
+    async def test_compare_and_set_expected_value(self):
+        await self.store.set("key", "old")
+        self.assertFalse(await self.store.compare_and_set("key", "other", "new"))
+        self.assertTrue(await self.store.compare_and_set("key", "old", "new"))
+        self.assertEqual(await self.store.get("key"), "new")
+
+    async def test_compare_and_set_delete(self):
+        await self.store.set("key", "value")
+        self.assertTrue(await self.store.compare_and_set("key", "value", None))
+        self.assertIsNone(await self.store.get("key"))
+
+    async def test_compare_and_set_expires(self):
+        self.assertTrue(await self.store.compare_and_set("key", None, "value", ttl=0.05))
+        await asyncio.sleep(0.1)
+        self.assertTrue(await self.store.compare_and_set("key", None, "again"))
+
+    async def test_compare_and_set_race(self):
+        results: list[bool | None] = await asyncio.gather(
+            *[self.store.compare_and_set("key", None, str(i)) for i in range(10)]
+        )
+        self.assertEqual(results.count(True), 1)
+        self.assertEqual(results.count(False), 9)
+
+    async def test_invalidation(self):
+        evicted: list[int] = []
+        with mock.patch.object(cachestore, "STORE", self.store):
+            cachestore.on_invalidate("test:channel", evicted.append)
+            await self.store.start()
+            # Give the subscription time to be set up
+            await asyncio.sleep(0.05)
+
+            # This process's own messages are ignored, as it changed its cache itself
+            await cachestore.invalidate("test:channel", 1)
+            await self.store.publish("test:channel", "another-process:2")
+            await asyncio.sleep(0.1)
+
+        self.assertEqual(evicted, [2])
+
+
+class LocalStoreTests(StoreCases, unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.store = cachestore.LocalStore(100)
+
+    async def test_evicts_least_recently_used(self):
+        store: cachestore.LocalStore = cachestore.LocalStore(2)
+        await store.set("a", "1")
+        await store.set("b", "2")
+        await store.get("a")
+        await store.set("c", "3")
+        self.assertEqual(await store.get("a"), "1")
+        self.assertIsNone(await store.get("b"))
+
+
+@unittest.skipUnless(_HAS_FAKEREDIS, "needs fakeredis and lupa")
+class RedisStoreTests(StoreCases, unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        import fakeredis
+
+        self.store = cachestore.RedisStore(fakeredis.FakeAsyncRedis(server=fakeredis.FakeServer(),
+                                                                    decode_responses=True))
+
+    async def test_compare_and_set_unavailable(self):
+        async def fail(**_):
+            raise ConnectionError("Connection refused")
+
+        self.store._compare_and_set = fail
+        self.assertIsNone(await self.store.compare_and_set("key", None, "value"))
+
+        # Settled in this process instead, so exactly one caller still wins
+        with mock.patch.object(cachestore, "STORE", self.store):
+            self.assertTrue(await cachestore.compare_and_set("unavailable", None, "first"))
+            self.assertFalse(await cachestore.compare_and_set("unavailable", None, "second"))
+
+
+class CacheStoreTests(unittest.TestCase):
+
+    def test_incomplete_store_cannot_be_created(self):
+        class Incomplete(cachestore.CacheStore):
+            async def get(self, key: str) -> str | None:
+                return None
+
+        with self.assertRaises(TypeError):
+            Incomplete()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,171 @@
+"""test_ledger.py"""
+
+# IMPORTS #
+import asyncio
+import unittest
+from unittest import mock
+
+import async_repository
+import ledger
+
+from classes import Error
+from enums import Claimable, ErrorType
+
+
+class FakeScores:
+    """
+    Stands in for the score functions in async_repository, holding overall scores in memory.
+    """
+
+    def __init__(self):
+        self.Scores: dict[tuple[int, Claimable], int] = {}
+        self.Writes: list[list[tuple[int, int, int, int]]] = []
+        self.Fail: bool = False
+        # Set to make writes wait until it's set again
+        self.Hold: asyncio.Event | None = None
+
+    async def increment_user_scores(self, deltas: list[tuple[int, int, int, int]]) -> Error:
+        if self.Hold is not None:
+            await self.Hold.wait()
+        if self.Fail:
+            return Error(ErrorType.MySqlException, "Lost connection.")
+
+        self.Writes.append(deltas)
+        for _, user_id, coins, clams in deltas:
+            for claimable, delta in ((Claimable.Coin, coins), (Claimable.Clam, clams)):
+                self.Scores[(user_id, claimable)] = self.Scores.get((user_id, claimable), 0) + delta
+        return Error(ErrorType.NoError)
+
+    async def get_user_score(self, user_id: int, claimable: Claimable) -> int | Error:
+        return self.Scores.get((user_id, claimable), 0)
+
+
+class ScoreLedgerTests(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.fake: FakeScores = FakeScores()
+        for name in ("increment_user_scores", "get_user_score"):
+            patcher = mock.patch.object(async_repository, name, getattr(self.fake, name))
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.ledger: ledger.ScoreLedger = ledger.ScoreLedger(interval=60, threshold=100)
+
+    async def test_add_combines_deltas(self):
+        self.ledger.add(1, 10, Claimable.Coin, 5)
+        self.ledger.add(1, 10, Claimable.Coin, 7)
+        self.ledger.add(2, 10, Claimable.Coin, 1)
+        self.ledger.add(1, 10, Claimable.Clam, 1)
+
+        # Across every guild, for the one claimable
+        self.assertEqual(self.ledger.pending(10, Claimable.Coin), 13)
+        self.assertEqual(self.ledger.pending(10, Claimable.Clam), 1)
+        self.assertEqual(self.ledger.pending(11, Claimable.Coin), 0)
+        self.assertTrue(self.ledger.has_pending_for_guild(2))
+        self.assertFalse(self.ledger.has_pending_for_guild(3))
+
+    async def test_flush_writes_one_row_per_guild_and_user(self):
+        self.ledger.add(1, 10, Claimable.Coin, 5)
+        self.ledger.add(1, 10, Claimable.Clam, 1)
+        self.ledger.add(1, 10, Claimable.Coin, 2)
+        self.ledger.add(2, 11, Claimable.Clam, 1)
+
+        self.assertTrue(await self.ledger.flush())
+
+        self.assertEqual(sorted(self.fake.Writes[0]), [(1, 10, 7, 1), (2, 11, 0, 1)])
+        self.assertEqual(self.ledger.pending(10, Claimable.Coin), 0)
+        self.assertFalse(self.ledger.has_pending_for_guild(1))
+
+    async def test_flush_with_nothing_pending(self):
+        self.assertTrue(await self.ledger.flush())
+        self.assertEqual(self.fake.Writes, [])
+
+    async def test_failed_flush_keeps_deltas_for_retry(self):
+        self.ledger.add(1, 10, Claimable.Coin, 5)
+        self.fake.Fail = True
+        with self.assertLogs(level="ERROR"):
+            self.assertFalse(await self.ledger.flush())
+        self.assertEqual(self.ledger.pending(10, Claimable.Coin), 5)
+
+        # Claims made in the meantime are written along with the retried ones
+        self.ledger.add(1, 10, Claimable.Coin, 3)
+        self.fake.Fail = False
+        self.assertTrue(await self.ledger.flush())
+        self.assertEqual(self.fake.Writes, [[(1, 10, 8, 0)]])
+        self.assertEqual(self.ledger.pending(10, Claimable.Coin), 0)
+
+    async def test_cancelled_flush_keeps_deltas_when_write_fails(self):
+        self.ledger.add(1, 10, Claimable.Coin, 5)
+        self.fake.Fail = True
+        self.fake.Hold = asyncio.Event()
+
+        flush: asyncio.Task = asyncio.create_task(self.ledger.flush())
+        await asyncio.sleep(0)
+        flush.cancel()
+        self.fake.Hold.set()
+        with self.assertLogs(level="ERROR"), self.assertRaises(asyncio.CancelledError):
+            await flush
+
+        self.assertEqual(self.ledger.pending(10, Claimable.Coin), 5)
+
+    async def test_cancelled_flush_does_not_write_twice(self):
+        self.ledger.add(1, 10, Claimable.Coin, 5)
+        self.fake.Hold = asyncio.Event()
+
+        flush: asyncio.Task = asyncio.create_task(self.ledger.flush())
+        await asyncio.sleep(0)
+        flush.cancel()
+        self.fake.Hold.set()
+        with self.assertRaises(asyncio.CancelledError):
+            await flush
+
+        # The write went through, so nothing is left to write again
+        self.assertEqual(self.ledger.pending(10, Claimable.Coin), 0)
+        self.assertTrue(await self.ledger.flush())
+        self.assertEqual(self.fake.Writes, [[(1, 10, 5, 0)]])
+
+    async def test_get_score_includes_pending(self):
+        self.fake.Scores[(10, Claimable.Coin)] = 100
+        self.ledger.add(1, 10, Claimable.Coin, 5)
+        self.assertEqual(await self.ledger.get_score(10, Claimable.Coin), 105)
+
+        await self.ledger.flush()
+        self.assertEqual(await self.ledger.get_score(10, Claimable.Coin), 105)
+
+    async def test_get_score_during_flush_counts_deltas_once(self):
+        self.fake.Scores[(10, Claimable.Coin)] = 100
+        self.ledger.add(1, 10, Claimable.Coin, 5)
+        self.fake.Hold = asyncio.Event()
+
+        flush: asyncio.Task = asyncio.create_task(self.ledger.flush())
+        await asyncio.sleep(0)
+        score: asyncio.Task = asyncio.create_task(self.ledger.get_score(10, Claimable.Coin))
+        await asyncio.sleep(0)
+        self.fake.Hold.set()
+
+        self.assertTrue(await flush)
+        self.assertEqual(await score, 105)
+
+    async def test_get_score_error(self):
+        error: Error = Error(ErrorType.MySqlException, "Lost connection.")
+        with mock.patch.object(async_repository, "get_user_score", mock.AsyncMock(return_value=error)):
+            self.assertIs(await self.ledger.get_score(10, Claimable.Coin), error)
+
+    async def test_stop_writes_whatever_is_left(self):
+        self.ledger.start()
+        self.ledger.add(1, 10, Claimable.Clam, 1)
+        await self.ledger.stop()
+        self.assertEqual(self.fake.Writes, [[(1, 10, 0, 1)]])
+
+    async def test_threshold_wakes_flush_early(self):
+        small: ledger.ScoreLedger = ledger.ScoreLedger(interval=60, threshold=2)
+        small.start()
+        small.add(1, 10, Claimable.Coin, 1)
+        small.add(1, 11, Claimable.Coin, 1)
+        await asyncio.sleep(0.05)
+        self.assertEqual(len(self.fake.Writes), 1)
+        await small.stop()
+
+
+if __name__ == "__main__":
+    unittest.main()
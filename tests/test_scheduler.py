@@ -0,0 +1,97 @@
+"""test_scheduler.py"""
+
+# IMPORTS #
+import asyncio
+from datetime import datetime, timedelta, timezone
+import unittest
+
+import scheduler
+
+
+def _in(seconds: float) -> datetime:
+    return datetime.now(timezone.utc) + timedelta(seconds=seconds)
+
+
+class ExpirySchedulerTests(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.fired: list[tuple[int, int]] = []
+        self.scheduler: scheduler.ExpiryScheduler = scheduler.ExpiryScheduler(self.fire)
+        self.scheduler.start()
+
+    async def asyncTearDown(self):
+        self.scheduler.stop()
+
+    async def fire(self, guild_id: int, user_id: int):
+        self.fired.append((guild_id, user_id))
+
+    async def test_fires_in_expiry_order(self):
+        self.scheduler.schedule(1, 10, _in(0.1))
+        self.scheduler.schedule(1, 11, _in(0.05))
+        self.scheduler.schedule(2, 10, _in(-1))
+        await asyncio.sleep(0.2)
+
+        self.assertEqual(self.fired, [(2, 10), (1, 11), (1, 10)])
+        self.assertEqual(len(self.scheduler), 0)
+
+    async def test_sooner_expiry_wakes_scheduler(self):
+        self.scheduler.schedule(1, 10, _in(60))
+        await asyncio.sleep(0.01)
+        self.scheduler.schedule(1, 11, _in(0.05))
+        await asyncio.sleep(0.1)
+
+        self.assertEqual(self.fired, [(1, 11)])
+        self.assertEqual(len(self.scheduler), 1)
+
+    async def test_cancel(self):
+        self.scheduler.schedule(1, 10, _in(0.05))
+        self.scheduler.cancel(1, 10)
+        await asyncio.sleep(0.1)
+
+        self.assertEqual(self.fired, [])
+        self.assertEqual(len(self.scheduler), 0)
+
+    async def test_reschedule_replaces_expiry(self):
+        self.scheduler.schedule(1, 10, _in(0.05))
+        self.scheduler.schedule(1, 10, _in(0.15))
+        await asyncio.sleep(0.1)
+        self.assertEqual(self.fired, [])
+
+        await asyncio.sleep(0.1)
+        self.assertEqual(self.fired, [(1, 10)])
+
+    async def test_failing_callback_does_not_stop_others(self):
+        async def fail_first(guild_id: int, user_id: int):
+            if user_id == 10:
+                raise RuntimeError("Missing permissions")
+            self.fired.append((guild_id, user_id))
+
+        self.scheduler._callback = fail_first
+        with self.assertLogs(level="ERROR"):
+            self.scheduler.schedule(1, 10, _in(0.01))
+            self.scheduler.schedule(1, 11, _in(0.02))
+            await asyncio.sleep(0.1)
+
+        self.assertEqual(self.fired, [(1, 11)])
+
+    async def test_slow_callbacks_run_alongside_and_are_kept_until_done(self):
+        release: asyncio.Event = asyncio.Event()
+
+        async def slow(guild_id: int, user_id: int):
+            await release.wait()
+            self.fired.append((guild_id, user_id))
+
+        self.scheduler._callback = slow
+        self.scheduler.schedule(1, 10, _in(0))
+        self.scheduler.schedule(1, 11, _in(0))
+        await asyncio.sleep(0.05)
+        self.assertEqual(len(self.scheduler._firing), 2)
+
+        release.set()
+        await asyncio.sleep(0.01)
+        self.assertEqual(sorted(self.fired), [(1, 10), (1, 11)])
+        self.assertEqual(self.scheduler._firing, set())
+
+
+if __name__ == "__main__":
+    unittest.main()
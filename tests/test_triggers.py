@@ -0,0 +1,102 @@
+"""test_triggers.py"""
+
+# IMPORTS #
+import random
+import re
+import unittest
+
+import constants
+
+from datatypes import Trigger
+from triggers import TriggerSet
+
+"""
+    Checks TriggerSet against a plain reference matcher: every word of every trigger searched for on its own, one regex
+    at a time, the way respond_to_message matched before TriggerSet.
+"""
+
+# Made-up triggers alongside the built-in ones, with words that overlap, start with one another, and start or end
+# with punctuation
+_EXTRA_TRIGGERS: list[Trigger] = [
+    {"name": "workshop", "group": "reply", "words": ["workshop"], "match": "word"},
+    {"name": "pizza", "group": "custom", "words": ["pizza time", "pizza"], "match": "word"},
+    {"name": "cpp", "group": "custom", "words": ["c++"], "match": "word"},
+    {"name": "smile", "group": "custom", "words": [":)"], "match": "word"},
+    {"name": "hashtag", "group": "custom", "words": ["#win"], "match": "word"},
+    {"name": "za", "group": "other", "words": ["za"], "match": "substring"},
+    {"name": "bot", "group": "other", "words": ["bot"], "match": "word"},
+]
+
+_WORDS: list[str] = [
+    "work", "works", "workshop", "nerdbot", "nerd", "bot", "inspire", "me", "inspire me", "pizza", "pizza time",
+    "time", "c++", "c", ":)", ":", ")", "#win", "win", "za", "the", "game", "shit", "heck", "_", "a1",
+]
+_SEPARATORS: list[str] = [" ", "", ",", ".", "!", "_", "-", "  "]
+
+
+def reference_match(triggers: list[Trigger], content: str) -> dict[str, str]:
+    found: dict[str, str] = {}
+    for trigger in triggers:
+        if trigger["group"] in found:
+            continue
+
+        for word in trigger["words"]:
+            if not word:
+                continue
+            if trigger["match"] == "substring":
+                matched: bool = word in content
+            else:
+                # Word boundaries only where the word has a word character to put one against
+                start: str = r"\b" if re.match(r"\w", word[0]) else ""
+                end: str = r"\b" if re.match(r"\w", word[-1]) else ""
+                matched = re.search(f"{start}{re.escape(word)}{end}", content) is not None
+            if matched:
+                found[trigger["group"]] = trigger["name"]
+                break
+
+    return found
+
+
+class TriggerSetTests(unittest.TestCase):
+
+    def test_built_in_triggers(self):
+        matcher: TriggerSet = TriggerSet(constants.TRIGGERS)
+        self.assertEqual(matcher.match("i have so much work to do"), {"reply": "work"})
+        self.assertEqual(matcher.match("homework and networking"), {})
+        self.assertEqual(matcher.match("nerdbot inspire me"), {"reply": "inspire"})
+        self.assertEqual(matcher.match(f"oh {constants.SWEARS[0]}, work"), {"swear": "swear", "reply": "work"})
+
+    def test_earliest_trigger_in_list_wins(self):
+        triggers: list[Trigger] = constants.TRIGGERS + _EXTRA_TRIGGERS
+        # "workshop" comes after "work" in the list, so work wins even though it isn't a whole word here
+        self.assertEqual(TriggerSet(triggers).match("workshop work"), {"reply": "work"})
+        self.assertEqual(TriggerSet(triggers).match("the workshop"), {"reply": "workshop"})
+
+    def test_punctuation_at_either_end(self):
+        matcher: TriggerSet = TriggerSet(_EXTRA_TRIGGERS)
+        self.assertEqual(matcher.match("i like c++ a lot"), {"custom": "cpp"})
+        self.assertEqual(matcher.match("c++, obviously"), {"custom": "cpp"})
+        self.assertEqual(matcher.match("thanks :)"), {"custom": "smile"})
+        self.assertEqual(matcher.match("#win"), {"custom": "hashtag"})
+        self.assertEqual(matcher.match("#winning"), {})
+
+    def test_no_triggers(self):
+        self.assertEqual(TriggerSet([]).match("anything"), {})
+        self.assertEqual(TriggerSet([{"name": "empty", "group": "x", "words": [""], "match": "word"}]).match("a"), {})
+
+    def test_unknown_match(self):
+        with self.assertRaises(ValueError):
+            TriggerSet([{"name": "bad", "group": "x", "words": ["a"], "match": "regex"}])
+
+    def test_agrees_with_reference_on_random_messages(self):
+        triggers: list[Trigger] = constants.TRIGGERS + _EXTRA_TRIGGERS
+        matcher: TriggerSet = TriggerSet(triggers)
+        rng: random.Random = random.Random(2024)
+        for _ in range(5000):
+            parts: list[str] = rng.choices(_WORDS, k=rng.randint(1, 8))
+            content: str = "".join(part + rng.choice(_SEPARATORS) for part in parts).strip()
+            self.assertEqual(matcher.match(content), reference_match(triggers, content), content)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,108 @@
+"""triggers.py"""
+
+# IMPORTS #
+import re
+
+from datatypes import Trigger
+
+"""
+    Finds which of a set of triggers (see constants.TRIGGERS) a message sets off, in a single scan however many
+    triggers there are. Every word of every trigger goes into one trie, written out as a regex in which no two
+    branches start with the same character, so the regex engine never backtracks between words and can skip straight
+    past characters no word starts with.
+    The regex finds the longest word starting at each position. Any shorter words that start the same way also match
+    there, so they're looked up alongside it, and the search carries on from the next character rather than after the
+    match, so overlapping words aren't missed either. Whole-word triggers are checked for word boundaries afterwards, at
+    whichever ends of the word are word characters, so that words such as "c++" or ":)" can still match.
+"""
+
+_TrieNode = dict[str, "_TrieNode"]
+# Marks the end of a word in the trie
+_END: str = ""
+
+
+def _trie_pattern(node: _TrieNode) -> str:
+    branches: list[str] = [re.escape(char) + _trie_pattern(child) for char, child in sorted(node.items()) if char]
+    if not branches:
+        return ""
+
+    pattern: str = branches[0] if len(branches) == 1 else f"(?:{'|'.join(branches)})"
+    if _END in node:
+        # Greedy, so the longest word wins
+        return f"(?:{pattern})?"
+    return pattern
+
+
+def _is_word_char(char: str) -> bool:
+    return char.isalnum() or char == "_"
+
+
+def _is_boundary(content: str, index: int) -> bool:
+    # The same test as \b: a word character on one side and not the other
+    before: bool = index > 0 and _is_word_char(content[index - 1])
+    after: bool = index < len(content) and _is_word_char(content[index])
+    return before != after
+
+
+class TriggerSet:
+    """
+    A set of triggers, compiled ready for matching.
+    """
+
+    def __init__(self, triggers: list[Trigger]):
+        # Each word to the triggers it belongs to, as (position in the list, whether it needs a word boundary before it,
+        # whether it needs one after it)
+        owners: dict[str, list[tuple[int, bool, bool]]] = {}
+        for index, trigger in enumerate(triggers):
+            if trigger["match"] not in ("word", "substring"):
+                raise ValueError(f"Unknown match '{trigger['match']}' for trigger {trigger['name']}. "
+                                 f"Expected word or substring.")
+            whole_word: bool = trigger["match"] == "word"
+            for word in trigger["words"]:
+                if word:
+                    owners.setdefault(word, []).append(
+                        (index, whole_word and _is_word_char(word[0]), whole_word and _is_word_char(word[-1]))
+                    )
+
+        self._triggers: list[Trigger] = triggers
+        # Each word to every word that matches wherever it does: itself and any other words it starts with
+        self._matches: dict[str, list[tuple[str, list[tuple[int, bool, bool]]]]] = {
+            word: [(prefix, owners[prefix]) for prefix in owners if word.startswith(prefix)] for word in owners
+        }
+
+        trie: _TrieNode = {}
+        for word in owners:
+            node: _TrieNode = trie
+            for char in word:
+                node = node.setdefault(char, {})
+            node[_END] = {}
+        # The root is never the end of a word, as empty words are skipped
+        self._pattern: re.Pattern | None = re.compile(_trie_pattern(trie)) if owners else None
+
+    def match(self, content: str) -> dict[str, str]:
+        """
+        Finds the triggers a message sets off.
+        :param content: The message, lowercased.
+        :return: Each group with a trigger in the message, to the name of its earliest trigger (in list order) found.
+        """
+        if self._pattern is None:
+            return {}
+
+        # The earliest trigger found so far in each group, by position in the list
+        best: dict[str, int] = {}
+        position: int = 0
+        while (found := self._pattern.search(content, position)) is not None:
+            start: int = found.start()
+            for word, owners in self._matches[found.group()]:
+                for index, bounded_start, bounded_end in owners:
+                    if bounded_start and not _is_boundary(content, start):
+                        continue
+                    if bounded_end and not _is_boundary(content, start + len(word)):
+                        continue
+
+                    group: str = self._triggers[index]["group"]
+                    if index < best.get(group, len(self._triggers)):
+                        best[group] = index
+            position = start + 1
+
+        return {group: self._triggers[index]["name"] for group, index in best.items()}
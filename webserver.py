@@ -1,22 +1,134 @@
 """webserver.py"""
 
 # IMPORTS #
-from flask import Flask
+import asyncio
+import logging
+import math
+import time
+from typing import Any
 
-from threading import Thread
+from aiohttp import web
 
-app = Flask('')
+from discord.ext.commands import Bot
 
+import config
 
-@app.route('/')
-def home() -> str:
-    return "I'm alive"
+import async_repository
+import metrics
 
+from classes import Error
+from enums import ErrorType, WarningType
 
-def run():
-    app.run(host='0.0.0.0', port=8080)
+"""
+    A small HTTP server for uptime checks and metrics, run on the bot's own event loop with aiohttp (which discord.py
+    already depends on). Because it shares the loop, a response at all shows the loop is running, and every check
+    reads the bot's state directly.
+        /        - kept for existing uptime pingers
+        /healthz - liveness: fails only if the event loop has been stuck for LIVEMAXLOOPLAG seconds
+        /readyz  - readiness: the gateway is connected, the database can be reached and the loop isn't lagging
+        /metrics - see metrics.py
+    The database is checked in the background every HEALTH_DB_INTERVAL seconds, so no check ever waits on it.
+"""
 
+_bot: Bot | None = None
+_runner: web.AppRunner | None = None
+_db_task: asyncio.Task | None = None
 
-def keep_alive():
-    t = Thread(target=run)
-    t.start()
+# Result of the most recent database check, and when (time.monotonic()) it last succeeded
+_db_status: Error = Error(WarningType.BadConnection, "Not checked yet.")
+_db_last_ok: float | None = None
+
+
+async def _check_database():
+    global _db_status, _db_last_ok
+    while True:
+        try:
+            _db_status = await async_repository.ping()
+        except Exception as exception:
+            _db_status = Error(WarningType.BadConnection, f"Check failed: {exception}")
+        if _db_status.Status == ErrorType.NoError:
+            _db_last_ok = time.monotonic()
+
+        await asyncio.sleep(config.HEALTH_DB_INTERVAL)
+
+
+async def home(request: web.Request) -> web.Response:
+    return web.Response(text="I'm alive")
+
+
+async def healthz(request: web.Request) -> web.Response:
+    lag: float = metrics.LOOP_LAG.current()
+    healthy: bool = lag < config.LIVE_MAX_LOOP_LAG
+    return web.json_response({"status": "ok" if healthy else "stalled", "loopLag": lag},
+                             status=200 if healthy else 503)
+
+
+async def readyz(request: web.Request) -> web.Response:
+    lag: float = metrics.LOOP_LAG.current()
+    latency: float = _bot.latency
+    # A database that was reachable until a check or two ago still counts, so one slow check doesn't flap readiness
+    db_fresh: bool = _db_last_ok is not None and time.monotonic() - _db_last_ok < 3 * config.HEALTH_DB_INTERVAL
+
+    checks: dict[str, dict[str, Any]] = {
+        "gateway": {
+            "ok": _bot.is_ready() and not _bot.is_closed() and math.isfinite(latency),
+            "latency": latency if math.isfinite(latency) else None
+        },
+        "database": {
+            "ok": _db_status.Status == ErrorType.NoError or db_fresh,
+            "message": _db_status.Message
+        },
+        "eventLoop": {
+            "ok": lag < config.READY_MAX_LOOP_LAG,
+            "lag": lag
+        }
+    }
+    ready: bool = all(check["ok"] for check in checks.values())
+    return web.json_response({"status": "ready" if ready else "not ready", "checks": checks},
+                             status=200 if ready else 503)
+
+
+async def metrics_page(request: web.Request) -> web.Response:
+    return web.Response(body=metrics.render(_bot).encode("utf-8"),
+                        headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+
+
+async def start(bot: Bot):
+    """
+    Starts serving on WEB_HOST:WEB_PORT. Must be called from the bot's event loop.
+    :param bot: The bot to report on.
+    """
+    global _bot, _runner, _db_task
+    _bot = bot
+
+    app: web.Application = web.Application()
+    app.add_routes([
+        web.get('/', home),
+        web.get('/healthz', healthz),
+        web.get('/readyz', readyz),
+        web.get('/metrics', metrics_page)
+    ])
+
+    _runner = web.AppRunner(app, access_log=None)
+    await _runner.setup()
+    try:
+        await web.TCPSite(_runner, config.WEB_HOST, config.WEB_PORT).start()
+    except OSError as error:
+        # Not worth taking the bot down over
+        logging.error(f"Couldn't start the web server on port {config.WEB_PORT}: {error}")
+        await _runner.cleanup()
+        _runner = None
+        return
+
+    _db_task = asyncio.create_task(_check_database())
+
+
+async def stop():
+    global _runner, _db_task
+    if _db_task is not None:
+        _db_task.cancel()
+        _db_task = None
+
+    if _runner is not None:
+        await _runner.cleanup()
+        _runner = None